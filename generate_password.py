@@ -1,27 +1,38 @@
+import argparse
 import csv
 import os
 import django
-from django.contrib.auth.hashers import make_password
 from django.utils.crypto import get_random_string
 
 # Set up Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mtvsrs.settings')
 django.setup()
 
-# Function to generate random passwords
-def generate_random_passwords(length, count):
+from mtvsrs.importer import hash_passwords, hashing_pool  # noqa: E402, needs django.setup()
+
+parser = argparse.ArgumentParser(description="Write hashed random passwords to a CSV file.")
+parser.add_argument('--count', type=int, default=10)
+parser.add_argument('--length', type=int, default=12)
+parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Hashing processes")
+parser.add_argument('--output', default='hashed_passwords.csv')
+
+
+# Function to generate random passwords, hashed in parallel since each hash is deliberately slow
+def generate_random_passwords(length, count, workers):
     passwords = [get_random_string(length) for _ in range(count)]
-    hashed_passwords = [make_password(password) for password in passwords]
-    return hashed_passwords
+    with hashing_pool(workers) as pool:
+        return hash_passwords(passwords, pool, workers)
+
 
-# Generate passwords
-passwords_to_hash = generate_random_passwords(length=12, count=10)  # 10 passwords of 12 characters
+if __name__ == '__main__':
+    args = parser.parse_args()
+    passwords_to_hash = generate_random_passwords(length=args.length, count=args.count, workers=args.workers)
 
-# Write hashed passwords to a CSV file
-with open('hashed_passwords.csv', 'w', newline='') as csvfile:
-    password_writer = csv.writer(csvfile)
-    password_writer.writerow(['password'])
-    for pwd in passwords_to_hash:
-        password_writer.writerow([pwd])
+    # Write hashed passwords to a CSV file
+    with open(args.output, 'w', newline='') as csvfile:
+        password_writer = csv.writer(csvfile)
+        password_writer.writerow(['password'])
+        for pwd in passwords_to_hash:
+            password_writer.writerow([pwd])
 
-print("Hashed passwords have been written to hashed_passwords.csv")
+    print(f"Hashed passwords have been written to {args.output}")
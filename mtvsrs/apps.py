@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MtvsrsConfig(AppConfig):
+    name = "mtvsrs"
+
+    def ready(self):
+        # connect signal receivers
+        from . import signals  # noqa: F401
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mtvsrs.settings")
+# serve the async home and show pages (mtvsrs/async_views.py)
+os.environ.setdefault("MTVSRS_ASYNC_VIEWS", "1")
 
 application = get_asgi_application()
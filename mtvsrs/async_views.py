@@ -0,0 +1,93 @@
+"""
+Async versions of the home and show pages, used when the app is served through asgi.py (settings.ASYNC_VIEWS).
+
+The sections of a page don't depend on each other, so they are loaded concurrently with asyncio.gather instead of one
+query after another. The ORM is synchronous, every section runs in a bounded thread pool (settings.ASYNC_DB_THREADS),
+which also caps the number of database connections these views hold. Section logic lives in views.py and is shared
+with the sync views.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+
+from . import conditional, instrumentation, similarity, views
+from .catalog import resolve_show
+from .stats import get_show_stats
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'ASYNC_DB_THREADS', 8),
+                               thread_name_prefix='mtvsrs-db')
+
+
+def _call(func, *args):
+    # pool threads keep their connection between tasks, these respect CONN_MAX_AGE like request start/end do
+    close_old_connections()
+    try:
+        with instrumentation.track_queries():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args):
+    """Run blocking (ORM) work in the bounded pool."""
+    # run_in_executor doesn't carry context variables over, the database router needs them
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor, context.run, partial(_call, func, *args))
+
+
+def login_required(view):
+    # django.contrib.auth's decorator wraps views in a sync function, this one keeps the view a coroutine
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # request.user is lazy and loads the session user from the database
+        is_authenticated = await run(lambda: request.user.is_authenticated)
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path(), "/login/")
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@login_required
+async def home_page(request):
+    user_id = request.user.id
+
+    new_release_shows, trending_shows, recommend_shows = await asyncio.gather(
+        run(views.get_new_release_shows),
+        run(views.get_trending_shows, request),
+        run(views.get_recommended_shows, user_id),
+    )
+
+    context = views.home_page_context(user_id, new_release_shows, trending_shows, recommend_shows)
+    return await run(render, request, "home.html", context)
+
+
+@login_required
+@conditional.conditional_page(conditional.show_page_stamps)
+async def show_page(request, show_id):
+    user_id = request.user.id
+
+    show = await run(resolve_show, show_id)
+    if show is None:
+        raise Http404("No show matches the given query.")
+
+    (watchlist_id, current_status), similar_shows, reviews, show_stats, user_review = await asyncio.gather(
+        run(views.get_watchlist_status, request.identity, show_id),
+        run(partial(similarity.similar_shows, show.show_id, k=10)),
+        run(views.get_reviews, show_id),
+        run(get_show_stats, show_id),
+        run(views.get_user_review, show_id, user_id),
+    )
+
+    context = views.show_page_context(request, show, watchlist_id, current_status, similar_shows, reviews,
+                                      show_stats, user_review)
+    # rendering also goes through the pool, context processors can still touch the session
+    return await run(render, request, "show.html", context)
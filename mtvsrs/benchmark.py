@@ -0,0 +1,232 @@
+"""
+Synthetic data and instrumentation for `manage.py benchmark_views`.
+
+The legacy tables are managed=False and only exist on RDS, create_legacy_schema creates them in whatever database the
+benchmark runs against. History and WatchlistShow get their real composite primary keys with plain SQL, the models
+only know about the first column of each. The indexes migration 0006 adds to the legacy tables skips them when they
+don't exist yet (as in a fresh test database), so create_legacy_schema adds the same indexes itself.
+"""
+
+import math
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as AuthUser
+from django.db import connection, connections
+
+from .catalog import CatalogShow, rebuild_show_catalog
+from .models import History, Movie, Recommendation, ShowTable, TvSeries, User, Watchlist, WatchlistShow
+from .stats import rebuild_show_stats
+from .taste import rebuild_taste_profiles
+from .trending import backfill, refresh_trending
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror', 'Mystery', 'Romance',
+          'Sci-Fi', 'Thriller']
+ADJECTIVES = ['Silent', 'Broken', 'Golden', 'Hidden', 'Last', 'Crimson', 'Endless', 'Frozen', 'Lost', 'Wild',
+              'Secret', 'Electric', 'Midnight', 'Burning', 'Distant']
+NOUNS = ['Empire', 'River', 'Kingdom', 'Signal', 'Garden', 'Horizon', 'Machine', 'Harbor', 'Legacy', 'Voyage',
+         'Shadow', 'Frontier', 'Orchard', 'Circuit', 'Tide']
+STATUSES = ['Planned', 'Watching', 'Completed', 'Dropped']
+
+COMPOSITE_KEY_TABLES = [
+    'CREATE TABLE History (Show_ID integer NOT NULL, Rating integer NULL, Review varchar(300) NULL, '
+    'User_ID integer NOT NULL, Review_Date date NULL, PRIMARY KEY (User_ID, Show_ID))',
+    'CREATE TABLE WatchlistShow (Watchlist_ID integer NOT NULL, Show_ID integer NOT NULL, Status varchar(20) NOT NULL, '
+    'Added_Date date NOT NULL, PRIMARY KEY (Watchlist_ID, Show_ID))',
+]
+
+# kept in sync with migrations/0006_legacy_indexes.py, (name, table, columns)
+LEGACY_INDEXES = [
+    ('History_show_review_date', 'History', ['Show_ID', 'Review_Date', 'User_ID']),
+    ('History_user_rating', 'History', ['User_ID', 'Rating', 'Show_ID']),
+    ('History_review_date', 'History', ['Review_Date']),
+    ('WatchlistShow_list_order', 'WatchlistShow', ['Watchlist_ID', 'Status', 'Added_Date', 'Show_ID']),
+    ('WatchlistShow_show_status', 'WatchlistShow', ['Show_ID', 'Status']),
+    ('Show_Table_movie', 'Show_Table', ['Movie_ID']),
+    ('Show_Table_tv_series', 'Show_Table', ['TV_Series_ID']),
+    ('Watchlist_user', 'Watchlist', ['User_ID']),
+    ('Recommendation_user', 'Recommendation', ['User_ID', 'Recommendation_ID']),
+]
+
+
+def create_legacy_schema():
+    """Create the managed=False tables that don't exist yet, with their indexes."""
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as schema_editor:
+        for model in (Movie, TvSeries, ShowTable, User, Watchlist, Recommendation):
+            if model._meta.db_table not in existing:
+                schema_editor.create_model(model)
+    with connection.cursor() as cursor:
+        for model, sql in zip((History, WatchlistShow), COMPOSITE_KEY_TABLES):
+            if model._meta.db_table not in existing:
+                cursor.execute(sql)
+        quote = connection.ops.quote_name
+        for name, table, columns in LEGACY_INDEXES:
+            if table not in existing:
+                cursor.execute(f'CREATE INDEX {quote(name)} ON {quote(table)} ({", ".join(map(quote, columns))})')
+
+
+def load_dataset(shows, users, history, watchlist_entries, seed=0, log=print):
+    """Create the legacy schema, fill it (see generate_dataset) and build the tables derived from it."""
+    create_legacy_schema()
+    generate_dataset(shows, users, history, watchlist_entries, seed=seed, log=log)
+    rebuild_show_catalog()
+    rebuild_show_stats()
+    rebuild_taste_profiles()
+    backfill()
+    refresh_trending()
+
+
+def show_name(rnd, i):
+    return f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {i}'
+
+
+def show_genre(rnd):
+    return str(rnd.sample(GENRES, rnd.randint(1, 3)))
+
+
+def skewed_show_id(rnd, shows):
+    # a few shows get most of the activity, like the real thing
+    return int(shows * rnd.random() ** 3) + 1
+
+
+def synthetic_catalog(shows, seed=0):
+    """Catalog shows like generate_dataset's, built in memory without a database."""
+    rnd = random.Random(seed)
+    movies = int(shows * 0.6)
+    return [
+        CatalogShow(show_id=i, show_type='Movie' if i <= movies else 'TV', name=show_name(rnd, i),
+                    description=' '.join(rnd.choice(ADJECTIVES + NOUNS).lower() for _ in range(30)),
+                    genre_list=tuple(rnd.sample(GENRES, rnd.randint(1, 3))),
+                    release_date=date(2000, 1, 1) + timedelta(days=rnd.randint(0, 9000)),
+                    number_of_episodes=None if i <= movies else rnd.randint(1, 200),
+                    movie_id=i if i <= movies else None, tv_series_id=None if i <= movies else i - movies)
+        for i in range(1, shows + 1)
+    ]
+
+
+def generate_dataset(shows, users, history, watchlist_entries, seed=0, batch_size=5000, log=print):
+    """Fill the legacy tables with a deterministic synthetic dataset, logs rows/s per table."""
+    rnd = random.Random(seed)
+    first_day = date(2000, 1, 1)
+    movies = int(shows * 0.6)
+
+    def timed(name, rows, create):
+        start = time.perf_counter()
+        create()
+        elapsed = time.perf_counter() - start
+        log(f'{name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)')
+
+    def bulk(model, objects):
+        model.objects.bulk_create(objects, batch_size=batch_size)
+
+    timed('Movie', movies, lambda: bulk(Movie, (
+        Movie(movie_id=i, name=show_name(rnd, i), description=f'Synthetic movie number {i}',
+              genre=show_genre(rnd), release_date=first_day + timedelta(days=rnd.randint(0, 9000)))
+        for i in range(1, movies + 1)
+    )))
+    timed('TV_Series', shows - movies, lambda: bulk(TvSeries, (
+        TvSeries(tv_series_id=i, name=show_name(rnd, movies + i), description=f'Synthetic series number {i}',
+                 genre=show_genre(rnd), release_date=first_day + timedelta(days=rnd.randint(0, 9000)),
+                 number_of_episodes=rnd.randint(1, 200))
+        for i in range(1, shows - movies + 1)
+    )))
+    timed('Show_Table', shows, lambda: bulk(ShowTable, (
+        ShowTable(show_id=i, movie_id=i) if i <= movies else ShowTable(show_id=i, tv_series_id=i - movies)
+        for i in range(1, shows + 1)
+    )))
+
+    # every user gets the same password, hashing it once keeps this fast
+    password = make_password('benchmark')
+    timed('auth_user', users, lambda: bulk(AuthUser, (
+        AuthUser(id=i, username=f'user{i}', password=password, first_name=f'First{i}', last_name=f'Last{i}')
+        for i in range(1, users + 1)
+    )))
+    timed('User', users, lambda: bulk(User, (
+        User(user_id=i, first_name=f'First{i}', last_name=f'Last{i}') for i in range(1, users + 1)
+    )))
+    timed('Watchlist', users, lambda: bulk(Watchlist, (
+        Watchlist(watchlist_id=i, user_id=i) for i in range(1, users + 1)
+    )))
+
+    def per_user(total):
+        # (user_id, distinct show ids), spread as evenly as the total allows
+        for user_id in range(1, users + 1):
+            count = min(total // users + (user_id <= total % users), shows)
+            show_ids = set()
+            while len(show_ids) < count:
+                show_ids.add(skewed_show_id(rnd, shows))
+            yield user_id, show_ids
+
+    timed('History', history, lambda: bulk(History, (
+        History(user_id_id=user_id, show_id_id=show_id, rating=rnd.randint(1, 5),
+                review=f'Review of show {show_id} by user {user_id}' if rnd.random() < 0.3 else None,
+                review_date=date(2024, 1, 1) + timedelta(days=rnd.randint(0, 365)))
+        for user_id, show_ids in per_user(history) for show_id in show_ids
+    )))
+    timed('WatchlistShow', watchlist_entries, lambda: bulk(WatchlistShow, (
+        WatchlistShow(watchlist_id_id=user_id, show_id_id=show_id, status=rnd.choice(STATUSES),
+                      added_date=date(2024, 1, 1) + timedelta(days=rnd.randint(0, 365)))
+        for user_id, show_ids in per_user(watchlist_entries) for show_id in show_ids
+    )))
+
+
+def percentile(sorted_values, p):
+    """p-th percentile of already sorted values, by nearest rank."""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+@contextmanager
+def on_every_connection(wrapper):
+    """Install the execute wrapper on every database alias, replicas included, for the block."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting queries and the rows fetched from their cursors, install it with
+    on_every_connection(counter).
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def reset(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        cursor = context['cursor']
+        if not getattr(cursor, '_counting_rows', False):
+            self.count_rows(cursor)
+        return execute(sql, params, many, context)
+
+    def count_rows(self, cursor):
+        # CursorWrapper hands fetch* through to the driver's cursor, shadow them on the instance
+        fetchone, fetchmany, fetchall = cursor.cursor.fetchone, cursor.cursor.fetchmany, cursor.cursor.fetchall
+
+        def counting_fetchone():
+            row = fetchone()
+            self.rows += row is not None
+            return row
+
+        def counting_fetchmany(*args, **kwargs):
+            rows = fetchmany(*args, **kwargs)
+            self.rows += len(rows)
+            return rows
+
+        def counting_fetchall():
+            rows = fetchall()
+            self.rows += len(rows)
+            return rows
+
+        cursor.fetchone, cursor.fetchmany, cursor.fetchall = counting_fetchone, counting_fetchmany, counting_fetchall
+        cursor._counting_rows = True
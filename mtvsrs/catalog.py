@@ -0,0 +1,295 @@
+"""
+Process-wide, read-only snapshot of the show catalog.
+
+Movie, TV_Series and Show_Table are loaded once per process, every Genre string is parsed a single time, and the
+movie_id / tv_series_id -> show_id mapping is kept alongside, so views never have to scan the catalog tables or run
+literal_eval per request.
+
+The snapshot is versioned: writes to the catalog models bump the version (see signals.py) and the snapshot is also
+reloaded once it is older than settings.CATALOG_SNAPSHOT_TTL, which is what picks up writes made by other processes.
+
+Shows are read from Show_Catalog, a denormalized copy of Movie and TV_Series keyed by Show_ID. It is kept in sync on
+every Movie/TV_Series/Show_Table save or delete and can be rebuilt with `manage.py rebuild_show_catalog`.
+
+Deployments that built a catalog file (`manage.py build_catalog_file`, see catalog_file.py) serve the memory-mapped file
+instead, shared by every worker process. It is rewritten whenever Show_Catalog changes, and swapping it is what makes
+the other processes reload, there is no TTL.
+"""
+
+import logging
+import os
+import threading
+import time
+from ast import literal_eval
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property, wraps
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import catalog_file, conditional, fragment_cache
+from .models import ShowCatalog, ShowTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300  # seconds
+
+
+def parse_genre(genre_string):
+    """Parse a Genre column value such as "['Action', 'Drama']" into a tuple, keeping the stored order."""
+    if not genre_string:
+        return ()
+    try:
+        genres = literal_eval(genre_string)
+    except (ValueError, SyntaxError):
+        return ()
+    if isinstance(genres, str):
+        return (genres,)
+    return tuple(genres)
+
+
+@dataclass(frozen=True)
+class CatalogShow:
+    show_id: int
+    show_type: str  # "Movie" or "TV", same labels the templates already use
+    name: str
+    description: str
+    genre_list: tuple
+    release_date: Optional[date]
+    number_of_episodes: Optional[int] = None
+    movie_id: Optional[int] = None
+    tv_series_id: Optional[int] = None
+
+    @cached_property
+    def genres(self) -> frozenset:
+        return frozenset(self.genre_list)
+
+    @property
+    def genre(self) -> str:
+        # templates display genres joined with just a comma
+        return ', '.join(self.genre_list)
+
+
+class CatalogSnapshot:
+    def __init__(self, shows, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.shows = {show.show_id: show for show in shows}
+        self.show_id_by_movie_id = {show.movie_id: show.show_id for show in self.shows.values() if show.movie_id}
+        self.show_id_by_tv_series_id = {
+            show.tv_series_id: show.show_id for show in self.shows.values() if show.tv_series_id
+        }
+        # newest first, shows without a release date go last
+        self.by_release_date = tuple(
+            sorted(self.shows.values(), key=lambda show: show.release_date or date.min, reverse=True)
+        )
+
+    def __len__(self):
+        return len(self.shows)
+
+    def __iter__(self) -> Iterator[CatalogShow]:
+        return iter(self.shows.values())
+
+    def __contains__(self, show_id):
+        return show_id in self.shows
+
+    def get(self, show_id) -> Optional[CatalogShow]:
+        return self.shows.get(int(show_id))
+
+    def for_movie(self, movie_id) -> Optional[CatalogShow]:
+        return self.get(self.show_id_by_movie_id.get(movie_id, 0))
+
+    def for_tv_series(self, tv_series_id) -> Optional[CatalogShow]:
+        return self.get(self.show_id_by_tv_series_id.get(tv_series_id, 0))
+
+    def movies(self) -> Iterator[CatalogShow]:
+        return (show for show in self if show.show_type == "Movie")
+
+    def tv_series(self) -> Iterator[CatalogShow]:
+        return (show for show in self if show.show_type == "TV")
+
+    def new_releases(self, limit=10):
+        return list(self.by_release_date[:limit])
+
+
+def show_from_catalog(row: ShowCatalog) -> CatalogShow:
+    return CatalogShow(show_id=row.show_id, show_type=row.show_type, name=row.name, description=row.description,
+                       genre_list=parse_genre(row.genre), release_date=row.release_date,
+                       number_of_episodes=row.number_of_episodes, movie_id=row.movie_id,
+                       tv_series_id=row.tv_series_id)
+
+
+def load_shows(using=None):
+    """Read the whole catalog in a single scan of Show_Catalog, from the `using` database if given."""
+    return (show_from_catalog(row)
+            for row in ShowCatalog.objects.using(using).order_by('show_id').iterator(chunk_size=5000))
+
+
+_lock = threading.Lock()
+_snapshot: Optional[CatalogSnapshot] = None
+_version = 0
+
+
+def _is_stale(snapshot):
+    if snapshot.version != _version:
+        return True
+    if isinstance(snapshot, catalog_file.MappedCatalog):
+        return snapshot.is_replaced()
+    ttl = getattr(settings, 'CATALOG_SNAPSHOT_TTL', DEFAULT_TTL)
+    return time.monotonic() - snapshot.loaded_at > ttl
+
+
+def load_snapshot(version):
+    """The catalog file if this deployment has one, otherwise a snapshot of Show_Catalog."""
+    path = catalog_file.catalog_file_path()
+    if path and os.path.exists(path):
+        try:
+            return catalog_file.MappedCatalog(path, version)
+        except (OSError, ValueError):
+            logger.exception("Can't map the catalog file %s, loading Show_Catalog instead", path)
+    return CatalogSnapshot(load_shows(), version)
+
+
+def get_catalog() -> CatalogSnapshot:
+    """Return the current snapshot, (re)loading it if it was invalidated or has expired."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and not _is_stale(snapshot):
+        return snapshot
+
+    with _lock:
+        # another thread may have reloaded while we waited for the lock
+        if _snapshot is None or _is_stale(_snapshot):
+            _snapshot = load_snapshot(_version)
+        return _snapshot
+
+
+def invalidate_catalog(**kwargs):
+    """Bump the catalog version so the next get_catalog() reloads. Safe to connect directly as a signal receiver."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def per_snapshot(build):
+    """
+    Decorator for structures derived from the catalog (similarity matrix, search index, ...): the wrapped
+    build(catalog) runs once per snapshot and is rerun whenever the snapshot is reloaded.
+    """
+    lock = threading.Lock()
+    # (snapshot, value built from it), swapped as a pair
+    state = [(None, None)]
+
+    @wraps(build)
+    def get():
+        catalog = get_catalog()
+        built_from, value = state[0]
+        if built_from is catalog:
+            return value
+        with lock:
+            built_from, value = state[0]
+            if built_from is not catalog:
+                value = build(catalog)
+                state[0] = (catalog, value)
+            return value
+
+    return get
+
+
+def resolve_shows(show_ids) -> list:
+    """
+    Hydrate show_ids into CatalogShow display objects, keeping the given order.
+
+    Everything the snapshot knows is resolved without a query, shows added since it was loaded are fetched together
+    in one Show_Catalog primary key lookup. Ids that don't exist at all are dropped.
+    """
+    show_ids = [int(show_id) for show_id in show_ids]
+    catalog = get_catalog()
+    resolved = {show_id: catalog.get(show_id) for show_id in show_ids}
+
+    missing = [show_id for show_id, show in resolved.items() if show is None]
+    if missing:
+        for show_id, row in ShowCatalog.objects.in_bulk(missing).items():
+            resolved[show_id] = show_from_catalog(row)
+
+    return [resolved[show_id] for show_id in show_ids if resolved[show_id] is not None]
+
+
+def resolve_rows(rows) -> list:
+    """
+    Pair every History/WatchlistShow row (or queryset) with its CatalogShow, as [(row, show), ...].
+
+    Only the Show_ID column of each row is read, so the rows don't need select_related('show_id').
+    """
+    rows = list(rows)
+    shows = {show.show_id: show for show in resolve_shows({row.show_id_id for row in rows})}
+    return [(row, shows[row.show_id_id]) for row in rows if row.show_id_id in shows]
+
+
+def resolve_show(show_id) -> Optional[CatalogShow]:
+    shows = resolve_shows([show_id])
+    return shows[0] if shows else None
+
+
+### Show_Catalog maintenance ###
+
+REBUILD_SHOW_CATALOG_SQL = """
+    INSERT INTO Show_Catalog
+        (Show_ID, Show_Type, Movie_ID, TV_Series_ID, Name, Description, Genre, Release_Date, Number_of_Episodes)
+    SELECT st.Show_ID, 'Movie', m.Movie_ID, NULL, m.Name, m.Description, m.Genre, m.Release_Date, NULL
+    FROM Show_Table st
+    JOIN Movie m ON m.Movie_ID = st.Movie_ID
+    UNION ALL
+    SELECT st.Show_ID, 'TV', NULL, tv.TV_Series_ID, tv.Name, tv.Description, tv.Genre, tv.Release_Date,
+           tv.Number_of_Episodes
+    FROM Show_Table st
+    JOIN TV_Series tv ON tv.TV_Series_ID = st.TV_Series_ID
+    WHERE st.Movie_ID IS NULL
+"""
+
+
+def catalog_row(show_table) -> Optional[ShowCatalog]:
+    """Show_Catalog row for a ShowTable instance fetched with select_related('movie', 'tv_series')."""
+    if show_table.movie_id and show_table.movie:
+        movie = show_table.movie
+        return ShowCatalog(show_id=show_table.show_id, show_type="Movie", movie_id=movie.movie_id, name=movie.name,
+                           description=movie.description, genre=movie.genre, release_date=movie.release_date)
+    if show_table.tv_series_id and show_table.tv_series:
+        tv_series = show_table.tv_series
+        return ShowCatalog(show_id=show_table.show_id, show_type="TV", tv_series_id=tv_series.tv_series_id,
+                           name=tv_series.name, description=tv_series.description, genre=tv_series.genre,
+                           release_date=tv_series.release_date, number_of_episodes=tv_series.number_of_episodes)
+    return None
+
+
+def sync_show_catalog(show_ids):
+    """Re-copy the given shows from the legacy tables, shows that no longer exist are removed."""
+    show_ids = list(show_ids)
+    if not show_ids:
+        return
+    with transaction.atomic():
+        # read inside the transaction, i.e. from the primary, a replica may not have the write being synced yet
+        show_tables = ShowTable.objects.select_related('movie', 'tv_series').in_bulk(show_ids)
+        rows = [row for row in map(catalog_row, show_tables.values()) if row is not None]
+        ShowCatalog.objects.filter(show_id__in=show_ids).delete()
+        ShowCatalog.objects.bulk_create(rows)
+        # similar shows and lists on any page may include these
+        conditional.bump(conditional.GLOBAL)
+        transaction.on_commit(catalog_file.request_refresh)
+
+
+def rebuild_show_catalog():
+    """Rebuild Show_Catalog from scratch in one INSERT ... SELECT, returns the number of shows."""
+    with transaction.atomic():
+        ShowCatalog.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SHOW_CATALOG_SQL)
+        # counted in the transaction, on the primary, a replica may not have the new rows yet
+        count = ShowCatalog.objects.count()
+        fragment_cache.invalidate(fragment_cache.NEW_RELEASES)
+        conditional.bump(conditional.GLOBAL)
+        transaction.on_commit(catalog_file.request_refresh)
+    invalidate_catalog()
+    return count
@@ -0,0 +1,261 @@
+"""
+The catalog as one columnar file that every worker process memory-maps, instead of each loading its own copy of
+Show_Catalog.
+
+`manage.py build_catalog_file` writes settings.CATALOG_FILE: fixed-width NumPy columns (Show_ID, type, Movie_ID,
+TV_Series_ID, release date ordinal, episodes, genre bitmask) sorted by Show_ID, the genres of every show in their stored
+order, and the names and descriptions as one UTF-8 blob with an offset column each. MappedCatalog reads it through a
+read-only mmap without copying, so the pages are shared by every worker on the host and a restarted worker doesn't query
+the database for the catalog at all. CatalogShow objects are only decoded for the rows a request asks for.
+
+Once the file exists, catalog.get_catalog() serves it instead of the database snapshot, and the Show_Catalog
+maintenance in catalog.py rewrites it from the primary after commits that change the catalog: once per request
+(CatalogFileRefreshMiddleware) or import, however many commits they make, and right away anywhere else. A new file is
+written next to the old one and renamed over it; workers notice the swap on their next catalog access and map the new
+version, requests already holding the old mapping finish on it.
+"""
+
+import json
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Iterator, Optional
+
+import numpy as np
+from django.conf import settings
+
+from . import catalog, routers
+
+MAGIC = b'MTVSCAT\n'
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+SHOW_TYPES = ('Movie', 'TV')
+NAME_NULL, DESCRIPTION_NULL = 1, 2  # bits of the flags column, None and '' are different values
+
+# set inside deferred_refreshes(), a list the refreshes requested meanwhile are noted in
+_deferred = ContextVar('catalog_file_deferred', default=None)
+
+
+def catalog_file_path():
+    return getattr(settings, 'CATALOG_FILE', None)
+
+
+### Writing ###
+
+def _offsets(values):
+    encoded = [(value or '').encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def write_catalog_file(shows, path=None):
+    """Write the shows to a new catalog file version and swap it in atomically, returns (path, number of shows)."""
+    path = path or catalog_file_path()
+    shows = sorted(shows, key=lambda show: show.show_id)
+    genres = sorted({genre for show in shows for genre in show.genre_list})
+    if len(genres) > 64:
+        raise ValueError(f'{len(genres)} genres don\'t fit the 64 bit genre mask')
+    genre_index = {genre: i for i, genre in enumerate(genres)}
+
+    release_ordinals = np.array([show.release_date.toordinal() if show.release_date else 0 for show in shows],
+                                dtype=np.int32)
+    name_offsets, names = _offsets(show.name for show in shows)
+    description_offsets, descriptions = _offsets(show.description for show in shows)
+    genre_offsets = np.zeros(len(shows) + 1, dtype=np.int64)
+    np.cumsum([len(show.genre_list) for show in shows], out=genre_offsets[1:])
+
+    columns = {
+        'show_id': np.array([show.show_id for show in shows], dtype=np.int32),
+        'show_type': np.array([SHOW_TYPES.index(show.show_type) for show in shows], dtype=np.uint8),
+        'movie_id': np.array([show.movie_id or 0 for show in shows], dtype=np.int32),
+        'tv_series_id': np.array([show.tv_series_id or 0 for show in shows], dtype=np.int32),
+        'release_date': release_ordinals,
+        'number_of_episodes': np.array([-1 if show.number_of_episodes is None else show.number_of_episodes
+                                        for show in shows], dtype=np.int32),
+        'genre_mask': np.array([sum(1 << genre_index[genre] for genre in show.genres) for show in shows],
+                               dtype=np.uint64),
+        'genre_offsets': genre_offsets,
+        'genre_codes': np.array([genre_index[genre] for show in shows for genre in show.genre_list], dtype=np.uint8),
+        'flags': np.array([(NAME_NULL if show.name is None else 0) | (DESCRIPTION_NULL if show.description is None
+                                                                      else 0) for show in shows], dtype=np.uint8),
+        'name_offsets': name_offsets,
+        'description_offsets': description_offsets,
+        'names': np.frombuffer(names, dtype=np.uint8),
+        'descriptions': np.frombuffer(descriptions, dtype=np.uint8),
+        # newest first, shows without a release date last, by Show_ID among equals like CatalogSnapshot
+        'release_order': np.argsort(-release_ordinals, kind='stable').astype(np.int32),
+    }
+    for key in ('movie_id', 'tv_series_id'):
+        rows = np.flatnonzero(columns[key]).astype(np.int32)
+        rows = rows[np.argsort(columns[key][rows], kind='stable')]
+        columns[f'{key}_rows'] = rows  # rows with an id, in id order
+
+    # the header only needs the offsets of the arrays, which depend on its own length: lay out after a guess and
+    # grow the guess until the header fits
+    header_size = 4096
+    while True:
+        offset = PREAMBLE.size + header_size
+        layout = {}
+        for name, column in columns.items():
+            offset += -offset % ALIGNMENT
+            layout[name] = [column.dtype.str, len(column), offset]
+            offset += column.nbytes
+        header = json.dumps({'shows': len(shows), 'genres': genres, 'columns': layout}).encode()
+        if len(header) <= header_size:
+            break
+        header_size *= 2
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_size))
+        f.write(header.ljust(header_size, b' '))
+        for name, column in columns.items():
+            f.seek(layout[name][2])
+            f.write(column.tobytes())
+        f.truncate(offset)  # an empty last column still needs its offset inside the file
+    os.replace(tmp_path, path)
+    return path, len(shows)
+
+
+def refresh_catalog_file():
+    """Rewrite the catalog file from Show_Catalog, if this deployment uses one."""
+    path = catalog_file_path()
+    if path and os.path.exists(path):
+        # from the primary, a lagging replica would leave the file stale until the next catalog change
+        write_catalog_file(catalog.load_shows(using=routers.PRIMARY), path)
+
+
+def request_refresh():
+    """Refresh the catalog file now, or once at the end of the enclosing deferred_refreshes() block."""
+    pending = _deferred.get()
+    if pending is None:
+        refresh_catalog_file()
+    else:
+        pending.append(True)
+
+
+@contextmanager
+def deferred_refreshes():
+    """Coalesce the refreshes requested inside the block into one when it exits, e.g. one per import."""
+    if _deferred.get() is not None:
+        # the outer block refreshes
+        yield
+        return
+    pending = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        if pending:
+            refresh_catalog_file()
+
+
+### Reading ###
+
+def file_identity(path):
+    """(inode, mtime, size) of the file, None if it doesn't exist. Changes whenever a new version is swapped in."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class MappedCatalog:
+    """Read-only view of a catalog file, with the same interface as catalog.CatalogSnapshot."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = stat.st_ino, stat.st_mtime_ns, stat.st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, header_size = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} catalog file')
+        header = json.loads(bytes(self._mmap[PREAMBLE.size:PREAMBLE.size + header_size]))
+        self.genre_vocabulary = tuple(header['genres'])
+        self.columns = {name: np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset)
+                        for name, (dtype, count, offset) in header['columns'].items()}
+        self.count = header['shows']
+
+    def is_replaced(self):
+        return file_identity(self.path) != self.identity
+
+    def _row(self, show_id) -> Optional[int]:
+        show_ids = self.columns['show_id']
+        row = int(np.searchsorted(show_ids, show_id))
+        return row if row < len(show_ids) and show_ids[row] == show_id else None
+
+    def _row_by(self, key, value) -> Optional[int]:
+        rows = self.columns[f'{key}_rows']
+        values = self.columns[key]
+        # binary search through the row indirection, log2(n) element reads
+        lo, hi = 0, len(rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if values[rows[mid]] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return int(rows[lo]) if lo < len(rows) and values[rows[lo]] == value else None
+
+    def _text(self, blob, offsets, row):
+        return self.columns[blob][self.columns[offsets][row]:self.columns[offsets][row + 1]].tobytes().decode()
+
+    def _show(self, row) -> 'catalog.CatalogShow':
+        columns = self.columns
+        flags = columns['flags'][row]
+        release_date = int(columns['release_date'][row])
+        episodes = int(columns['number_of_episodes'][row])
+        codes = columns['genre_codes'][columns['genre_offsets'][row]:columns['genre_offsets'][row + 1]]
+        return catalog.CatalogShow(
+            show_id=int(columns['show_id'][row]),
+            show_type=SHOW_TYPES[columns['show_type'][row]],
+            name=None if flags & NAME_NULL else self._text('names', 'name_offsets', row),
+            description=None if flags & DESCRIPTION_NULL else self._text('descriptions', 'description_offsets', row),
+            genre_list=tuple(self.genre_vocabulary[code] for code in codes),
+            release_date=date.fromordinal(release_date) if release_date else None,
+            number_of_episodes=None if episodes < 0 else episodes,
+            movie_id=int(columns['movie_id'][row]) or None,
+            tv_series_id=int(columns['tv_series_id'][row]) or None,
+        )
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self) -> 'Iterator[catalog.CatalogShow]':
+        return (self._show(row) for row in range(self.count))
+
+    def __contains__(self, show_id):
+        return self._row(int(show_id)) is not None
+
+    def get(self, show_id) -> 'Optional[catalog.CatalogShow]':
+        row = self._row(int(show_id))
+        return None if row is None else self._show(row)
+
+    def for_movie(self, movie_id) -> 'Optional[catalog.CatalogShow]':
+        row = self._row_by('movie_id', movie_id)
+        return None if row is None else self._show(row)
+
+    def for_tv_series(self, tv_series_id) -> 'Optional[catalog.CatalogShow]':
+        row = self._row_by('tv_series_id', tv_series_id)
+        return None if row is None else self._show(row)
+
+    def movies(self) -> 'Iterator[catalog.CatalogShow]':
+        return (self._show(row) for row in np.flatnonzero(self.columns['show_type'] == 0))
+
+    def tv_series(self) -> 'Iterator[catalog.CatalogShow]':
+        return (self._show(row) for row in np.flatnonzero(self.columns['show_type'] == 1))
+
+    def new_releases(self, limit=10):
+        return [self._show(row) for row in self.columns['release_order'][:limit]]
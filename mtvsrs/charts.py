@@ -0,0 +1,110 @@
+"""
+Score distribution charts for the show page.
+
+The default chart is a small inline SVG built with string formatting, no Plotly involved. Fragments are cached by
+the bar counts, so shows with the same histogram (and every repeat view of a show) reuse the rendered markup. Plotly
+is only imported when the richer interactive chart is asked for.
+"""
+
+from functools import lru_cache
+from html import escape
+
+from django.templatetags.static import static
+from django.utils.safestring import mark_safe
+
+from .instrumentation import timed
+
+# same continuous scale the Plotly chart used: red for the least common rating, green for the most common
+COLOR_SCALE = [(0.0, (255, 0, 0)), (0.5, (255, 255, 0)), (1.0, (0, 128, 0))]
+
+WIDTH = 500
+HEIGHT = 200
+LABEL_HEIGHT = 24
+MARGIN = 10
+BAR_GAP = 0.4  # fraction of each slot left empty, like Plotly's bargap
+
+
+def bar_color(fraction):
+    """Interpolate COLOR_SCALE at fraction (0..1) into an rgb() string."""
+    for (low, low_rgb), (high, high_rgb) in zip(COLOR_SCALE, COLOR_SCALE[1:]):
+        if fraction <= high:
+            t = (fraction - low) / (high - low)
+            rgb = (round(a + (b - a) * t) for a, b in zip(low_rgb, high_rgb))
+            return 'rgb({}, {}, {})'.format(*rgb)
+    return 'rgb({}, {}, {})'.format(*COLOR_SCALE[-1][1])
+
+
+@lru_cache(maxsize=1024)
+def render_svg_histogram(labels, counts):
+    """Bar chart of counts as an inline, responsive SVG fragment. Arguments are tuples so they can be cache keys."""
+    low, high = min(counts), max(counts)
+    plot_height = HEIGHT - LABEL_HEIGHT - MARGIN
+    slot = (WIDTH - 2 * MARGIN) / len(counts)
+    bar_width = slot * (1 - BAR_GAP)
+
+    parts = [
+        f'<svg class="score-histogram" viewBox="0 0 {WIDTH} {HEIGHT}" width="100%" role="img" '
+        f'aria-label="Score distribution" xmlns="http://www.w3.org/2000/svg">'
+    ]
+    for i, (label, count) in enumerate(zip(labels, counts)):
+        bar_height = plot_height * count / high if high else 0
+        x = MARGIN + i * slot + (slot - bar_width) / 2
+        y = MARGIN + plot_height - bar_height
+        color = bar_color((count - low) / (high - low) if high > low else 0.0)
+        parts.append(
+            f'<rect x="{x:.1f}" y="{y:.1f}" width="{bar_width:.1f}" height="{bar_height:.1f}" fill="{color}" '
+            f'fill-opacity="0.6"><title>{escape(str(label))}: {count}</title></rect>'
+            f'<text x="{x + bar_width / 2:.1f}" y="{HEIGHT - 6}" fill="#e0e0e0" font-size="14" '
+            f'text-anchor="middle">{escape(str(label))}</text>'
+        )
+    parts.append('</svg>')
+    return mark_safe(''.join(parts))
+
+
+@lru_cache(maxsize=256)
+def render_plotly_histogram(labels, counts):
+    """The original interactive Plotly bar chart, Plotly is imported on first use only."""
+    import plotly.express as px
+
+    labels, counts = list(labels), list(counts)
+    plot = px.bar(
+        x=labels,
+        y=counts,
+        color=counts,
+        color_continuous_scale=[(0, "red"), (0.5, "yellow"), (1, "green")],
+        template="plotly_dark",
+    )
+    # remove all labels and make responsive
+    plot.update_layout(
+        xaxis_title="",
+        yaxis_title="",
+        title="",
+        xaxis_showticklabels=True,
+        yaxis_showticklabels=False,
+        xaxis_visible=True,
+        yaxis_visible=False,
+        autosize=True,
+        margin=dict(l=10, r=10, t=10, b=10),
+        plot_bgcolor="rgba(0,0,0,0)",  # transparent background
+        coloraxis_showscale=False,  # hide the color scale bar
+        hovermode=False,
+        bargap=0.4
+    )
+    # adjust marker properties
+    plot.update_traces(
+        marker_line_width=0,  # borders around bars
+        marker_opacity=0.6,
+    )
+    # plotly.js from our own static files (`manage.py vendor_static`) instead of inlining all 3.5MB of it every time
+    return mark_safe(plot.to_html(full_html=False, include_plotlyjs=static('vendor/plotly.min.js'),
+                                  config={'displayModeBar': False}))
+
+
+def score_histogram(score_distribution, rich=False):
+    """Render a {rating: count} distribution, rich=True for the interactive Plotly chart."""
+    labels = tuple(sorted(score_distribution))
+    counts = tuple(int(score_distribution[label]) for label in labels)
+    with timed('chart'):
+        if rich:
+            return render_plotly_histogram(labels, counts)
+        return render_svg_histogram(labels, counts)
@@ -0,0 +1,129 @@
+"""
+Conditional GET (ETag/Last-Modified) for pages that only change when someone writes.
+
+Writes bump change stamps, timestamps kept in Django's cache (settings.CACHES): one per show, one per user, and a
+global one for writes that touch many pages at once (catalog and stats rebuilds, imports). A page's validators are
+derived from the stamps it depends on, so a revisit costs one cache read and a 304 when nothing was bumped, before the
+view runs a single query. A stamp that is missing from the cache (evicted, cache cleared) is recreated as "now", which
+only costs a full response.
+
+The ETags are weak, the page is the same to the reader but not byte for byte (the CSRF token in it is re-masked on
+every render), and nginx keeps weak ETags when it gzips a response.
+"""
+
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+GLOBAL = 'stamp:global'
+
+
+def show_key(show_id):
+    return f'stamp:show:{show_id}'
+
+
+def user_key(user_id):
+    return f'stamp:user:{user_id}'
+
+
+def bump(*keys):
+    """Mark every page depending on these stamps as changed, once the current transaction commits."""
+    # after the commit, a request in between would otherwise cache the old page under the new stamp
+    transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time()), timeout=None))
+
+
+def get_stamps(keys):
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        # another worker may have added it first
+        stamps.update(cache.get_many(missing))
+        stamps.update({key: now for key in missing if key not in stamps})
+    return stamps
+
+
+def validators(request, keys):
+    """(etag, last_modified) of a page for this user from the stamps it depends on."""
+    stamps = get_stamps(keys)
+    # the page embeds the user and their CSRF token, a new login must not be answered with the previous session's page.
+    # A first visit has no CSRF cookie yet, see _rendered_token_changed()
+    identity = (request.user.id, request.META.get('CSRF_COOKIE'), request.get_full_path(),
+                getattr(settings, 'RELEASE', ''))
+    digest = hashlib.md5(repr((sorted(stamps.items()), identity)).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"', int(max(stamps.values()))
+
+
+def _rendered_token_changed(request, csrf_cookie):
+    # the view rendered a new CSRF token, the cookie it sets is what the next request's validators see, so the ETag
+    # must be the one computed with it or the next request isn't a 304 yet
+    return request.META.get('CSRF_COOKIE') != csrf_cookie
+
+
+def _finish(request, response, etag, last_modified):
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        if not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        # per user, and the browser revalidates on every visit
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(stamp_keys):
+    """
+    Answer If-None-Match/If-Modified-Since with 304 before the view runs, for sync and async views alike. stamp_keys is
+    called like the view and returns the stamps the page depends on.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                keys = stamp_keys(request, *args, **kwargs)
+                csrf_cookie = request.META.get('CSRF_COOKIE')
+                etag, last_modified = await sync_to_async(validators, thread_sensitive=False)(request, keys)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if _rendered_token_changed(request, csrf_cookie):
+                        etag, last_modified = await sync_to_async(validators, thread_sensitive=False)(request, keys)
+                return _finish(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            keys = stamp_keys(request, *args, **kwargs)
+            csrf_cookie = request.META.get('CSRF_COOKIE')
+            etag, last_modified = validators(request, keys)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if _rendered_token_changed(request, csrf_cookie):
+                    etag, last_modified = validators(request, keys)
+            return _finish(request, response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def show_page_stamps(request, show_id):
+    # reviews, stats and the user's own status/review of the show
+    return [GLOBAL, show_key(show_id), user_key(request.user.id)]
+
+
+def my_list_stamps(request):
+    return [GLOBAL, user_key(request.user.id)]
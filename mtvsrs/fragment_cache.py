@@ -0,0 +1,116 @@
+"""
+Cached home page sections on top of Django's cache framework (settings.CACHES).
+
+Sections cache show ids only, the shows themselves come from the catalog snapshot. Every entry is stored as
+(value, fresh_until) and kept in the cache for a while after it goes stale: the first request to find it stale takes
+the key's lock and recomputes it, every other request keeps serving the stale value meanwhile, so an expired section
+is recomputed by one worker instead of all of them at once. With nothing cached yet the others wait for that worker
+and serve what it stored.
+
+The lock is an flock() on a file per key in settings.SECTION_CACHE_LOCK_DIR, so it holds across every worker process
+on the host like the file based cache itself (whose add() is not atomic), and the kernel releases it if its holder
+dies.
+
+Writes don't delete entries, they mark them stale (see invalidate) so the same rule applies after a write.
+"""
+
+import fcntl
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+NEW_RELEASES = 'section:new_releases'
+TRENDING = 'section:trending'
+
+# how long a request with nothing cached waits for another worker's recompute before computing it itself
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+
+def recommendations_key(user_id):
+    return f'section:recommendations:{user_id}'
+
+
+def fresh_seconds():
+    return getattr(settings, 'SECTION_CACHE_TTL', 300)
+
+
+def stale_seconds():
+    return getattr(settings, 'SECTION_CACHE_STALE_TTL', 3600)
+
+
+def lock_dir():
+    return getattr(settings, 'SECTION_CACHE_LOCK_DIR', os.path.join(settings.BASE_DIR, '.cache', 'locks'))
+
+
+@contextmanager
+def _lock(key, wait):
+    """Hold the key's lock for the block, yields False if it wasn't free (within LOCK_TIMEOUT seconds with wait)."""
+    directory = lock_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, hashlib.sha1(key.encode()).hexdigest()), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + (LOCK_TIMEOUT if wait else 0)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(LOCK_POLL_INTERVAL)
+        yield True
+    finally:
+        # closing the file releases the lock
+        os.close(fd)
+
+
+def _store(key, value, ttl):
+    cache.set(key, (value, time.time() + ttl), ttl + stale_seconds())
+
+
+def get_or_compute(key, compute, ttl=None):
+    """Cached value of key, compute() fills it in on a miss and refreshes it once stale."""
+    ttl = fresh_seconds() if ttl is None else ttl
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if fresh_until > time.time():
+            return value
+
+    with _lock(key, wait=entry is None) as locked:
+        if not locked:
+            if entry is not None:
+                # someone else is refreshing it
+                return entry[0]
+            # the recompute we waited for is stuck, compute it without storing rather than wait longer
+            return compute()
+
+        # whoever held the lock before us may have just stored it
+        entry = cache.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        value = compute()
+        _store(key, value, ttl)
+        return value
+
+
+def invalidate(*keys):
+    """Mark keys stale once the current transaction commits, the next read recomputes them."""
+    def mark_stale():
+        entries = cache.get_many(keys)
+        for key, (value, _) in entries.items():
+            _store(key, value, 0)
+
+    # before commit another request could recompute from data that doesn't include the write yet
+    transaction.on_commit(mark_stale)
+
+
+def invalidate_recommendations(user_ids):
+    invalidate(*(recommendations_key(user_id) for user_id in user_ids))
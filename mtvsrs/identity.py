@@ -0,0 +1,63 @@
+"""
+Who the request is for: the auth user, their legacy User row (same id as auth_user) and their Watchlist_ID, available
+as request.identity (see IdentityMiddleware).
+
+The legacy part is looked up once, with a single query, and kept in the session. Saving or deleting the user's User or
+Watchlist row bumps a per-user version in Django's cache, and a session entry with another version (or for another
+user, or with the version evicted from the cache) is looked up again. The auth user itself is still loaded and checked
+by Django's AuthenticationMiddleware on every request, a password change logs sessions out as usual.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Watchlist
+
+SESSION_KEY = '_identity'
+
+
+@dataclass(frozen=True)
+class Identity:
+    user: object  # django.contrib.auth's User
+    user_id: Optional[int]  # auth_user.id, also the legacy User_ID, None for anonymous users
+    watchlist_id: Optional[int]  # None until the user's Watchlist row exists
+    first_name: Optional[str]
+    last_name: Optional[str]
+
+
+def version_key(user_id):
+    return f'identity:{user_id}'
+
+
+def invalidate(user_id):
+    """Make every session of the user look its legacy rows up again, once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(version_key(user_id), time.time(), timeout=None))
+
+
+def load(user_id):
+    row = Watchlist.objects.filter(user_id=user_id).values_list(
+        'watchlist_id', 'user__first_name', 'user__last_name'
+    ).first()
+    watchlist_id, first_name, last_name = row or (None, None, None)
+    return {'user_id': user_id, 'watchlist_id': watchlist_id, 'first_name': first_name, 'last_name': last_name}
+
+
+def get_identity(request) -> Identity:
+    user = request.user
+    if not user.is_authenticated:
+        return Identity(user=user, user_id=None, watchlist_id=None, first_name=None, last_name=None)
+
+    version = cache.get(version_key(user.id))
+    entry = request.session.get(SESSION_KEY)
+    if entry is None or entry['user_id'] != user.id or entry['version'] != version:
+        entry = {**load(user.id), 'version': version}
+        # a missing watchlist may be created any moment, only complete identities are kept
+        if entry['watchlist_id'] is not None:
+            request.session[SESSION_KEY] = entry
+
+    return Identity(user=user, user_id=user.id, watchlist_id=entry['watchlist_id'], first_name=entry['first_name'],
+                    last_name=entry['last_name'])
@@ -0,0 +1,453 @@
+"""
+Streaming imports for `manage.py import_catalog`.
+
+Input files (CSV with a header row, or JSON lines) go through a generator pipeline: records -> cleaned rows ->
+batches, so only one batch is ever held in memory. Every batch is written in one transaction together with the
+file's ImportCheckpoint row; after a failure, running the same import again resumes after the last committed batch.
+
+Rows that don't validate are skipped and reported with their line number.
+"""
+
+import csv
+import json
+import os
+import re
+import time
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as AuthUser
+from django.db import transaction
+from django.db.models import Max
+from django.utils.crypto import get_random_string
+
+from . import catalog, catalog_file, conditional, fragment_cache, stats, taste
+from .models import History, ImportCheckpoint, Movie, ShowTable, TvSeries, User, Watchlist
+
+GENRE_ALIASES = {
+    'sci fi': 'Sci-Fi',
+    'scifi': 'Sci-Fi',
+    'science fiction': 'Sci-Fi',
+    'sf': 'Sci-Fi',
+    'rom com': 'Romantic Comedy',
+    'romcom': 'Romantic Comedy',
+    'animated': 'Animation',
+    'anime': 'Animation',
+    'doc': 'Documentary',
+    'documentaries': 'Documentary',
+    'thrillers': 'Thriller',
+    'musical': 'Music',
+}
+GENRE_PATTERN = re.compile(r"^[A-Za-z][A-Za-z '&-]*$")
+GENRE_COLUMN_LENGTH = Movie._meta.get_field('genre').max_length
+SHOW_TYPES = {'movie': 'Movie', 'film': 'Movie', 'tv': 'TV', 'tv series': 'TV', 'series': 'TV', 'show': 'TV'}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+### Parsing and validation ###
+
+def read_records(path):
+    """Yield (line number, record) from a .csv file (dicts) or a JSON lines file (unparsed lines)."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+
+
+def as_dict(record):
+    if isinstance(record, dict):
+        return record
+    try:
+        record = json.loads(record)
+    except json.JSONDecodeError as e:
+        raise ImportRowError(f'invalid JSON: {e}') from e
+    if not isinstance(record, dict):
+        raise ImportRowError('expected a JSON object')
+    return record
+
+
+def normalize_genre(genre):
+    genre = ' '.join(genre.replace('_', ' ').split())
+    if genre.lower() in GENRE_ALIASES:
+        return GENRE_ALIASES[genre.lower()]
+    if not GENRE_PATTERN.match(genre):
+        raise ImportRowError(f'invalid genre {genre!r}')
+    return ' '.join('-'.join(part.capitalize() for part in word.split('-')) for word in genre.split(' '))
+
+
+def normalize_genres(value):
+    """
+    Genres as a list, a "['Action', 'Drama']" string like the existing rows, JSON, or separated by | , ; or /.
+    Returns them normalized (aliases resolved, title case, duplicates dropped) in their original order.
+    """
+    if value is None or value == '':
+        return ()
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                try:
+                    value = literal_eval(value)
+                except (ValueError, SyntaxError) as e:
+                    raise ImportRowError(f'unparseable genre list {value!r}') from e
+        else:
+            value = re.split(r'[|,;/]', value)
+    if not isinstance(value, (list, tuple)):
+        raise ImportRowError(f'unparseable genre list {value!r}')
+
+    genres = []
+    for genre in value:
+        if not isinstance(genre, str) or not genre.strip():
+            continue
+        genre = normalize_genre(genre)
+        if genre not in genres:
+            genres.append(genre)
+    return tuple(genres)
+
+
+def genre_column(genres):
+    """The Genre column value, in the same format as the existing rows."""
+    if not genres:
+        return None
+    value = str(list(genres))
+    if len(value) > GENRE_COLUMN_LENGTH:
+        raise ImportRowError(f'genre list {value} is longer than the {GENRE_COLUMN_LENGTH} character Genre column')
+    return value
+
+
+def text(record, field, max_length, required=False):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise ImportRowError(f'{field} is required')
+        return None
+    if len(value) > max_length:
+        raise ImportRowError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def integer(record, field, required=False, minimum=None, maximum=None):
+    value = record.get(field)
+    if value is None or value == '':
+        if required:
+            raise ImportRowError(f'{field} is required')
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError) as e:
+        raise ImportRowError(f'{field} must be a whole number') from e
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ImportRowError(f'{field} must be between {minimum} and {maximum}')
+    return value
+
+
+def day(record, field):
+    value = record.get(field)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError as e:
+        raise ImportRowError(f'{field} must be a YYYY-MM-DD date') from e
+
+
+def batched(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def next_id(*fields):
+    """One past the largest value of the given (model, field) pairs, ids here aren't auto increment."""
+    return max((model.objects.aggregate(top=Max(field))['top'] or 0) for model, field in fields) + 1
+
+
+### Password hashing ###
+
+def _init_hash_worker(settings_module):
+    # needed where workers are spawned rather than forked (macOS, Windows)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hashing_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker,
+                               initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'mtvsrs.settings'),))
+
+
+def hash_passwords(passwords, pool, workers):
+    """make_password for every password, spread across the process pool (hashing is deliberately slow)."""
+    passwords = list(passwords)
+    chunk_size = max(len(passwords) // (workers * 4), 1)
+    return list(pool.map(make_password, passwords, chunksize=chunk_size))
+
+
+### Importers ###
+
+class Importer:
+    """Runs the pipeline, subclasses clean one record at a time and write one batch at a time."""
+    kind = None
+
+    def __init__(self, path, batch_size=1000, restart=False, max_errors=100, log=print):
+        self.path = path
+        self.source = f'{self.kind}:{os.path.abspath(path)}'[-255:]
+        self.batch_size = batch_size
+        self.restart = restart
+        self.max_errors = max_errors
+        self.log = log
+        self.errors = 0
+
+    def clean(self, record):
+        raise NotImplementedError
+
+    def write(self, rows):
+        """Write cleaned rows inside the batch's transaction, returns the number of rows written."""
+        raise NotImplementedError
+
+    def finish(self):
+        """Runs once after the last batch."""
+
+    def cleaned(self, start_line):
+        for line, record in read_records(self.path):
+            if line <= start_line:
+                continue
+            try:
+                yield line, self.clean(as_dict(record))
+            except ImportRowError as e:
+                self.errors += 1
+                self.log(f'line {line}: {e}')
+                if self.errors > self.max_errors:
+                    raise ImportRowError(f'more than {self.max_errors} invalid rows, stopping') from e
+
+    def run(self):
+        checkpoint = ImportCheckpoint.objects.filter(source=self.source).first()
+        if checkpoint and self.restart:
+            checkpoint.delete()
+            checkpoint = None
+        start_line, total = (checkpoint.line, checkpoint.rows) if checkpoint else (0, 0)
+        if start_line:
+            self.log(f'Resuming {self.path} after line {start_line} ({total:,} rows already imported)')
+
+        started = time.perf_counter()
+        imported = 0
+        for batch in batched(self.cleaned(start_line), self.batch_size):
+            with transaction.atomic():
+                imported += self.write([row for _, row in batch])
+                ImportCheckpoint.objects.update_or_create(
+                    source=self.source, defaults={'line': batch[-1][0], 'rows': total + imported}
+                )
+            elapsed = time.perf_counter() - started
+            self.log(f'{self.kind}: {total + imported:,} rows, line {batch[-1][0]}, '
+                     f'{imported / max(elapsed, 1e-9):,.0f} rows/s')
+        self.finish()
+        return imported
+
+
+class ShowImporter(Importer):
+    """
+    Movies and series: type (movie/tv), name, description, genre, release_date and number_of_episodes (series only).
+    Movie/TV_Series ids and their Show_Table rows are assigned in the same transaction.
+    """
+    kind = 'shows'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.show_ids = []
+
+    def run(self):
+        # every batch commits its shows, the catalog file is rewritten once at the end instead of after each one
+        with catalog_file.deferred_refreshes():
+            return super().run()
+
+    def clean(self, record):
+        show_type = SHOW_TYPES.get(str(record.get('type', '')).strip().lower())
+        if show_type is None:
+            raise ImportRowError(f'type must be one of {", ".join(SHOW_TYPES)}')
+        return {
+            'show_type': show_type,
+            'name': text(record, 'name', 100, required=True),
+            'description': text(record, 'description', 300),
+            'genre': genre_column(normalize_genres(record.get('genre', record.get('genres')))),
+            'release_date': day(record, 'release_date'),
+            'number_of_episodes': integer(record, 'number_of_episodes', minimum=0) if show_type == 'TV' else None,
+        }
+
+    def write(self, rows):
+        movie_id = next_id((Movie, 'movie_id'))
+        tv_series_id = next_id((TvSeries, 'tv_series_id'))
+        show_id = next_id((ShowTable, 'show_id'))
+        movies, series, show_table = [], [], []
+        for row in rows:
+            fields = {'name': row['name'], 'description': row['description'], 'genre': row['genre'],
+                      'release_date': row['release_date']}
+            if row['show_type'] == 'Movie':
+                movies.append(Movie(movie_id=movie_id, **fields))
+                show_table.append(ShowTable(show_id=show_id, movie_id=movie_id))
+                movie_id += 1
+            else:
+                series.append(TvSeries(tv_series_id=tv_series_id, number_of_episodes=row['number_of_episodes'],
+                                       **fields))
+                show_table.append(ShowTable(show_id=show_id, tv_series_id=tv_series_id))
+                tv_series_id += 1
+            show_id += 1
+        Movie.objects.bulk_create(movies)
+        TvSeries.objects.bulk_create(series)
+        ShowTable.objects.bulk_create(show_table)
+        new_show_ids = [row.show_id for row in show_table]
+        catalog.sync_show_catalog(new_show_ids)
+        self.show_ids += new_show_ids
+        return len(rows)
+
+    def finish(self):
+        if self.show_ids:
+            catalog.invalidate_catalog()
+            fragment_cache.invalidate(fragment_cache.NEW_RELEASES)
+
+
+class HistoryImporter(Importer):
+    """
+    Ratings and reviews: user_id, show_id, rating (1-5), review and review_date. Existing pairs are kept, the first row
+    of a pair wins. What submit_review's signal keeps up to date is updated per batch, except trending, which
+    `manage.py import_catalog` recounts in one go at the end.
+    """
+    kind = 'history'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_shows = set(ShowTable.objects.values_list('show_id', flat=True))
+        self.known_users = set(User.objects.values_list('user_id', flat=True))
+
+    def clean(self, record):
+        row = {
+            'user_id': integer(record, 'user_id', required=True),
+            'show_id': integer(record, 'show_id', required=True),
+            'rating': integer(record, 'rating', minimum=1, maximum=5),
+            'review': text(record, 'review', 300),
+            'review_date': day(record, 'review_date') or date.today(),
+        }
+        if row['show_id'] not in self.known_shows:
+            raise ImportRowError(f'unknown show_id {row["show_id"]}')
+        if row['user_id'] not in self.known_users:
+            raise ImportRowError(f'unknown user_id {row["user_id"]}')
+        return row
+
+    def write(self, rows):
+        pairs = {}
+        for row in rows:
+            pairs.setdefault((row['user_id'], row['show_id']), row)
+        # read in the batch's transaction, on the primary, so only the rows inserted are counted and recounted
+        existing = set(History.objects.filter(user_id__in={user_id for user_id, _ in pairs},
+                                              show_id__in={show_id for _, show_id in pairs})
+                       .values_list('user_id', 'show_id'))
+        rows = [row for pair, row in pairs.items() if pair not in existing]
+        if not rows:
+            return 0
+        History.objects.bulk_create(
+            [History(user_id_id=row['user_id'], show_id_id=row['show_id'], rating=row['rating'],
+                     review=row['review'], review_date=row['review_date']) for row in rows],
+            ignore_conflicts=True,  # a review submitted meanwhile is kept
+        )
+        user_ids = {row['user_id'] for row in rows}
+        stats.rebuild_show_stats({row['show_id'] for row in rows})
+        taste.rebuild_taste_profiles(user_ids)
+        fragment_cache.invalidate_recommendations(user_ids)
+        conditional.bump(*map(conditional.user_key, user_ids))
+        return len(rows)
+
+
+class UserImporter(Importer):
+    """
+    Seed users: username, first_name, last_name, email, birthday and password. Users without a password get a random
+    one, written to passwords_out. Passwords are hashed across a process pool.
+    """
+    kind = 'users'
+
+    def __init__(self, *args, workers=None, passwords_out=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = workers or os.cpu_count()
+        self.passwords_out = passwords_out
+        self.pool = None
+
+    def clean(self, record):
+        password = text(record, 'password', 128)
+        return {
+            'username': text(record, 'username', 150, required=True),
+            'first_name': text(record, 'first_name', 100, required=True),
+            'last_name': text(record, 'last_name', 100),
+            'email': text(record, 'email', 254) or '',
+            'birthday': day(record, 'birthday'),
+            'password': password,
+            'generated': password is None,
+        }
+
+    def run(self):
+        with hashing_pool(self.workers) as pool:
+            self.pool = pool
+            return super().run()
+
+    def write(self, rows):
+        # usernames are unique, skip ones that exist already or repeat within the batch
+        existing = set(AuthUser.objects.filter(username__in=[row['username'] for row in rows])
+                       .values_list('username', flat=True))
+        new_rows = []
+        for row in rows:
+            if row['username'] in existing:
+                self.log(f'skipping user {row["username"]!r}, the username is taken')
+                continue
+            existing.add(row['username'])
+            new_rows.append(row)
+        rows = new_rows
+
+        for row in rows:
+            if row['generated']:
+                row['password'] = get_random_string(12)
+        hashed = hash_passwords((row['password'] for row in rows), self.pool, self.workers)
+
+        # auth_user and the legacy User table share ids, assigned here since bulk_create can't return them on MySQL
+        user_id = next_id((AuthUser, 'id'), (User, 'user_id'))
+        auth_users, users, watchlists = [], [], []
+        for row, password in zip(rows, hashed):
+            auth_users.append(AuthUser(id=user_id, username=row['username'], password=password, email=row['email'],
+                                       first_name=row['first_name'], last_name=row['last_name'] or ''))
+            users.append(User(user_id=user_id, first_name=row['first_name'], last_name=row['last_name'],
+                              birthday=row['birthday']))
+            watchlists.append(Watchlist(watchlist_id=user_id, user_id=user_id))
+            user_id += 1
+        AuthUser.objects.bulk_create(auth_users)
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        Watchlist.objects.bulk_create(watchlists, ignore_conflicts=True)
+
+        generated = [row for row in rows if row['generated']]
+        if generated and self.passwords_out:
+            # only written once the batch is committed
+            transaction.on_commit(lambda: self.write_passwords(generated))
+        return len(rows)
+
+    def write_passwords(self, rows):
+        new_file = not os.path.exists(self.passwords_out)
+        with open(self.passwords_out, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['username', 'password'])
+            writer.writerows((row['username'], row['password']) for row in rows)
+
+
+IMPORTERS = {importer.kind: importer for importer in (ShowImporter, HistoryImporter, UserImporter)}
@@ -0,0 +1,198 @@
+"""
+Per-request timing: SQL, template rendering and chart rendering, see QueryInstrumentationMiddleware.
+
+The middleware puts a RequestMetrics in a ContextVar for the duration of the request. track_queries() wraps the cursors
+of every database alias in this thread with connection.execute_wrapper, and timed(phase) times a block of code; both
+add to whatever RequestMetrics is current and do nothing outside a request. Finished requests go into per-view
+histograms that `/metrics` renders in the Prometheus text format. Histograms are per process, each worker reports its
+own.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.statements = Counter()
+        self.phases = defaultdict(float)  # phase -> seconds
+        # async views run queries from several threads at once
+        self.lock = threading.Lock()
+
+    def add_query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.statements[sql] += 1
+            self.phases['db'] += duration
+
+    def add_phase(self, phase, duration):
+        with self.lock:
+            self.phases[phase] += duration
+
+    def n_plus_one_suspects(self):
+        """Statements run at least settings.N_PLUS_ONE_THRESHOLD times with different parameters."""
+        threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    def server_timing(self, total):
+        parts = [f'db;dur={self.phases.get("db", 0.0) * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f'{phase};dur={duration * 1000:.1f}' for phase, duration in self.phases.items() if phase != 'db']
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+current = ContextVar('request_metrics', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+@contextmanager
+def track_queries():
+    """Count and time the queries of every database alias made in this thread."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(_record_query))
+        yield
+
+
+@contextmanager
+def timed(phase):
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(phase, time.perf_counter() - start)
+
+
+### Templates ###
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('render'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with rendering time added to the request's 'render' phase."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+### Histograms ###
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # view -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self.lock:
+            series = self.series.setdefault(view, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for view, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{view="{view}",le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{view="{view}"}} {series[-2]}')
+                lines.append(f'{self.name}_count{{view="{view}"}} {series[-1]}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = Counter()
+        self.lock = threading.Lock()
+
+    def inc(self, view, amount=1):
+        with self.lock:
+            self.values[view] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            lines += [f'{self.name}{{view="{view}"}} {value}' for view, value in sorted(self.values.items())]
+        return lines
+
+
+request_duration = Histogram('mtvsrs_request_duration_seconds', 'Time spent handling the request.',
+                             DURATION_BUCKETS)
+db_duration = Histogram('mtvsrs_db_duration_seconds', 'Time spent in database queries per request.',
+                        DURATION_BUCKETS)
+render_duration = Histogram('mtvsrs_render_duration_seconds', 'Time spent rendering templates per request.',
+                            DURATION_BUCKETS)
+query_count = Histogram('mtvsrs_db_queries', 'Database queries per request.', QUERY_BUCKETS)
+n_plus_one = CounterMetric('mtvsrs_n_plus_one_suspects_total',
+                           'Statements repeated N_PLUS_ONE_THRESHOLD or more times within one request.')
+
+METRICS = [request_duration, db_duration, render_duration, query_count, n_plus_one]
+
+
+def observe(view, metrics, total):
+    request_duration.observe(view, total)
+    db_duration.observe(view, metrics.phases.get('db', 0.0))
+    render_duration.observe(view, metrics.phases.get('render', 0.0))
+    query_count.observe(view, metrics.queries)
+
+    suspects = metrics.n_plus_one_suspects()
+    if suspects:
+        n_plus_one.inc(view, len(suspects))
+        for sql, count in suspects.items():
+            logger.warning("Possible N+1 in %s, ran %d times: %s", view, count, sql)
+
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
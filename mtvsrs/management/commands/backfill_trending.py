@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from mtvsrs.trending import backfill, refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trending activity counters from existing History and WatchlistShow rows."
+
+    def handle(self, *args, **options):
+        count = backfill()
+        self.stdout.write(f"Rebuilt activity counters for {count} shows")
+        count = refresh_trending()
+        self.stdout.write(self.style.SUCCESS(f"Trending refreshed with {count} shows"))
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import override_settings
+
+from mtvsrs import async_views, views
+from mtvsrs.benchmark import percentile
+from mtvsrs.catalog import get_catalog
+from mtvsrs.identity import get_identity
+
+
+class Command(BaseCommand):
+    help = ("Compare p50/p99 latency of the sync (WSGI) and async (ASGI) home and show pages, with a simulated delay "
+            "added to every database query to stand in for a remote database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay added to every query.")
+        parser.add_argument("--requests", type=int, default=50, help="Requests per page and mode.")
+        parser.add_argument("--concurrency", type=int, default=1,
+                            help="Requests in flight at once, sync requests use that many threads like WSGI workers.")
+        parser.add_argument("--user", type=int, help="User id to request pages as, defaults to the first user.")
+        parser.add_argument("--show", type=int, help="Show id for the show page, defaults to the first show.")
+        parser.add_argument("--cache", action="store_true",
+                            help="Keep the configured cache, by default sections are recomputed on every request.")
+
+    def handle(self, *args, **options):
+        latency = options["latency_ms"] / 1000
+        user = User.objects.filter(pk=options["user"]).first() if options["user"] else User.objects.first()
+        if user is None:
+            raise CommandError("No user to request pages as")
+        identity = self.identity(user)
+        show_id = options["show"] or next((show.show_id for show in get_catalog()), None)
+        if show_id is None:
+            raise CommandError("The catalog is empty")
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(connection, **kwargs):
+            # every thread has its own connection, wrappers are added as they connect
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        connection_created.connect(add_delay)
+        add_delay(connection)
+
+        cache_settings = {} if options["cache"] else {
+            "CACHES": {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        }
+        pages = [
+            ("home", "/", views.home_page, async_views.home_page, {}),
+            ("show", f"/show/{show_id}/", views.show_page, async_views.show_page, {"show_id": show_id}),
+        ]
+        try:
+            with override_settings(**cache_settings):
+                for name, path, sync_view, async_view, kwargs in pages:
+                    for mode, timings in (
+                        ("sync", self.run_sync(sync_view, path, kwargs, identity, options)),
+                        ("async", self.run_async(async_view, path, kwargs, identity, options)),
+                    ):
+                        timings.sort()
+                        self.stdout.write(
+                            f"{name:<5} {mode:<5} p50 {percentile(timings, 50) * 1000:8.1f} ms  "
+                            f"p99 {percentile(timings, 99) * 1000:8.1f} ms  "
+                            f"mean {sum(timings) / len(timings) * 1000:8.1f} ms"
+                        )
+        finally:
+            connection_created.disconnect(add_delay)
+            connection.execute_wrappers.remove(delay)
+
+    def run_sync(self, view, path, kwargs, identity, options):
+        factory = RequestFactory()
+
+        def timed(_):
+            request = self.authenticated(factory.get(path), identity)
+            start = time.perf_counter()
+            response = view(request, **kwargs)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f"{path} returned {response.status_code}")
+            return elapsed
+
+        view(self.authenticated(factory.get(path), identity), **kwargs)  # warm up the catalog and caches
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            return list(pool.map(timed, range(options["requests"])))
+
+    def run_async(self, view, path, kwargs, identity, options):
+        factory = AsyncRequestFactory()
+
+        async def timed(semaphore):
+            async with semaphore:
+                request = self.authenticated(factory.get(path), identity)
+                start = time.perf_counter()
+                response = await view(request, **kwargs)
+                elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f"{path} returned {response.status_code}")
+            return elapsed
+
+        async def run_all():
+            await view(self.authenticated(factory.get(path), identity), **kwargs)
+            semaphore = asyncio.Semaphore(options["concurrency"])
+            return await asyncio.gather(*(timed(semaphore) for _ in range(options["requests"])))
+
+        return list(asyncio.run(run_all()))
+
+    @staticmethod
+    def identity(user):
+        # what IdentityMiddleware gives every request of a signed in session once the legacy rows are in the session
+        request = RequestFactory().get("/")
+        request.user = user
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        return get_identity(request)
+
+    @staticmethod
+    def authenticated(request, identity):
+        request.user = identity.user
+        request.identity = identity
+        return request
@@ -0,0 +1,105 @@
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs.benchmark import synthetic_catalog
+from mtvsrs.catalog import CatalogSnapshot, load_shows
+from mtvsrs.catalog_file import MappedCatalog, write_catalog_file
+
+# baseline is a worker without any catalog, what the other two add on top of Python and Django
+MODES = ["baseline", "snapshot", "file"]
+
+
+def memory_usage():
+    """RSS, PSS and private memory of this process in bytes (Linux only)."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                values[key] = int(value.split()[0]) * 1024
+    return {"rss": values["Rss"], "pss": values["Pss"], "private": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+class Command(BaseCommand):
+    help = ("Compare the memory of worker processes holding the catalog as their own snapshot of Show_Catalog and "
+            "as the shared memory-mapped catalog file. Starts --workers processes per mode that stay alive together, "
+            "so pages they share count once in PSS (proportional set size).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--shows", type=int,
+                            help="Use this many synthetic shows instead of the database's Show_Catalog.")
+        parser.add_argument("--seed", type=int, default=0)
+        # a worker process started by this command
+        parser.add_argument("--worker", choices=MODES, help="Internal.")
+        parser.add_argument("--file", help="Internal.")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.worker(options)
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            raise CommandError("Needs /proc/self/smaps_rollup (Linux 4.14 or later)")
+
+        shows = synthetic_catalog(options["shows"], options["seed"]) if options["shows"] else list(load_shows())
+        with tempfile.TemporaryDirectory() as directory:
+            path, count = write_catalog_file(shows, os.path.join(directory, "catalog.bin"))
+            self.stdout.write(f"{count} shows, catalog file {os.path.getsize(path):,} bytes")
+            results = {mode: self.run_workers(mode, path, options) for mode in MODES}
+
+        self.stdout.write(f"\n{'mode':<10}{'RSS MB':>10}{'PSS MB':>10}{'private MB':>12}{'load ms':>10}"
+                          f"{'total PSS MB':>14}")
+        for mode, workers in results.items():
+            mean = {key: sum(worker[key] for worker in workers) / len(workers) for key in workers[0]}
+            self.stdout.write(f"{mode:<10}{mean['rss'] / 2 ** 20:>10.1f}{mean['pss'] / 2 ** 20:>10.1f}"
+                              f"{mean['private'] / 2 ** 20:>12.1f}{mean['load_seconds'] * 1000:>10.1f}"
+                              f"{sum(worker['pss'] for worker in workers) / 2 ** 20:>14.1f}")
+
+    def run_workers(self, mode, path, options):
+        command = [sys.executable, sys.argv[0], "benchmark_catalog_memory", "--worker", mode, "--file", path,
+                   "--seed", str(options["seed"])]
+        if options["shows"]:
+            command += ["--shows", str(options["shows"])]
+        workers = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                   for _ in range(options["workers"])]
+        try:
+            # every worker reports once it's loaded and then waits, so they're all measured while alive together
+            lines = [worker.stdout.readline() for worker in workers]
+            # measured again now that every worker has mapped the file, PSS splits shared pages between them
+            for worker in workers:
+                worker.stdin.write("measure\n")
+                worker.stdin.flush()
+            lines = [{**json.loads(line), **json.loads(worker.stdout.readline())}
+                     for line, worker in zip(lines, workers)]
+        finally:
+            for worker in workers:
+                worker.stdin.close()
+                worker.wait()
+        return lines
+
+    def worker(self, options):
+        started = time.perf_counter()
+        if options["worker"] == "snapshot":
+            shows = synthetic_catalog(options["shows"], options["seed"]) if options["shows"] else load_shows()
+            catalog = CatalogSnapshot(shows, 0)
+            del shows
+        elif options["worker"] == "file":
+            catalog = MappedCatalog(options["file"], 0)
+        else:
+            catalog = ()
+        load_seconds = time.perf_counter() - started
+        # a worker that has served every show once
+        for show in catalog:
+            show.genres
+        gc.collect()
+
+        print(json.dumps({"load_seconds": load_seconds}), flush=True)
+        sys.stdin.readline()
+        print(json.dumps(memory_usage()), flush=True)
+        sys.stdin.read()
@@ -0,0 +1,161 @@
+import json
+import random
+import time
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from mtvsrs import routers
+from mtvsrs.benchmark import (ADJECTIVES, NOUNS, STATUSES, QueryCounter, load_dataset, on_every_connection, percentile,
+                              skewed_show_id)
+from mtvsrs.models import ShowTable
+
+ENDPOINTS = ['home_page', 'show_page', 'my_list_page', 'search_feature', 'change_status', 'submit_review']
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'queries', 'rows']
+
+
+class Command(BaseCommand):
+    help = ("Create the schema in a throwaway test database, fill it with synthetic data and measure latency, query "
+            "count and rows fetched of every view. Fails when a result goes over the --budget file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shows", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--history", type=int, default=100000, help="History (rating/review) rows.")
+        parser.add_argument("--watchlist", type=int, default=50000, help="WatchlistShow rows.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument("--clients", type=int, default=20,
+                            help="Distinct logged in users the requests rotate over.")
+        parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument("--recommendations", action="store_true",
+                            help="Run build_recommendations after loading, otherwise the home page uses the genre "
+                                 "based fallback.")
+        parser.add_argument("--cache", action="store_true",
+                            help="Keep the configured cache, by default cached sections are recomputed every time.")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Keep the test database (and its data) between runs, set DATABASES TEST NAME to a "
+                                 "file for SQLite.")
+        parser.add_argument("--budget",
+                            help="JSON file of {endpoint: {metric: limit}}, metrics are " + ", ".join(METRICS))
+        parser.add_argument("--write-budget",
+                            help="Write this run's results to a budget file, latencies get --headroom on top.")
+        parser.add_argument("--headroom", type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        budget = {}
+        if options["budget"]:
+            with open(options["budget"]) as f:
+                budget = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            # only the primary gets a test database, reads must not go to the real replicas
+            with routers.pinned_to_primary():
+                self.load(options)
+                cache_settings = {} if options["cache"] else {
+                    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+                }
+                with override_settings(**cache_settings):
+                    clients = self.login(options)
+                    results = {endpoint: self.measure(endpoint, clients, options)
+                               for endpoint in options["endpoints"]}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        self.stdout.write(f"\n{'endpoint':<16}" + "".join(f"{metric:>10}" for metric in METRICS))
+        for endpoint, result in results.items():
+            self.stdout.write(f"{endpoint:<16}" + "".join(f"{result[metric]:>10.1f}" for metric in METRICS))
+
+        if options["write_budget"]:
+            written = {
+                endpoint: {metric: round(value * (1 + options["headroom"]), 1) if metric.endswith("_ms") else value
+                           for metric, value in result.items()}
+                for endpoint, result in results.items()
+            }
+            with open(options["write_budget"], "w") as f:
+                json.dump(written, f, indent=2)
+
+        over = [
+            f"{endpoint} {metric} {results[endpoint][metric]:.1f} > {limit}"
+            for endpoint, limits in budget.items() if endpoint in results
+            for metric, limit in limits.items() if results[endpoint][metric] > limit
+        ]
+        if over:
+            raise CommandError("Over budget:\n  " + "\n  ".join(over))
+        if budget:
+            self.stdout.write(self.style.SUCCESS("Within budget"))
+
+    def load(self, options):
+        if ShowTable._meta.db_table in connection.introspection.table_names() and ShowTable.objects.exists():
+            self.stdout.write("Reusing the data of the kept test database")
+            return
+        load_dataset(options["shows"], options["users"], options["history"], options["watchlist"],
+                     seed=options["seed"], log=self.stdout.write)
+        if options["recommendations"]:
+            call_command("build_recommendations", stdout=self.stdout)
+
+    def login(self, options):
+        rnd = random.Random(options["seed"])
+        n_users = AuthUser.objects.count()
+        clients = []
+        for user_id in rnd.sample(range(1, n_users + 1), min(options["clients"], n_users)):
+            client = Client()
+            # skips password hashing, which would dominate the setup time
+            client.force_login(AuthUser.objects.get(pk=user_id))
+            clients.append((user_id, client))
+        return clients
+
+    def measure(self, endpoint, clients, options):
+        rnd = random.Random(options["seed"])
+        n_shows = ShowTable.objects.count()
+
+        counter = QueryCounter()
+        timings, queries, rows = [], [], []
+        for _ in range(options["iterations"]):
+            user_id, client = rnd.choice(clients)
+            show_id = skewed_show_id(rnd, n_shows)
+            if endpoint == "home_page":
+                request = lambda: client.get(reverse("home"))
+            elif endpoint == "show_page":
+                request = lambda: client.get(reverse("show", args=[show_id]))
+            elif endpoint == "my_list_page":
+                request = lambda: client.get(reverse("my_list"))
+            elif endpoint == "search_feature":
+                query = rnd.choice([rnd.choice(ADJECTIVES), rnd.choice(NOUNS), rnd.choice(ADJECTIVES)[:3]])
+                request = lambda: client.get(reverse("search_view"), {"search_query": query})
+            elif endpoint == "change_status":
+                request = lambda: client.post(reverse("change_status"), {
+                    "showId": show_id, "newStatus": rnd.choice(STATUSES)
+                })
+            else:
+                request = lambda: client.post(reverse("submit_review"), {
+                    "show_id": show_id, "rating": rnd.randint(1, 5), "review": "Benchmark review"
+                })
+
+            counter.reset()
+            with on_every_connection(counter):
+                start = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(f"{endpoint} returned {response.status_code}")
+            timings.append(elapsed * 1000)
+            queries.append(counter.queries)
+            rows.append(counter.rows)
+
+        timings.sort()
+        return {
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "queries": sum(queries) / len(queries),
+            "rows": sum(rows) / len(rows),
+        }
@@ -0,0 +1,24 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from mtvsrs.catalog import invalidate_catalog, load_shows
+from mtvsrs.catalog_file import catalog_file_path, write_catalog_file
+
+
+class Command(BaseCommand):
+    help = ("Write Show_Catalog to the columnar file every worker memory-maps (settings.CATALOG_FILE). Running "
+            "workers switch to the new version on their next request, once it exists it is kept up to date with "
+            "Show_Catalog.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help=f"Defaults to settings.CATALOG_FILE ({catalog_file_path()}).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path, count = write_catalog_file(load_shows(), options["output"])
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} shows to {path} ({os.path.getsize(path):,} bytes) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,77 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs.models import History
+from mtvsrs.recommendations import RatingMatrix, feedback_shows, item_similarities, recommend, write_recommendations
+
+
+class Command(BaseCommand):
+    help = "Precompute item-item collaborative filtering recommendations from History into the Recommendation table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, nargs="+", help="Only rebuild recommendations for these user ids.")
+        parser.add_argument("--since", type=date.fromisoformat,
+                            help="Incremental mode: only rebuild users with History reviewed on or after this "
+                                 "date (YYYY-MM-DD).")
+        parser.add_argument("--top-n", type=int, default=10, help="Recommendations stored per user.")
+        parser.add_argument("--neighbours", type=int, default=50, help="Similar shows kept per show.")
+        parser.add_argument("--chunk-size", type=int, default=256,
+                            help="Shows per similarity chunk, bounds memory to chunk-size x number of shows.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users written per transaction.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        user_ids = None
+        if options["users"]:
+            user_ids = set(options["users"])
+        if options["since"]:
+            recent = set(History.objects.filter(review_date__gte=options["since"])
+                         .values_list("user_id", flat=True).distinct())
+            user_ids = recent if user_ids is None else user_ids & recent
+            if not user_ids:
+                # a quiet day for the nightly incremental run, not an error
+                self.stdout.write(f"Nothing to do, no selected user has History since {options['since']}")
+                return
+
+        ratings = RatingMatrix.from_history()
+        n_users, n_shows = ratings.shape
+        self.stdout.write(f"Loaded {ratings.matrix.nnz} ratings from {n_users} users over {n_shows} shows")
+        if not ratings.matrix.nnz:
+            self.stdout.write("Nothing to do")
+            return
+
+        if user_ids is None:
+            user_rows = range(n_users)
+        else:
+            user_rows = ratings.user_rows(user_ids)
+            if not len(user_rows):
+                if options["since"]:
+                    # their recent History only has reviews without a rating
+                    self.stdout.write("Nothing to do, none of the selected users have rated any show")
+                    return
+                raise CommandError("None of the selected users have rated any show")
+
+        similarities = item_similarities(
+            ratings, neighbours=options["neighbours"], chunk_size=options["chunk_size"],
+            progress=lambda done, total: self.stdout.write(f"  similarities {done}/{total} shows", ending="\r"),
+        )
+        self.stdout.write(f"\nComputed {similarities.nnz} show neighbours")
+
+        exclude = feedback_shows(user_ids)
+        written = 0
+        batch = []
+        for user_recommendations in recommend(ratings, similarities, list(user_rows), top_n=options["top_n"],
+                                              exclude=exclude):
+            batch.append(user_recommendations)
+            if len(batch) >= options["batch_size"]:
+                written += write_recommendations(batch)
+                batch = []
+        if batch:
+            written += write_recommendations(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} recommendations for {len(user_rows)} users in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,40 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from mtvsrs import conditional
+from mtvsrs.catalog import get_catalog
+from mtvsrs.text_index import DEFAULT_FEATURES, index_path, nearest_neighbours, tfidf_matrix, write_index
+
+
+class Command(BaseCommand):
+    help = ("Precompute every show's most similar shows by the words of its name and description (TF-IDF, cosine "
+            "similarity) into the file the show page memory-maps.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--neighbours", type=int, default=20, help="Similar shows kept per show.")
+        parser.add_argument("--features", type=int, default=DEFAULT_FEATURES,
+                            help="Hashed word features, more means fewer collisions between words.")
+        parser.add_argument("--chunk-size", type=int, default=256,
+                            help="Shows per similarity chunk, bounds memory to chunk-size x number of shows.")
+        parser.add_argument("--output", help=f"Defaults to settings.SIMILAR_SHOWS_INDEX ({index_path()}).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        shows = list(get_catalog())
+        matrix = tfidf_matrix(shows, options["features"])
+        self.stdout.write(f"Vectorized {len(shows)} shows, {matrix.nnz} non-zero features")
+
+        neighbours = nearest_neighbours(
+            matrix, k=options["neighbours"], chunk_size=options["chunk_size"],
+            progress=lambda done, total: self.stdout.write(f"  neighbours {done}/{total} shows", ending="\r"),
+        )
+        path = write_index([show.show_id for show in shows], neighbours, options["output"])
+        # every show page lists similar shows, revisits must not keep the old ones
+        conditional.bump(conditional.GLOBAL)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nWrote {path} ({os.path.getsize(path):,} bytes) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from mtvsrs import routers
+from mtvsrs.benchmark import load_dataset
+from mtvsrs.models import ShowTable
+from mtvsrs.query_plans import FULL_SCAN_ALLOWED, RequestFailed, analyze, collect_plans
+
+LEGACY_TABLES = ['Movie', 'TV_Series', 'Show_Table', 'User', 'Watchlist', 'History', 'WatchlistShow', 'Recommendation']
+
+
+class Command(BaseCommand):
+    help = ("Load synthetic data into a throwaway test database, request every page and endpoint, and EXPLAIN each "
+            "query they run. Fails when a query reads a whole table, i.e. an index is missing or can't be used.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shows", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--history", type=int, default=20000, help="History (rating/review) rows.")
+        parser.add_argument("--watchlist", type=int, default=10000, help="WatchlistShow rows.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--allow", nargs="+", default=[], metavar="TABLE",
+                            help="More tables that may be read in full.")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Keep the test database (and its data) between runs, set DATABASES TEST NAME to a "
+                                 "file for SQLite.")
+        parser.add_argument("--verbose", action="store_true", help="Print every plan, not just the failing ones.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            # only the primary gets a test database, reads must not go to the real replicas
+            with routers.pinned_to_primary():
+                self.load(options)
+                analyze(connection, LEGACY_TABLES)
+                # every section is computed, a cached one would hide its queries
+                with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+                    plans = collect_plans(FULL_SCAN_ALLOWED | set(options["allow"]))
+        except RequestFailed as e:
+            raise CommandError(str(e)) from e
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        failures = []
+        for endpoint, alias, plan in plans:
+            if plan.full_scans:
+                failures.append(f"{endpoint}: full scan of {', '.join(plan.full_scans)}")
+            if options["verbose"] or plan.full_scans:
+                self.stdout.write(f"\n{endpoint} ({alias}): {plan.sql}")
+                for line in plan.lines:
+                    self.stdout.write(f"    {line}")
+            if options["verbose"]:
+                for warning in plan.warnings:
+                    self.stdout.write(self.style.WARNING(f"    warning: {warning}"))
+
+        self.stdout.write(f"\n{len(plans)} distinct queries explained")
+        if failures:
+            raise CommandError("Full table scans:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("No full table scans"))
+
+    def load(self, options):
+        if ShowTable._meta.db_table in connection.introspection.table_names() and ShowTable.objects.exists():
+            self.stdout.write("Reusing the data of the kept test database")
+            return
+        load_dataset(options["shows"], options["users"], options["history"], options["watchlist"],
+                     seed=options["seed"], log=self.stdout.write)
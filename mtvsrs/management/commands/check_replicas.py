@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs.routers import check_replica
+
+
+class Command(BaseCommand):
+    help = "Check that every read replica is reachable and within REPLICA_MAX_LAG_SECONDS of the primary."
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas:
+            self.stdout.write("No replicas configured, every query goes to the primary")
+            return
+
+        unhealthy = []
+        for alias in replicas:
+            healthy, lag = check_replica(alias)
+            lag_text = "unknown" if lag is None else f"{lag}s"
+            if healthy:
+                self.stdout.write(self.style.SUCCESS(f"{alias}: healthy, lag {lag_text}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{alias}: unhealthy, lag {lag_text}"))
+                unhealthy.append(alias)
+
+        if unhealthy:
+            raise CommandError(f"{len(unhealthy)} of {len(replicas)} replicas unhealthy, "
+                               "reads fall back to the primary")
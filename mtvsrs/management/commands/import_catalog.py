@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs.importer import IMPORTERS, ImportRowError, UserImporter
+from mtvsrs.trending import backfill, refresh_trending
+
+
+class Command(BaseCommand):
+    help = ("Stream shows, seed users or History rows from CSV (with a header row) or JSON lines files into the "
+            "database. Interrupted imports resume from their checkpoint when run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS),
+                            help="shows: type,name,description,genre,release_date,number_of_episodes; "
+                                 "users: username,first_name,last_name,email,birthday,password; "
+                                 "history: user_id,show_id,rating,review,review_date")
+        parser.add_argument("files", nargs="+", help=".csv or .jsonl files, imported in order.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows written per transaction.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and import from the top.")
+        parser.add_argument("--max-errors", type=int, default=100,
+                            help="Stop once more than this many rows of a file failed validation.")
+        parser.add_argument("--workers", type=int, help="Password hashing processes, defaults to the CPU count.")
+        parser.add_argument("--passwords-out",
+                            help="CSV the generated passwords of users imported without one are appended to, "
+                                 "defaults to <file>.passwords.csv.")
+
+    def handle(self, *args, **options):
+        importer_class = IMPORTERS[options["kind"]]
+        total = 0
+        for path in options["files"]:
+            kwargs = {}
+            if importer_class is UserImporter:
+                kwargs = {"workers": options["workers"],
+                          "passwords_out": options["passwords_out"] or f"{path}.passwords.csv"}
+            importer = importer_class(path, batch_size=options["batch_size"], restart=options["restart"],
+                                      max_errors=options["max_errors"], log=self.stdout.write, **kwargs)
+            try:
+                imported = importer.run()
+            except (ImportRowError, OSError) as e:
+                raise CommandError(f"{path}: {e}") from e
+            total += imported
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: imported {imported:,} rows, skipped {importer.errors:,} invalid rows"
+            ))
+
+        if options["kind"] == "history" and total:
+            # show stats and taste profiles were updated batch by batch
+            self.stdout.write("Recounting trending activity")
+            backfill()
+            refresh_trending()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mtvsrs.catalog import rebuild_show_catalog
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized Show_Catalog table from Movie, TV_Series and Show_Table."
+
+    def handle(self, *args, **options):
+        count = rebuild_show_catalog()
+        self.stdout.write(self.style.SUCCESS(f"Show_Catalog rebuilt with {count} shows"))
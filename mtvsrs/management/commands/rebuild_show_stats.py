@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs.stats import rebuild_show_stats, verify_show_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the per-show status and score distributions in Show_Stats from WatchlistShow and History."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Only compare Show_Stats with the source tables and fail on any drift.")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            mismatches = verify_show_stats()
+            for show_id, field, stored, expected in mismatches:
+                self.stdout.write(f"Show {show_id}: {field} is {stored}, expected {expected}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} counters drifted, run without --verify to rebuild")
+            self.stdout.write(self.style.SUCCESS("Show_Stats matches WatchlistShow and History"))
+            return
+
+        stats = rebuild_show_stats()
+        self.stdout.write(self.style.SUCCESS(f"Show_Stats rebuilt for {len(stats)} shows"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from mtvsrs.taste import rebuild_taste_profiles
+
+
+class Command(BaseCommand):
+    help = ("Recompute the per-user genre affinities in User_Taste_Profile from History ratings and WatchlistShow "
+            "statuses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", nargs="+", type=int, help="Only rebuild these User_IDs.")
+
+    def handle(self, *args, **options):
+        profiles = rebuild_taste_profiles(options["users"])
+        self.stdout.write(self.style.SUCCESS(f"User_Taste_Profile rebuilt for {len(profiles)} users"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from mtvsrs.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the trending top-K shown on the home page, run it on a schedule (e.g. every 5 minutes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, help="Number of shows to keep, defaults to settings.TRENDING_SIZE.")
+
+    def handle(self, *args, **options):
+        count = refresh_trending(options["size"])
+        self.stdout.write(self.style.SUCCESS(f"Trending refreshed with {count} shows"))
@@ -0,0 +1,36 @@
+import logging
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mtvsrs import server
+
+
+class Command(BaseCommand):
+    help = ("Production server: warms up the app once, then forks --workers processes sharing it, behind NGINX. "
+            "kill -HUP the parent for a rolling restart onto new code, kill -TERM for a graceful stop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="127.0.0.1:8000", help="host:port, the upstream in nginx.conf.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--warmup-timeout", type=float, default=60,
+                            help="Seconds a new worker has to pass its health check before it is restarted.")
+        parser.add_argument("--graceful-timeout", type=float, default=30,
+                            help="Seconds workers get to finish their requests on stop or restart before being killed.")
+        parser.add_argument("--access-log", action="store_true")
+
+    def handle(self, *args, **options):
+        host, _, port = options["bind"].rpartition(":")
+        if not host or not port.isdigit():
+            raise CommandError(f"--bind takes host:port, not {options['bind']}")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(asctime)s [%(process)d] %(levelname)s %(message)s"))
+        server.logger.addHandler(handler)
+        server.logger.setLevel(logging.INFO)
+
+        server.serve(host.strip("[]"), int(port), options["workers"], options["warmup_timeout"],
+                     options["graceful_timeout"], options["access_log"])
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import os
+import re
+import shutil
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+VENDOR_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "static", "vendor")
+
+# name -> (pinned url, subresource integrity of the file at that url)
+ASSETS = {
+    "htmx.min.js": (
+        "https://unpkg.com/htmx.org@1.9.12/dist/htmx.min.js",
+        "sha384-ujb1lZYygJmzgSwoxRggbCHcjc0rB2XoQrxeTUQyRjrOnlCoYta87iKBWq3EsdM2",
+    ),
+    "bootstrap.min.css": (
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.0.2/dist/css/bootstrap.min.css",
+        "sha384-EVSTQN3/azprG1Anm3QDgpJLIm9Nao0Yz1ztcQTwFspd3yD65VohhpuuCOmLASjC",
+    ),
+    "bootstrap.bundle.min.js": (
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.0.2/dist/js/bootstrap.bundle.min.js",
+        "sha384-MrcW6ZMFYlzcLA8Nl+NtUVF0sA7MsXsP1UyJoMp4YLEuNSfAP+JcXn/tWtIaxVXM",
+    ),
+    "jquery.min.js": (
+        "https://code.jquery.com/jquery-3.7.1.min.js",
+        "sha256-/JqT3SQfawRcv/BIHPThkBvs0OEvtFFmqPF/lYI/Cxo=",
+    ),
+}
+
+# source maps aren't vendored, collectstatic would fail to fingerprint the files they point to
+SOURCE_MAP = re.compile(rb"^(//# sourceMappingURL=.*|/\*# sourceMappingURL=.*\*/)[ \t]*$", re.MULTILINE)
+
+
+def integrity(data, algorithm):
+    return f"{algorithm}-{base64.b64encode(hashlib.new(algorithm, data).digest()).decode()}"
+
+
+class Command(BaseCommand):
+    help = ("Download the pinned htmx, Bootstrap and jQuery builds (checked against their integrity hashes) and copy "
+            "plotly.js from the installed plotly package into mtvsrs/static/vendor, so pages load no third-party "
+            "assets. Run before collectstatic.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Download files that are already vendored again.")
+
+    def handle(self, *args, **options):
+        os.makedirs(VENDOR_DIR, exist_ok=True)
+
+        # the interactive score chart (?chart=rich) loads plotly.js, the version matching the installed package
+        try:
+            import plotly
+        except ImportError:
+            self.stdout.write("plotly.min.js: plotly isn't installed, skipped")
+        else:
+            source = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+            shutil.copyfile(source, os.path.join(VENDOR_DIR, "plotly.min.js"))
+            self.stdout.write(self.style.SUCCESS(f"plotly.min.js: {os.path.getsize(source):,} bytes from plotly "
+                                                 f"{plotly.__version__}"))
+
+        for name, (url, expected) in ASSETS.items():
+            path = os.path.join(VENDOR_DIR, name)
+            if os.path.exists(path) and not options["force"]:
+                self.stdout.write(f"{name}: already vendored")
+                continue
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    data = response.read()
+            except OSError as e:
+                raise CommandError(f"{name}: could not download {url}: {e}") from e
+            actual = integrity(data, expected.split("-", 1)[0])
+            if actual != expected:
+                raise CommandError(f"{name}: integrity mismatch for {url}, expected {expected}, got {actual}")
+            with open(path, "wb") as f:
+                f.write(SOURCE_MAP.sub(b"", data))
+            self.stdout.write(self.style.SUCCESS(f"{name}: {len(data):,} bytes from {url}"))
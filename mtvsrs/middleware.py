@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.functional import SimpleLazyObject
+
+from . import catalog_file, identity, instrumentation, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+STICKY_SESSION_KEY = '_primary_until'
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Pin requests to the primary database when they write, and the session's requests for
+    settings.REPLICA_STICKY_SECONDS after that, so reads right after a write don't hit a lagging replica.
+    Must come after SessionMiddleware.
+
+    A replica failing between health checks makes the view raise, the replicas are then rechecked right away and a
+    read-only request is retried once on the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writing = request.method not in SAFE_METHODS
+        sticky = request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+        # a caller that already pinned everything to the primary (routers.pinned_to_primary) stays pinned
+        token = routers.use_primary.set(routers.use_primary.get() or writing or sticky)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.use_primary.reset(token)
+
+        if writing and response.status_code < 400:
+            request.session[STICKY_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        return response
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, DatabaseError) or routers.use_primary.get():
+            return None
+        if not routers.recheck_replicas() or request.method not in SAFE_METHODS:
+            return None
+        match = request.resolver_match
+        if match is None or asyncio.iscoroutinefunction(match.func):
+            # can't await from here, the next request goes to the primary anyway
+            return None
+        token = routers.use_primary.set(True)
+        try:
+            return match.func(request, *match.args, **match.kwargs)
+        finally:
+            routers.use_primary.reset(token)
+
+
+class CatalogFileRefreshMiddleware:
+    """Rewrite the catalog file once after the request, however many of its commits changed the catalog."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with catalog_file.deferred_refreshes():
+            return self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Time each request's SQL, template rendering and charts (see instrumentation.py), report them in a Server-Timing
+    header and add them to the per-view histograms behind /metrics. Goes first so the total covers other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.current.set(metrics)
+        try:
+            with instrumentation.track_queries():
+                response = self.get_response(request)
+        finally:
+            instrumentation.current.reset(token)
+
+        total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = metrics.server_timing(total)
+        match = request.resolver_match
+        instrumentation.observe(match.view_name if match else 'unresolved', metrics, total)
+        return response
+
+
+class IdentityMiddleware:
+    """
+    Set request.identity, the user's legacy User_ID and Watchlist_ID cached in the session (see identity.py), looked up
+    on first use like request.user. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.identity = SimpleLazyObject(lambda: identity.get_identity(request))
+        return self.get_response(request)
@@ -0,0 +1,132 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('movie_id', models.IntegerField(db_column='Movie_ID', primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, db_column='Name', max_length=100, null=True)),
+                ('description', models.CharField(blank=True, db_column='Description', max_length=300, null=True)),
+                ('genre', models.CharField(blank=True, db_column='Genre', max_length=45, null=True)),
+                ('release_date', models.DateField(blank=True, db_column='Release_Date', null=True)),
+            ],
+            options={
+                'db_table': 'Movie',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('recommendation_id', models.IntegerField(db_column='Recommendation_ID', primary_key=True, serialize=False)),
+                ('recommendation_date', models.DateField(db_column='Recommendation_Date')),
+                ('user_feedback', models.CharField(blank=True, db_column='User_Feedback', max_length=20, null=True)),
+            ],
+            options={
+                'db_table': 'Recommendation',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowTable',
+            fields=[
+                ('show_id', models.IntegerField(db_column='Show_ID', primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'Show_Table',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TvSeries',
+            fields=[
+                ('tv_series_id', models.IntegerField(db_column='TV_Series_ID', primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, db_column='Name', max_length=100, null=True)),
+                ('description', models.CharField(blank=True, db_column='Description', max_length=300, null=True)),
+                ('genre', models.CharField(blank=True, db_column='Genre', max_length=45, null=True)),
+                ('release_date', models.DateField(blank=True, db_column='Release_Date', null=True)),
+                ('number_of_episodes', models.IntegerField(blank=True, db_column='Number_of_Episodes', null=True)),
+            ],
+            options={
+                'db_table': 'TV_Series',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('user_id', models.IntegerField(db_column='User_ID', primary_key=True, serialize=False)),
+                ('first_name', models.CharField(db_column='First_Name', max_length=100)),
+                ('last_name', models.CharField(blank=True, db_column='Last_Name', max_length=100, null=True)),
+                ('birthday', models.DateField(blank=True, db_column='Birthday', null=True)),
+            ],
+            options={
+                'db_table': 'User',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Watchlist',
+            fields=[
+                ('watchlist_id', models.IntegerField(db_column='Watchlist_ID', primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'Watchlist',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='History',
+            fields=[
+                ('rating', models.IntegerField(blank=True, db_column='Rating', null=True)),
+                ('review', models.CharField(blank=True, db_column='Review', max_length=300, null=True)),
+                ('user_id', models.OneToOneField(db_column='User_ID', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, serialize=False, to='mtvsrs.user')),
+                ('review_date', models.DateField(blank=True, db_column='Review_Date', null=True)),
+            ],
+            options={
+                'db_table': 'History',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='WatchlistShow',
+            fields=[
+                ('watchlist_id', models.OneToOneField(db_column='Watchlist_ID', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, serialize=False, to='mtvsrs.watchlist')),
+                ('status', models.CharField(db_column='Status', max_length=20)),
+                ('added_date', models.DateField(db_column='Added_Date')),
+            ],
+            options={
+                'db_table': 'WatchlistShow',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowCatalog',
+            fields=[
+                ('show_id', models.IntegerField(db_column='Show_ID', primary_key=True, serialize=False)),
+                ('show_type', models.CharField(db_column='Show_Type', max_length=5)),
+                ('movie_id', models.IntegerField(blank=True, db_column='Movie_ID', null=True)),
+                ('tv_series_id', models.IntegerField(blank=True, db_column='TV_Series_ID', null=True)),
+                ('name', models.CharField(blank=True, db_column='Name', max_length=100, null=True)),
+                ('description', models.CharField(blank=True, db_column='Description', max_length=300, null=True)),
+                ('genre', models.CharField(blank=True, db_column='Genre', max_length=45, null=True)),
+                ('release_date', models.DateField(blank=True, db_column='Release_Date', null=True)),
+                ('number_of_episodes', models.IntegerField(blank=True, db_column='Number_of_Episodes', null=True)),
+            ],
+            options={
+                'db_table': 'Show_Catalog',
+                'indexes': [models.Index(fields=['release_date'], name='show_catalog_release_date'), models.Index(fields=['name'], name='show_catalog_name')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# kept in sync with catalog.REBUILD_SHOW_CATALOG_SQL, migrations shouldn't import app code
+POPULATE_SQL = """
+    INSERT INTO Show_Catalog
+        (Show_ID, Show_Type, Movie_ID, TV_Series_ID, Name, Description, Genre, Release_Date, Number_of_Episodes)
+    SELECT st.Show_ID, 'Movie', m.Movie_ID, NULL, m.Name, m.Description, m.Genre, m.Release_Date, NULL
+    FROM Show_Table st
+    JOIN Movie m ON m.Movie_ID = st.Movie_ID
+    UNION ALL
+    SELECT st.Show_ID, 'TV', NULL, tv.TV_Series_ID, tv.Name, tv.Description, tv.Genre, tv.Release_Date,
+           tv.Number_of_Episodes
+    FROM Show_Table st
+    JOIN TV_Series tv ON tv.TV_Series_ID = st.TV_Series_ID
+    WHERE st.Movie_ID IS NULL
+"""
+
+
+def populate_show_catalog(apps, schema_editor):
+    # the legacy tables are not managed by Django, skip on databases that don't have them (e.g. a fresh local db)
+    tables = set(schema_editor.connection.introspection.table_names())
+    if not {'Show_Table', 'Movie', 'TV_Series'} <= tables:
+        return
+    schema_editor.execute(POPULATE_SQL)
+
+
+def clear_show_catalog(apps, schema_editor):
+    apps.get_model('mtvsrs', 'ShowCatalog').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_show_catalog, clear_show_catalog),
+    ]
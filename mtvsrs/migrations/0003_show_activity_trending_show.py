@@ -0,0 +1,40 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0002_populate_show_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingShow',
+            fields=[
+                ('rank', models.PositiveSmallIntegerField(db_column='Rank', primary_key=True, serialize=False)),
+                ('show_id', models.IntegerField(db_column='Show_ID')),
+                ('score', models.FloatField(db_column='Score')),
+                ('computed_at', models.DateTimeField(db_column='Computed_At')),
+            ],
+            options={
+                'db_table': 'Trending_Show',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShowActivity',
+            fields=[
+                ('show_id', models.IntegerField(db_column='Show_ID', primary_key=True, serialize=False)),
+                ('rating_count', models.PositiveIntegerField(db_column='Rating_Count', default=0)),
+                ('review_count', models.PositiveIntegerField(db_column='Review_Count', default=0)),
+                ('status_change_count', models.PositiveIntegerField(db_column='Status_Change_Count', default=0)),
+                ('score', models.FloatField(db_column='Score', default=0)),
+                ('last_activity', models.DateTimeField(blank=True, db_column='Last_Activity', null=True)),
+            ],
+            options={
+                'db_table': 'Show_Activity',
+                'indexes': [models.Index(fields=['-score'], name='show_activity_score')],
+            },
+        ),
+    ]
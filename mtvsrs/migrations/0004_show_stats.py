@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0003_show_activity_trending_show'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShowStats',
+            fields=[
+                ('show_id', models.IntegerField(db_column='Show_ID', primary_key=True, serialize=False)),
+                ('planned_count', models.IntegerField(db_column='Planned_Count', default=0)),
+                ('watching_count', models.IntegerField(db_column='Watching_Count', default=0)),
+                ('completed_count', models.IntegerField(db_column='Completed_Count', default=0)),
+                ('dropped_count', models.IntegerField(db_column='Dropped_Count', default=0)),
+                ('rating_1_count', models.IntegerField(db_column='Rating_1_Count', default=0)),
+                ('rating_2_count', models.IntegerField(db_column='Rating_2_Count', default=0)),
+                ('rating_3_count', models.IntegerField(db_column='Rating_3_Count', default=0)),
+                ('rating_4_count', models.IntegerField(db_column='Rating_4_Count', default=0)),
+                ('rating_5_count', models.IntegerField(db_column='Rating_5_Count', default=0)),
+                ('review_count', models.IntegerField(db_column='Review_Count', default=0)),
+                ('rating_sum', models.IntegerField(db_column='Rating_Sum', default=0)),
+            ],
+            options={
+                'db_table': 'Show_Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0004_show_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('source', models.CharField(db_column='Source', max_length=255, primary_key=True, serialize=False)),
+                ('line', models.PositiveBigIntegerField(db_column='Line', default=0)),
+                ('rows', models.PositiveBigIntegerField(db_column='Rows', default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_column='Updated_At')),
+            ],
+            options={
+                'db_table': 'Import_Checkpoint',
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+# Indexes for the hot queries on the unmanaged legacy tables, Django doesn't create indexes for managed=False models.
+# Kept in sync with benchmark.LEGACY_INDEXES, migrations shouldn't import app code. Change the set with a new
+# migration rather than by editing this one, databases that already ran it wouldn't pick the change up.
+# (name, table, columns, unique)
+INDEXES = [
+    # reviews of a show, newest first (views.get_reviews)
+    ('History_show_review_date', 'History', ['Show_ID', 'Review_Date', 'User_ID'], False),
+    # a user's ratings, best first
+    ('History_user_rating', 'History', ['User_ID', 'Rating', 'Show_ID'], False),
+    # recently active users (build_recommendations --since)
+    ('History_review_date', 'History', ['Review_Date'], False),
+    # one status tab of My List, most recently added first (views.get_watchlist_page)
+    ('WatchlistShow_list_order', 'WatchlistShow', ['Watchlist_ID', 'Status', 'Added_Date', 'Show_ID'], False),
+    # status counts per show (stats.compute_stats)
+    ('WatchlistShow_show_status', 'WatchlistShow', ['Show_ID', 'Status'], False),
+    ('Show_Table_movie', 'Show_Table', ['Movie_ID'], False),
+    ('Show_Table_tv_series', 'Show_Table', ['TV_Series_ID'], False),
+    # the user's watchlist (identity.load)
+    ('Watchlist_user', 'Watchlist', ['User_ID'], False),
+    # a user's precomputed recommendations in rank order (views.get_recommended_show_ids)
+    ('Recommendation_user', 'Recommendation', ['User_ID', 'Recommendation_ID'], False),
+]
+
+# The models can only declare the first column of these primary keys, the upserts and read-modify-writes rely on
+# the pair being unique. RDS has them as primary keys, databases that don't get a unique index.
+COMPOSITE_KEYS = [
+    ('History_user_show', 'History', ['User_ID', 'Show_ID'], True),
+    ('WatchlistShow_watchlist_show', 'WatchlistShow', ['Watchlist_ID', 'Show_ID'], True),
+]
+
+
+def constraints_of(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        return schema_editor.connection.introspection.get_constraints(cursor, table)
+
+
+def covered(constraints, columns, unique):
+    # e.g. the index MySQL adds for a foreign key, or the composite primary key on RDS
+    return any(c['columns'] == columns and (c['primary_key'] or c['unique'] or (c['index'] and not unique))
+               for c in constraints.values())
+
+
+def create_indexes(apps, schema_editor):
+    # the legacy tables are not managed by Django, skip the ones this database doesn't have (e.g. a fresh local db)
+    tables = set(schema_editor.connection.introspection.table_names())
+    quote = schema_editor.quote_name
+    for name, table, columns, unique in COMPOSITE_KEYS + INDEXES:
+        if table not in tables:
+            continue
+        constraints = constraints_of(schema_editor, table)
+        if name in constraints or covered(constraints, columns, unique):
+            continue
+        schema_editor.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX {quote(name)} ON {quote(table)} '
+                              f'({", ".join(map(quote, columns))})')
+
+
+def drop_indexes(apps, schema_editor):
+    tables = set(schema_editor.connection.introspection.table_names())
+    quote = schema_editor.quote_name
+    for name, table, columns, unique in COMPOSITE_KEYS + INDEXES:
+        if table not in tables or name not in constraints_of(schema_editor, table):
+            continue
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute(f'DROP INDEX {quote(name)} ON {quote(table)}')
+        else:
+            schema_editor.execute(f'DROP INDEX {quote(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0005_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0006_legacy_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTasteProfile',
+            fields=[
+                ('user_id', models.IntegerField(db_column='User_ID', primary_key=True, serialize=False)),
+                ('weights', models.JSONField(db_column='Genre_Weights', default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_column='Updated_At')),
+            ],
+            options={
+                'db_table': 'User_Taste_Profile',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.8 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0007_user_taste_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showactivity',
+            name='era',
+            field=models.IntegerField(db_column='Era', default=0),
+        ),
+        migrations.AddIndex(
+            model_name='showactivity',
+            index=models.Index(fields=['era'], name='show_activity_era'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def clear_user_taste_profiles(apps, schema_editor):
+    # stored scaled to a fixed epoch, weights are now decayed to Updated_At; profiles are recomputed on first use
+    apps.get_model('mtvsrs', 'UserTasteProfile').objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtvsrs', '0008_show_activity_era'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_user_taste_profiles, migrations.RunPython.noop),
+    ]
@@ -103,3 +103,122 @@ class WatchlistShow(models.Model):
         managed = False
         db_table = 'WatchlistShow'
         unique_together = ('watchlist_id', 'show_id')
+
+
+class ShowCatalog(models.Model):
+    """
+    Denormalized union of Movie and TV_Series keyed by Show_ID, maintained from the legacy tables (see catalog.py),
+    so listing and lookup queries don't need the Show_Table OR-join.
+    """
+    show_id = models.IntegerField(db_column='Show_ID', primary_key=True)
+    show_type = models.CharField(db_column='Show_Type', max_length=5)  # "Movie" or "TV"
+    movie_id = models.IntegerField(db_column='Movie_ID', blank=True, null=True)
+    tv_series_id = models.IntegerField(db_column='TV_Series_ID', blank=True, null=True)
+    name = models.CharField(db_column='Name', max_length=100, blank=True, null=True)
+    description = models.CharField(db_column='Description', max_length=300, blank=True, null=True)
+    genre = models.CharField(db_column='Genre', max_length=45, blank=True, null=True)
+    release_date = models.DateField(db_column='Release_Date', blank=True, null=True)
+    number_of_episodes = models.IntegerField(db_column='Number_of_Episodes', blank=True, null=True)
+
+    class Meta:
+        db_table = 'Show_Catalog'
+        indexes = [
+            models.Index(fields=['release_date'], name='show_catalog_release_date'),
+            models.Index(fields=['name'], name='show_catalog_name'),
+        ]
+
+
+class ShowActivity(models.Model):
+    """
+    Per-show activity counters for trending (see trending.py). Score is the exponentially time-decayed activity,
+    stored scaled to the start of an era so ordering by it ranks shows by their current decayed score.
+    """
+    show_id = models.IntegerField(db_column='Show_ID', primary_key=True)
+    rating_count = models.PositiveIntegerField(db_column='Rating_Count', default=0)
+    review_count = models.PositiveIntegerField(db_column='Review_Count', default=0)
+    status_change_count = models.PositiveIntegerField(db_column='Status_Change_Count', default=0)
+    score = models.FloatField(db_column='Score', default=0)
+    era = models.IntegerField(db_column='Era', default=0)  # score is scaled to the start of this trending era
+    last_activity = models.DateTimeField(db_column='Last_Activity', blank=True, null=True)
+
+    class Meta:
+        db_table = 'Show_Activity'
+        indexes = [
+            models.Index(fields=['-score'], name='show_activity_score'),
+            models.Index(fields=['era'], name='show_activity_era'),
+        ]
+
+
+class TrendingShow(models.Model):
+    """Precomputed trending top-K, refreshed on a schedule by `manage.py refresh_trending`."""
+    rank = models.PositiveSmallIntegerField(db_column='Rank', primary_key=True)
+    show_id = models.IntegerField(db_column='Show_ID')
+    score = models.FloatField(db_column='Score')
+    computed_at = models.DateTimeField(db_column='Computed_At')
+
+    class Meta:
+        db_table = 'Trending_Show'
+
+
+class ShowStats(models.Model):
+    """
+    Per-show watchlist status counts and rating histogram, maintained incrementally by change_status and
+    submit_review (see stats.py) so the show page reads them with one primary key lookup.
+    """
+    show_id = models.IntegerField(db_column='Show_ID', primary_key=True)
+    planned_count = models.IntegerField(db_column='Planned_Count', default=0)
+    watching_count = models.IntegerField(db_column='Watching_Count', default=0)
+    completed_count = models.IntegerField(db_column='Completed_Count', default=0)
+    dropped_count = models.IntegerField(db_column='Dropped_Count', default=0)
+    rating_1_count = models.IntegerField(db_column='Rating_1_Count', default=0)
+    rating_2_count = models.IntegerField(db_column='Rating_2_Count', default=0)
+    rating_3_count = models.IntegerField(db_column='Rating_3_Count', default=0)
+    rating_4_count = models.IntegerField(db_column='Rating_4_Count', default=0)
+    rating_5_count = models.IntegerField(db_column='Rating_5_Count', default=0)
+    review_count = models.IntegerField(db_column='Review_Count', default=0)
+    rating_sum = models.IntegerField(db_column='Rating_Sum', default=0)
+
+    class Meta:
+        db_table = 'Show_Stats'
+
+    @property
+    def rating_count(self):
+        return sum(self.score_distribution.values())
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def status_distribution(self):
+        return {'Planned': self.planned_count, 'Watching': self.watching_count, 'Completed': self.completed_count,
+                'Dropped': self.dropped_count}
+
+    @property
+    def score_distribution(self):
+        return {1: self.rating_1_count, 2: self.rating_2_count, 3: self.rating_3_count, 4: self.rating_4_count,
+                5: self.rating_5_count}
+
+
+class UserTasteProfile(models.Model):
+    """
+    Per-user genre affinities from ratings and watchlist statuses, maintained incrementally by change_status and
+    submit_review (see taste.py) so genre based recommendations don't read the user's History.
+    """
+    user_id = models.IntegerField(db_column='User_ID', primary_key=True)
+    weights = models.JSONField(db_column='Genre_Weights', default=dict)  # {genre: weight}, decayed to updated_at
+    updated_at = models.DateTimeField(db_column='Updated_At', auto_now=True)
+
+    class Meta:
+        db_table = 'User_Taste_Profile'
+
+
+class ImportCheckpoint(models.Model):
+    """Last input line `manage.py import_catalog` committed for a source file, so a failed import can resume."""
+    source = models.CharField(db_column='Source', max_length=255, primary_key=True)
+    line = models.PositiveBigIntegerField(db_column='Line', default=0)
+    rows = models.PositiveBigIntegerField(db_column='Rows', default=0)
+    updated_at = models.DateTimeField(db_column='Updated_At', auto_now=True)
+
+    class Meta:
+        db_table = 'Import_Checkpoint'
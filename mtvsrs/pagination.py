@@ -0,0 +1,63 @@
+"""
+Keyset (seek) pagination: pages continue from the last row of the previous page instead of an OFFSET, so page 100
+costs the same as page 1. Cursors are opaque url-safe strings holding that last row's sort values.
+"""
+
+import base64
+import json
+from datetime import date
+from typing import NamedTuple, Optional
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]  # None on the last page
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Sort values from a cursor, converted with types (e.g. (date.fromisoformat, int))."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return [convert(value) for convert, value in zip(types, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def keyset_page(queryset, fields, types, cursor=None, limit=20):
+    """
+    One page of queryset in descending order of fields, e.g. ('added_date', 'show_id'), the last field must make the
+    order unique. None of the fields can be NULL.
+    """
+    queryset = queryset.order_by(*(f'-{field}' for field in fields))
+    if cursor:
+        values = decode_cursor(cursor, types)
+        # (a, b) < (x, y) spelled out, row value comparisons aren't available through the ORM
+        after = Q()
+        for i, field in enumerate(fields):
+            after |= Q(**{field: value for field, value in zip(fields[:i], values)}, **{f'{field}__lt': values[i]})
+        queryset = queryset.filter(after)
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], attname(queryset.model, field)) for field in fields)
+    return Page(rows, next_cursor)
+
+
+def attname(model, field):
+    # the raw value of foreign keys, e.g. show_id_id, without loading the related row
+    return model._meta.get_field(field).attname
@@ -0,0 +1,164 @@
+"""
+Query plan checks for `manage.py check_query_plans` and the test suite.
+
+PlanRecorder is an execute wrapper that keeps every SELECT, UPDATE and DELETE a block of code runs, on whichever alias
+it ran, explain() asks that database how it runs one of them and which tables it reads in full. collect_plans() does
+both for every page and endpoint. A table scan that is fine on a few hundred rows stops being fine on RDS, so a new
+query (or a dropped index) without a usable index fails the check long before the page gets slow. SQLite and MySQL only, the two backends this app runs on.
+"""
+
+import re
+from typing import List, NamedTuple
+
+from django.contrib.auth.models import User as AuthUser
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from .benchmark import on_every_connection
+from .models import History, ShowTable, WatchlistShow
+from .views import MY_LIST_PAGE_SIZE, get_reviews, get_watchlist_page
+
+# read in full on purpose: the catalog snapshot and the trending row load the whole table
+FULL_SCAN_ALLOWED = {'Show_Catalog', 'Trending_Show'}
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+
+# SQLite: "SCAN History", "SCAN U0" (aliased), "SCAN History USING COVERING INDEX History_user_rating"
+SQLITE_SCAN = re.compile(r'^SCAN (\S+)')
+# subqueries in FROM, scanning their results is fine
+SQLITE_SUBQUERY = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+
+
+class Plan(NamedTuple):
+    sql: str
+    lines: List[str]  # the plan, one row per line
+    full_scans: List[str]  # tables read in full
+    warnings: List[str]  # e.g. sorting without an index
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class PlanRecorder:
+    """
+    Execute wrapper keeping the (alias, sql, params) of the statements worth explaining, install it with
+    benchmark.on_every_connection(recorder) so reads sent to a replica are kept too.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() in EXPLAINED:
+            self.queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+
+def analyze(connection, tables):
+    # fresh statistics, without them the planner's choices on a freshly loaded database are guesses
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'ANALYZE TABLE {", ".join(map(quote, tables))}')
+            cursor.fetchall()
+        else:
+            # per table, statistics of the managed tables the run has barely filled would make scanning them look free
+            for table in tables:
+                cursor.execute(f'ANALYZE {quote(table)}')
+
+
+def explain(connection, sql, params, allowed=FULL_SCAN_ALLOWED):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return sqlite_plan(sql, cursor.fetchall(), allowed)
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            return mysql_plan(sql, [dict(zip(columns, row)) for row in cursor.fetchall()], allowed)
+    raise NotImplementedError(f'No query plan check for {connection.vendor}')
+
+
+def sqlite_plan(sql, rows, allowed):
+    lines, full_scans, warnings = [], [], []
+    subqueries = {match.group(1) for match in (SQLITE_SUBQUERY.match(row[3]) for row in rows) if match}
+    for _id, _parent, _unused, detail in rows:
+        lines.append(detail)
+        match = SQLITE_SCAN.match(detail)
+        if match and match.group(1) not in allowed | subqueries and not detail.startswith('SCAN CONSTANT ROW'):
+            full_scans.append(match.group(1))
+        if detail.startswith('USE TEMP B-TREE'):
+            warnings.append(detail)
+    return Plan(sql, lines, full_scans, warnings)
+
+
+def mysql_plan(sql, rows, allowed):
+    lines, full_scans, warnings = [], [], []
+    for row in rows:
+        lines.append(f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} "
+                     f"extra={row.get('Extra') or ''}")
+        # ALL reads every row, index reads every entry of an index. <derived2> and friends are subquery results
+        if row['type'] in ('ALL', 'index') and row['table'] not in allowed and not row['table'].startswith('<'):
+            full_scans.append(row['table'])
+        if 'Using filesort' in (row.get('Extra') or ''):
+            warnings.append(f"{row['table']}: Using filesort")
+    return Plan(sql, lines, full_scans, warnings)
+
+
+def collect_plans(allowed=FULL_SCAN_ALLOWED):
+    """
+    Request every page and endpoint as a user with a list, returns [(endpoint, alias, Plan), ...] for each distinct
+    statement they ran, explained on the database it ran on. Run it with a dummy cache, a cached section would hide its
+    queries.
+    """
+    # the most reviewed show, so its reviews have a second page, and a user with a list
+    show_id = History.objects.values("show_id").annotate(n=Count("user_id")).order_by("-n")[0]["show_id"]
+    watchlist_id = WatchlistShow.objects.values_list("watchlist_id", flat=True).first()
+    user = AuthUser.objects.get(pk=watchlist_id)  # generate_dataset gives user N watchlist N
+    client = Client()
+    client.force_login(user)
+    # no second page on a small dataset, the first one runs the same query
+    reviews_cursor = get_reviews(show_id).next_cursor
+    # the batch below plans enough shows for a second page of Planned
+    planned = ",".join(str(other_id) for other_id in ShowTable.objects.exclude(show_id=show_id).values_list(
+        "show_id", flat=True)[:2 * MY_LIST_PAGE_SIZE])
+
+    def my_list_more():
+        # after change_status_batch, which plans the shows of the second page
+        cursor = get_watchlist_page(watchlist_id, "Planned").next_cursor
+        return client.get(reverse("my_list_more"), {"status": "Planned", **({"cursor": cursor} if cursor else {})})
+
+    requests = [
+        ("home", lambda: client.get(reverse("home"))),
+        ("show", lambda: client.get(reverse("show", args=[show_id]))),
+        ("show_reviews", lambda: client.get(reverse("show_reviews", args=[show_id]),
+                                            {"cursor": reviews_cursor} if reviews_cursor else {})),
+        ("my_list", lambda: client.get(reverse("my_list"))),
+        ("search", lambda: client.get(reverse("search_view"), {"search_query": "Golden"})),
+        ("search_suggest", lambda: client.get(reverse("search_suggest"), {"search_query": "Gol"})),
+        # the writes last, they pin the session to the primary and the reads above are the replica's
+        ("change_status_batch", lambda: client.post(reverse("change_status_batch"), {"showIds": planned,
+                                                                                     "newStatus": "Planned"})),
+        ("my_list_more", my_list_more),
+        ("change_status", lambda: client.post(reverse("change_status"), {"showId": show_id,
+                                                                         "newStatus": "Completed"})),
+        ("submit_review", lambda: client.post(reverse("submit_review"), {"show_id": show_id, "rating": 4,
+                                                                         "review": "Plan check review"})),
+    ]
+
+    plans, seen = [], set()
+    for endpoint, request in requests:
+        recorder = PlanRecorder()
+        with on_every_connection(recorder):
+            response = request()
+        if response.status_code >= 400:
+            raise RequestFailed(f"{endpoint} returned {response.status_code}")
+        for alias, sql, params in recorder.queries:
+            # the same statement with other parameters has the same plan
+            if sql not in seen:
+                seen.add(sql)
+                plans.append((endpoint, alias, explain(connections[alias], sql, params, allowed)))
+    return plans
@@ -0,0 +1,150 @@
+"""
+Offline item-item collaborative filtering over History ratings.
+
+Used by `manage.py build_recommendations`, the web workers only read the rows it writes to the Recommendation table.
+"""
+
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from scipy import sparse
+
+from . import fragment_cache
+from .models import History, Recommendation
+
+
+class RatingMatrix:
+    """Sparse user x show rating matrix, with the user_id/show_id of every row/column."""
+
+    def __init__(self, user_ids, show_ids, ratings):
+        self.user_ids, user_rows = np.unique(user_ids, return_inverse=True)
+        self.show_ids, show_cols = np.unique(show_ids, return_inverse=True)
+        self.matrix = sparse.csr_matrix(
+            (ratings.astype(np.float32), (user_rows, show_cols)),
+            shape=(len(self.user_ids), len(self.show_ids)),
+        )
+
+    @classmethod
+    def from_history(cls):
+        rows = History.objects.filter(rating__isnull=False).values_list('user_id', 'show_id', 'rating')
+        columns = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+        return cls(columns[:, 0], columns[:, 1], columns[:, 2])
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def user_rows(self, user_ids):
+        """Row index of every given user that has ratings, users without any are skipped."""
+        return np.flatnonzero(np.isin(self.user_ids, list(user_ids)))
+
+
+def item_similarities(ratings: RatingMatrix, neighbours=50, chunk_size=256, progress=None):
+    """
+    Cosine similarity between show columns, keeping only the `neighbours` best per show.
+
+    The full show x show product would be dense, so it is computed chunk_size shows at a time and pruned before the
+    next chunk, memory stays around chunk_size x number of shows floats.
+    """
+    matrix = ratings.matrix.tocsc()
+    n_shows = matrix.shape[1]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+    normalized_t = normalized.T.tocsr()
+
+    rows, cols, values = [], [], []
+    for start in range(0, n_shows, chunk_size):
+        stop = min(start + chunk_size, n_shows)
+        block = (normalized_t[start:stop] @ normalized).toarray()
+        # a show is not its own neighbour
+        block[np.arange(stop - start), np.arange(start, stop)] = 0.0
+
+        k = min(neighbours, n_shows - 1)
+        if k <= 0:
+            break
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(block, top, axis=1)
+        keep = top_values > 0
+        rows.append(np.repeat(np.arange(start, stop), k)[keep.ravel()])
+        cols.append(top[keep])
+        values.append(top_values[keep])
+        if progress:
+            progress(stop, n_shows)
+
+    if not rows:
+        return sparse.csr_matrix((n_shows, n_shows), dtype=np.float32)
+    return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(n_shows, n_shows), dtype=np.float32)
+
+
+def recommend(ratings: RatingMatrix, similarities, user_rows, top_n=10, chunk_size=1024, exclude=None):
+    """
+    Yield (user_id, [show_id, ...]) with each user's top_n unrated shows, best first.
+
+    A show's score is the similarity-weighted sum of the user's ratings of its neighbours. `exclude` maps user_id to
+    extra show_ids that should not be recommended again.
+    """
+    exclude = exclude or {}
+    # fetch enough candidates that excluded shows can't push a user below top_n
+    extra = max((len(show_ids) for show_ids in exclude.values()), default=0)
+    for start in range(0, len(user_rows), chunk_size):
+        chunk = user_rows[start:start + chunk_size]
+        user_ratings = ratings.matrix[chunk]
+        scores = (user_ratings @ similarities.T).toarray()
+        # never recommend what the user already rated
+        rated_rows, rated_cols = user_ratings.nonzero()
+        scores[rated_rows, rated_cols] = 0.0
+
+        k = min(top_n + extra, scores.shape[1])
+        if k == 0:
+            return
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for i, row in enumerate(chunk):
+            user_id = int(ratings.user_ids[row])
+            skip = exclude.get(user_id, ())
+            show_ids = [int(ratings.show_ids[col]) for col, score in zip(top[i], top_scores[i]) if score > 0]
+            yield user_id, [show_id for show_id in show_ids if show_id not in skip][:top_n]
+
+
+def write_recommendations(recommendations, batch_size=1000):
+    """
+    Replace the pending (no feedback yet) Recommendation rows of every user in `recommendations`.
+
+    Rows with feedback are kept, and their shows are not recommended again by the caller. Recommendation_ID is not an
+    auto increment column, so ids are handed out after the current maximum; rows are written in rank order so the
+    home page can read them back ordered by id.
+    """
+    today = date.today()
+    with transaction.atomic():
+        user_ids = [user_id for user_id, _ in recommendations]
+        Recommendation.objects.filter(user_id__in=user_ids, user_feedback__isnull=True).delete()
+
+        next_id = (Recommendation.objects.aggregate(Max('recommendation_id'))['recommendation_id__max'] or 0) + 1
+        rows = []
+        for user_id, show_ids in recommendations:
+            for show_id in show_ids:
+                rows.append(Recommendation(recommendation_id=next_id, user_id=user_id, show_id=show_id,
+                                           recommendation_date=today))
+                next_id += 1
+        Recommendation.objects.bulk_create(rows, batch_size=batch_size)
+        fragment_cache.invalidate_recommendations(user_ids)
+    return len(rows)
+
+
+def feedback_shows(user_ids=None):
+    """user_id -> show_ids the user already gave feedback on."""
+    rows = Recommendation.objects.filter(user_feedback__isnull=False)
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    feedback = {}
+    for user_id, show_id in rows.values_list('user_id', 'show_id'):
+        feedback.setdefault(user_id, set()).add(show_id)
+    return feedback
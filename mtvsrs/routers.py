@@ -0,0 +1,132 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary ('default'). Reads go to one of settings.DATABASE_REPLICAS unless:
+- the request is pinned to the primary by PrimaryStickinessMiddleware, because it writes or because the same session
+  wrote within settings.REPLICA_STICKY_SECONDS, so users see their own reviews and status changes right away
+- the read happens inside a transaction on the primary
+- it's for an app in PRIMARY_ONLY_APPS, e.g. sessions, which must never be behind
+- no replica is healthy. Replicas are checked at most every settings.REPLICA_HEALTH_CHECK_INTERVAL seconds, ones that
+  can't be reached or lag more than settings.REPLICA_MAX_LAG_SECONDS behind are skipped until the next check
+
+With no replicas configured everything goes to the primary, same as without the router.
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = DEFAULT_DB_ALIAS
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# a ContextVar rather than a thread local, so async views and their thread pool see the same value
+use_primary = ContextVar('use_primary', default=False)
+
+
+
+@contextmanager
+def pinned_to_primary():
+    """Send every read in the block to the primary, e.g. a command that runs against a throwaway test database."""
+    token = use_primary.set(True)
+    try:
+        yield
+    finally:
+        use_primary.reset(token)
+
+
+_health_lock = threading.Lock()
+_health = {}  # alias -> (healthy, checked_at)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind, None if replication isn't running. Only MySQL reports it, others count as 0."""
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        connection.ensure_connection()
+        return 0
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except DatabaseError:
+            # before MySQL 8.0.22 / MariaDB 10.5
+            cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            # not a replica at all, e.g. a second endpoint of the primary
+            return 0
+        columns = [column[0] for column in cursor.description]
+    status = dict(zip(columns, row))
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+
+def check_replica(alias):
+    """Check the replica now, returns (healthy, lag)."""
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError:
+        logger.warning("Replica %s is unreachable, reading from the primary", alias, exc_info=True)
+        return False, None
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+    if lag is None or lag > max_lag:
+        logger.warning("Replica %s is %s seconds behind, reading from the primary", alias, lag)
+        return False, lag
+    return True, lag
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    healthy, checked_at = _health.get(alias, (False, None))
+    if checked_at is not None and now - checked_at < interval:
+        return healthy
+    with _health_lock:
+        healthy, checked_at = _health.get(alias, (False, None))
+        if checked_at is None or now - checked_at >= interval:
+            healthy, _ = check_replica(alias)
+            _health[alias] = (healthy, now)
+    return healthy
+
+
+def recheck_replicas():
+    """Check every replica now instead of waiting for the interval, returns the unhealthy ones."""
+    unhealthy = []
+    for alias in getattr(settings, 'DATABASE_REPLICAS', []):
+        healthy, _ = check_replica(alias)
+        _health[alias] = (healthy, time.monotonic())
+        if not healthy:
+            unhealthy.append(alias)
+    return unhealthy
+
+
+def healthy_replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if is_healthy(alias)]
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_primary.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            # read what this transaction wrote, and lock rows on the database that will be written
+            return PRIMARY
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return db == PRIMARY
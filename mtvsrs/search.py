@@ -0,0 +1,141 @@
+"""
+In-process search index over show names and descriptions.
+
+Names are indexed by trigram so typos and partial words still match, descriptions by word with prefix lookups, and
+sorted name/word lists give prefix completions for the search box. The index is built from the catalog snapshot and
+rebuilt whenever the snapshot reloads, so catalog changes show up without touching the database per query.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+
+from .catalog import per_snapshot
+
+NAME_PREFIX_BONUS = 0.5
+DESCRIPTION_WEIGHT = 0.25
+MIN_NAME_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lowercase, strip accents and turn anything that isn't a letter or digit into single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def trigrams(text):
+    grams = set()
+    for token in text.split():
+        padded = f'  {token} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def prefix_range(sorted_keys, prefix):
+    """[start, stop) of the keys in a sorted list that start with prefix."""
+    start = bisect_left(sorted_keys, prefix)
+    stop = bisect_left(sorted_keys, prefix + '\uffff', lo=start)
+    return start, stop
+
+
+class SearchIndex:
+    def __init__(self, shows):
+        self.shows = list(shows)
+        n_shows = len(self.shows)
+        names = [normalize(show.name) for show in self.shows]
+        self.release_ordinals = np.array([(show.release_date or date.min).toordinal() for show in self.shows],
+                                         dtype=np.int64)
+
+        # name trigram -> shows, plus the number of trigrams of every name for the similarity denominator
+        name_postings = defaultdict(list)
+        self.name_gram_counts = np.zeros(n_shows, dtype=np.float32)
+        for doc, name in enumerate(names):
+            grams = trigrams(name)
+            self.name_gram_counts[doc] = len(grams)
+            for gram in grams:
+                name_postings[gram].append(doc)
+        self.name_postings = {gram: np.array(docs, dtype=np.int32) for gram, docs in name_postings.items()}
+
+        # description word -> shows, words kept sorted for prefix lookups
+        word_postings = defaultdict(set)
+        for doc, show in enumerate(self.shows):
+            for word in normalize(show.description).split():
+                word_postings[word].add(doc)
+        self.words = sorted(word_postings)
+        self.word_postings = [np.fromiter(word_postings[word], dtype=np.int32) for word in self.words]
+
+        # completions: whole names, then any word of a name, both sorted for bisect
+        self.sorted_names = sorted((name, doc) for doc, name in enumerate(names) if name)
+        self.sorted_name_keys = [name for name, _ in self.sorted_names]
+        self.sorted_name_words = sorted((word, doc) for doc, name in enumerate(names) for word in set(name.split()))
+        self.sorted_name_word_keys = [word for word, _ in self.sorted_name_words]
+
+    def __len__(self):
+        return len(self.shows)
+
+    def scores(self, query):
+        """Relevance of every show for an already normalized query, 0 for shows that don't match."""
+        n_shows = len(self.shows)
+        grams = trigrams(query)
+        matched = np.zeros(n_shows, dtype=np.float32)
+        for gram in grams:
+            docs = self.name_postings.get(gram)
+            if docs is not None:
+                matched[docs] += 1
+        # jaccard similarity between the query's and each name's trigrams
+        name_similarity = matched / (len(grams) + self.name_gram_counts - matched)
+
+        prefixed = np.zeros(n_shows, dtype=bool)
+        start, stop = prefix_range(self.sorted_name_keys, query)
+        prefixed[[doc for _, doc in self.sorted_names[start:stop]]] = True
+
+        # fraction of query words that start a word of the description
+        query_words = query.split()
+        description_hits = np.zeros(n_shows, dtype=np.float32)
+        for word in query_words:
+            start, stop = prefix_range(self.words, word)
+            if start < stop:
+                description_hits[np.unique(np.concatenate(self.word_postings[start:stop]))] += 1
+        description_match = description_hits / len(query_words)
+
+        scores = name_similarity + NAME_PREFIX_BONUS * prefixed + DESCRIPTION_WEIGHT * description_match
+        matches = (name_similarity >= MIN_NAME_SIMILARITY) | prefixed | (description_match == 1)
+        return np.where(matches, scores, 0.0)
+
+    def search(self, query, offset=0, limit=20):
+        """Return (shows, total) for one page of results across movies and series, best match first."""
+        query = normalize(query)
+        if not query:
+            return [], 0
+        scores = self.scores(query)
+        docs = np.flatnonzero(scores > 0)
+        # best score first, newest release first among ties
+        docs = docs[np.lexsort((-self.release_ordinals[docs], -scores[docs]))]
+        return [self.shows[doc] for doc in docs[offset:offset + limit]], len(docs)
+
+    def suggest(self, prefix, limit=8):
+        """Shows whose name starts with prefix, then shows with a name word starting with it."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        docs = []
+        for sorted_pairs, keys in ((self.sorted_names, self.sorted_name_keys),
+                                   (self.sorted_name_words, self.sorted_name_word_keys)):
+            start, stop = prefix_range(keys, prefix)
+            for _, doc in sorted_pairs[start:stop]:
+                if doc not in docs:
+                    docs.append(doc)
+                    if len(docs) == limit:
+                        return [self.shows[doc] for doc in docs]
+        return [self.shows[doc] for doc in docs]
+
+
+@per_snapshot
+def get_search_index(catalog) -> SearchIndex:
+    """Index for the current catalog snapshot, rebuilt whenever the snapshot is reloaded."""
+    return SearchIndex(catalog)
@@ -0,0 +1,407 @@
+"""
+Preforking production server for `manage.py serve`, standard library only.
+
+The parent process binds the listening socket, then imports and builds everything requests use before it forks the
+workers: the view modules and URLconf, NumPy/SciPy/Plotly, every compiled template of the project, the catalog and the
+similarity matrix and search index built from it, and the memory-mapped similar shows table. Workers start with all of
+it already in memory, shared copy-on-write between them instead of loaded again by every worker on its first requests.
+gc.freeze() keeps the collector from touching (and so copying) those objects in the workers. Database connections are
+closed before forking, every worker opens its own.
+
+Every worker accepts connections on the same socket, there is nothing to balance. A new worker first runs the app on
+/healthz in process (which also opens its database connection) and only starts accepting once that returns 200, until
+then the kernel queues connections for the workers that are accepting, so NGINX never reaches a worker still warming
+up. A worker that never gets healthy within --warmup-timeout exits and is started again, with backoff.
+
+Signals to the parent:
+- TERM, INT: graceful stop, workers finish the request they are handling and exit, ones still busy after
+  --graceful-timeout are killed.
+- HUP: rolling restart, for deploys. The parent re-executes itself on the same socket, so the new code and data are
+  imported and warmed up while the old workers keep serving, then retires one old worker every time a new one is ready.
+  If the new code doesn't start, the old workers keep serving until they are stopped.
+Workers that exit unexpectedly are replaced.
+"""
+
+import gc
+import importlib
+import io
+import logging
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = '/healthz'
+# heavy imports the views make lazily, warmed in the parent so workers don't each pay for them
+WARM_MODULES = ['numpy', 'scipy.sparse', 'plotly.express']
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.svg')
+
+# set by rolling_restart() for the re-executed parent
+LISTEN_FD_ENV = 'MTVSRS_SERVE_FD'
+OLD_WORKERS_ENV = 'MTVSRS_SERVE_OLD_WORKERS'
+
+POLL_SECONDS = 0.5  # how long an idle worker waits in select() before checking whether it should stop
+RESPAWN_BACKOFF_MAX = 30
+
+
+### Warmup, in the parent ###
+
+def bind(host, port, backlog=1024):
+    """The listening socket, the one of the previous process image after a rolling restart."""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        listener = socket.socket(fileno=int(fd))
+    else:
+        # SO_REUSEADDR, a restart doesn't wait for TIME_WAIT connections of the last run
+        listener = socket.create_server((host, port), backlog=backlog)
+    # workers wait in select() and race for accept(), the ones that lose give up after this (socketserver polls for
+    # the shorter of the socket's and the server's timeout)
+    listener.settimeout(POLL_SECONDS)
+    return listener
+
+
+def template_names():
+    """Names of the templates of this project (not Django's own admin templates), per template engine."""
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        names = set()
+        for directory in engine.template_dirs:
+            if not str(directory).startswith(str(settings.BASE_DIR)):
+                continue
+            for root, _dirs, files in os.walk(directory):
+                names.update(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+                             for name in files if name.endswith(TEMPLATE_EXTENSIONS))
+        yield engine, sorted(names)
+
+
+def warm_up():
+    """Import and build everything requests need, returns the WSGI application."""
+    from . import catalog, search, similarity, text_index
+
+    started = time.perf_counter()
+    for module in WARM_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.info('Not warming %s, not installed', module)
+
+    application = get_wsgi_application()
+    # imports the URLconf and with it every view module, and builds the reverse() lookup tables
+    get_resolver().reverse_dict
+
+    # the cached template loader keeps every compiled template
+    templates = 0
+    for engine, names in template_names():
+        for name in names:
+            engine.get_template(name)
+        templates += len(names)
+
+    shows = catalog.get_catalog()
+    similarity.get_engine()
+    search.get_search_index()
+    text_index.get_table()
+
+    # connections don't survive a fork, every worker opens its own
+    connections.close_all()
+    # whatever survives this collection lives as long as the workers, keep the collector off it so it doesn't write to
+    # (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    logger.info('Warmed up in %.1fs: %d templates, %d shows', time.perf_counter() - started, templates, len(shows))
+    return application
+
+
+### Workers ###
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = 60  # a connection that sends nothing for this long is dropped
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            logger.info('%s %s', self.address_string(), format % args)
+
+
+class WorkerServer(WSGIServer):
+    """wsgiref's WSGI server on the listening socket shared by all the workers, one request at a time."""
+
+    timeout = POLL_SECONDS
+
+    def __init__(self, listener, application, access_log=False):
+        # wsgiref binds a socket of its own, swap in the shared one
+        super().__init__(listener.getsockname()[:2], RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        host, self.server_port = listener.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.setup_environ()
+        self.set_app(application)
+        self.access_log = access_log
+
+    def get_request(self):
+        connection, address = self.socket.accept()
+        # not the listener's timeout, RequestHandler.timeout applies
+        connection.setblocking(True)
+        return connection, address
+
+    def handle_error(self, request, client_address):
+        logger.exception('Error handling a request from %s', client_address)
+
+
+def health_check(application):
+    """Run the app on /healthz in this process, True if it returned 200."""
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': HEALTH_PATH, 'HTTP_HOST': host, 'wsgi.input': io.BytesIO(),
+               'wsgi.errors': sys.stderr}
+    setup_testing_defaults(environ)
+    statuses = []
+    result = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(result)
+    finally:
+        # fires request_finished, which closes the connection if it went bad
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0].startswith('200')
+
+
+def wait_until_healthy(application, timeout, stopping):
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while not stopping():
+        try:
+            if health_check(application):
+                return True
+            logger.warning('Worker %d: %s is not healthy yet', os.getpid(), HEALTH_PATH)
+        except Exception:
+            logger.exception('Worker %d: %s failed', os.getpid(), HEALTH_PATH)
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 5)
+    return False
+
+
+def run_worker(listener, application, ready_fd, options):
+    """Body of a forked worker process, never returns."""
+    state = {'stopping': False}
+
+    def stop(signum, frame):
+        state['stopping'] = True
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C and HUP are for the parent, which stops or replaces the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    exit_code = 0
+    try:
+        if wait_until_healthy(application, options['warmup_timeout'], lambda: state['stopping']):
+            os.write(ready_fd, b'!')
+            server = WorkerServer(listener, application, options['access_log'])
+            # handle_request() returns after POLL_SECONDS without a connection, a stop waits for the current request
+            while not state['stopping']:
+                server.handle_request()
+        elif not state['stopping']:
+            logger.error('Worker %d: not healthy after %ss, exiting', os.getpid(), options['warmup_timeout'])
+            exit_code = 1
+    except BaseException:
+        logger.exception('Worker %d crashed', os.getpid())
+        exit_code = 1
+    finally:
+        connections.close_all()
+        for handler in logging.getLogger().handlers + logger.handlers:
+            handler.flush()
+        os._exit(exit_code)
+
+
+### Parent ###
+
+class Worker:
+    def __init__(self, pid, ready_fd):
+        self.pid = pid
+        self.ready_fd = ready_fd
+        self.ready = False
+
+
+class Arbiter:
+    """Keeps options['workers'] healthy workers running on the listener, see the module docstring."""
+
+    def __init__(self, listener, application, options):
+        self.listener = listener
+        self.application = application
+        self.options = options
+        self.workers = {}  # pid -> Worker
+        # workers of the process image before a rolling restart, still serving until new ones replace them
+        self.old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+        self.retiring = set()  # old workers told to stop, finishing their last request
+        self.stopping_at = None  # deadline of a graceful stop
+        self.failures = 0  # workers in a row that exited before getting ready
+        self.next_spawn = 0.0
+        self.signals = []
+        self.selector = selectors.DefaultSelector()
+
+    def run(self):
+        wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        self.wakeup = (wakeup_read, wakeup_write)
+        self.selector.register(wakeup_read, selectors.EVENT_READ)
+        signal.set_wakeup_fd(wakeup_write)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self.on_signal)
+
+        host, port = self.listener.getsockname()[:2]
+        logger.info('Serving on %s:%s with %d workers (parent %d)', host, port, self.options['workers'], os.getpid())
+        if self.old_workers:
+            logger.info('Replacing workers %s of the previous process image', ', '.join(map(str, self.old_workers)))
+
+        while True:
+            self.reap()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                elif signum == signal.SIGHUP and self.stopping_at is None:
+                    self.rolling_restart()
+            if self.stopping_at is not None:
+                if not self.workers and not self.old_workers and not self.retiring:
+                    logger.info('Stopped')
+                    return
+                if time.monotonic() > self.stopping_at:
+                    self.kill(signal.SIGKILL)
+            else:
+                self.spawn_missing()
+            self.wait(1.0)
+
+    def on_signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def wait(self, timeout):
+        if self.stopping_at is None and len(self.workers) < self.options['workers']:
+            timeout = max(0.0, min(timeout, self.next_spawn - time.monotonic()))
+        for key, _events in self.selector.select(timeout):
+            if key.fd == self.wakeup[0]:
+                try:
+                    while os.read(key.fd, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                self.read_ready(key.data)
+
+    def read_ready(self, worker):
+        if os.read(worker.ready_fd, 1):
+            worker.ready = True
+            self.failures = 0
+            logger.info('Worker %d is ready', worker.pid)
+            # one new worker ready, one old one can go
+            if self.old_workers and self.stopping_at is None:
+                pid = self.old_workers.pop(0)
+                self.retiring.add(pid)
+                self.signal_pid(pid, signal.SIGTERM)
+        # ready or gone, the pipe has nothing more to say
+        self.selector.unregister(worker.ready_fd)
+        os.close(worker.ready_fd)
+        worker.ready_fd = None
+
+    def spawn_missing(self):
+        while len(self.workers) < self.options['workers'] and time.monotonic() >= self.next_spawn:
+            self.spawn()
+
+    def spawn(self):
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            self.selector.close()
+            for fd in (ready_read, *self.wakeup):
+                os.close(fd)
+            for worker in self.workers.values():
+                if worker.ready_fd is not None:
+                    os.close(worker.ready_fd)
+            run_worker(self.listener, self.application, ready_write, self.options)
+        os.close(ready_write)
+        worker = Worker(pid, ready_read)
+        self.workers[pid] = worker
+        self.selector.register(ready_read, selectors.EVENT_READ, worker)
+        logger.info('Started worker %d', pid)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.retiring.discard(pid)
+            if pid in self.old_workers:
+                self.old_workers.remove(pid)
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue  # an old worker, retired or gone on its own
+            if worker.ready_fd is not None:
+                self.selector.unregister(worker.ready_fd)
+                os.close(worker.ready_fd)
+            if self.stopping_at is not None:
+                continue
+            logger.warning('Worker %d exited with %s', pid, os.waitstatus_to_exitcode(status))
+            if not worker.ready:
+                # crashing on startup again and again, e.g. the database is down: back off instead of forking in a loop
+                self.failures += 1
+                self.next_spawn = time.monotonic() + min(2 ** (self.failures - 1), RESPAWN_BACKOFF_MAX)
+
+    def signal_pid(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def kill(self, signum):
+        for pid in [*self.workers, *self.old_workers, *self.retiring]:
+            self.signal_pid(pid, signum)
+
+    def stop(self):
+        if self.stopping_at is None:
+            logger.info('Stopping, waiting up to %ss for requests in progress', self.options['graceful_timeout'])
+            self.stopping_at = time.monotonic() + self.options['graceful_timeout']
+        self.kill(signal.SIGTERM)
+
+    def rolling_restart(self):
+        """Re-execute this process on the same socket, the new image replaces these workers once it has warmed up."""
+        logger.info('Rolling restart')
+        os.set_inheritable(self.listener.fileno(), True)
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.listener.fileno())
+        # workers of this image that haven't been replaced yet are the new image's old workers too
+        env[OLD_WORKERS_ENV] = ','.join(map(str, [*self.old_workers, *self.retiring, *self.workers]))
+        signal.set_wakeup_fd(-1)
+        for handler in logging.getLogger().handlers + logger.handlers:
+            handler.flush()
+        os.execve(sys.executable, [sys.executable, *sys.argv], env)
+
+
+def serve(host, port, workers, warmup_timeout=60, graceful_timeout=30, access_log=False):
+    listener = bind(host, port)
+    application = warm_up()
+    Arbiter(listener, application, {
+        'workers': workers,
+        'warmup_timeout': warmup_timeout,
+        'graceful_timeout': graceful_timeout,
+        'access_log': access_log,
+    }).run()
@@ -44,11 +44,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "mtvsrs.middleware.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "mtvsrs.middleware.PrimaryStickinessMiddleware",
+    "mtvsrs.middleware.CatalogFileRefreshMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "mtvsrs.middleware.IdentityMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -57,7 +61,8 @@ ROOT_URLCONF = "mtvsrs.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates with render timing for the Server-Timing header (mtvsrs/instrumentation.py)
+        "BACKEND": "mtvsrs.instrumentation.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -85,9 +90,28 @@ DATABASES = {
         'PASSWORD': '<INSERT PASSWORD HERE>',
         'HOST': 'cpsc5071.cnsskm04otsd.us-east-1.rds.amazonaws.com',
         'PORT': '3306',
+        # keep connections open between requests, a new one to RDS costs a few round trips
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (mtvsrs/routers.py), reads go to a healthy replica and writes to "default". Set
+# DATABASE_REPLICA_HOSTS to a comma separated list of replica endpoints to add them.
+DATABASE_REPLICAS = []
+for i, host in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(","))):
+    alias = f"replica_{i + 1}"
+    DATABASES[alias] = {**DATABASES["default"], "HOST": host.strip(), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["mtvsrs.routers.PrimaryReplicaRouter"]
+
+# sessions that wrote read from the primary for this many seconds, replicas more than REPLICA_MAX_LAG_SECONDS behind
+# are skipped, health is rechecked every REPLICA_HEALTH_CHECK_INTERVAL seconds
+REPLICA_STICKY_SECONDS = 10
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -125,10 +149,70 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# `manage.py vendor_static` then `manage.py collectstatic` copy mtvsrs/static (htmx, Bootstrap and jQuery vendored
+# under static/vendor) here under content-hashed names, with .gz copies next to them. nginx serves the directory,
+# static requests never reach Django (see nginx.conf).
+STATIC_ROOT = os.environ.get("STATIC_ROOT", str(BASE_DIR / "staticfiles"))
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "mtvsrs.storage.CompressedManifestStaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_REDIRECT_URL = "/"
-LOGOUT_REDIRECT_URL = "login"
\ No newline at end of file
+LOGOUT_REDIRECT_URL = "login"
+
+
+# Seconds before the in-memory catalog snapshot (mtvsrs/catalog.py) is reloaded, this is what picks up catalog
+# writes made by other worker processes
+CATALOG_SNAPSHOT_TTL = 300
+
+# Columnar catalog file every worker memory-maps instead (mtvsrs/catalog_file.py), used once `manage.py
+# build_catalog_file` created it
+CATALOG_FILE = os.environ.get("CATALOG_FILE", str(BASE_DIR / "catalog.bin"))
+
+# Trending (mtvsrs/trending.py): activity scores halve every TRENDING_HALF_LIFE_HOURS, and `manage.py refresh_trending`
+# keeps the top TRENDING_SIZE shows
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_SIZE = 10
+
+# Description based similar shows (mtvsrs/text_index.py), written by `manage.py build_text_index` and memory-mapped
+# by every worker
+SIMILAR_SHOWS_INDEX = os.environ.get("SIMILAR_SHOWS_INDEX", str(BASE_DIR / "similar_shows.npy"))
+
+# Taste profiles (mtvsrs/taste.py): a rating or status counts half as much after TASTE_HALF_LIFE_DAYS
+TASTE_HALF_LIFE_DAYS = 180
+
+
+# Cache for home page sections (mtvsrs/fragment_cache.py). The file backend is shared by every worker process on the
+# host, so one worker's invalidation is seen by the others without running a cache server.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Sections are recomputed after SECTION_CACHE_TTL seconds, or on the next request after a write invalidates them,
+# stale values are served for up to SECTION_CACHE_STALE_TTL more seconds while one worker recomputes
+SECTION_CACHE_TTL = 300
+SECTION_CACHE_STALE_TTL = 3600
+# lock files deciding which worker recomputes a section, must be shared by the workers like the cache directory
+SECTION_CACHE_LOCK_DIR = os.path.join(CACHES["default"]["LOCATION"], "locks")
+
+# Async home and show pages (mtvsrs/async_views.py), turned on by asgi.py. Their ORM work runs in a pool of
+# ASYNC_DB_THREADS threads, which also bounds the database connections they hold.
+ASYNC_VIEWS = os.environ.get("MTVSRS_ASYNC_VIEWS") == "1"
+ASYNC_DB_THREADS = 8
+
+# Statements repeated this many times within one request are logged and counted as N+1 suspects on /metrics
+N_PLUS_ONE_THRESHOLD = 5
+
+# Part of the page ETags (see mtvsrs/conditional.py), set it per deploy so browsers don't keep pages rendered by
+# old templates
+RELEASE = os.environ.get("MTVSRS_RELEASE", "")
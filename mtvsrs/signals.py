@@ -0,0 +1,90 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import catalog, conditional, fragment_cache, identity, stats, taste, trending
+from .models import History, Movie, ShowTable, TvSeries, User, Watchlist, WatchlistShow
+
+# Sent by submit_review and change_status inside the transaction that writes History/WatchlistShow, receivers that
+# write run in that same transaction.
+# show_id, user_id, previous_rating (None if created), rating, review, created
+review_submitted = Signal()
+# Sent once per set_statuses call, however many shows it changed.
+# watchlist_id, user_id, previous_statuses ({show_id: previous status, None if the show wasn't on the list}), status
+status_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=Movie)
+@receiver([post_save, post_delete], sender=TvSeries)
+@receiver([post_save, post_delete], sender=ShowTable)
+def sync_catalog_on_write(sender, instance, using, **kwargs):
+    # bulk writes and queryset.update() don't send these, those need `manage.py rebuild_show_catalog`
+    # the shows are looked up on the database that was written, a replica may not have a new Show_Table row yet
+    if sender is Movie:
+        show_ids = ShowTable.objects.using(using).filter(movie_id=instance.pk).values_list('show_id', flat=True)
+    elif sender is TvSeries:
+        show_ids = ShowTable.objects.using(using).filter(tv_series_id=instance.pk).values_list('show_id', flat=True)
+    else:
+        show_ids = [instance.pk]
+    catalog.sync_show_catalog(show_ids)
+    catalog.invalidate_catalog()
+    fragment_cache.invalidate(fragment_cache.NEW_RELEASES)
+
+
+@receiver(review_submitted, sender=History)
+def record_review_activity(sender, show_id, rating, review, **kwargs):
+    trending.record_review(show_id, rating, review)
+
+
+@receiver(status_changed, sender=WatchlistShow)
+def record_status_activity(sender, previous_statuses, status, **kwargs):
+    trending.record_status_changes(previous_statuses, status)
+
+
+@receiver(review_submitted, sender=History)
+def update_review_stats(sender, show_id, previous_rating, rating, created, **kwargs):
+    stats.apply_review(show_id, previous_rating, rating, created)
+
+
+@receiver(status_changed, sender=WatchlistShow)
+def update_status_stats(sender, previous_statuses, status, **kwargs):
+    stats.apply_status_changes(previous_statuses, status)
+
+
+@receiver(review_submitted, sender=History)
+def update_review_taste(sender, show_id, user_id, previous_rating, rating, **kwargs):
+    taste.apply_review(user_id, show_id, previous_rating, rating)
+
+
+@receiver(status_changed, sender=WatchlistShow)
+def update_status_taste(sender, user_id, previous_statuses, status, **kwargs):
+    taste.apply_status_changes(user_id, previous_statuses, status)
+
+
+@receiver(review_submitted, sender=History)
+def invalidate_review_sections(sender, user_id, **kwargs):
+    # the reviewed show drops out of the user's recommendations and may move up in trending
+    fragment_cache.invalidate(fragment_cache.TRENDING, fragment_cache.recommendations_key(user_id))
+
+
+@receiver(status_changed, sender=WatchlistShow)
+def invalidate_status_sections(sender, user_id, **kwargs):
+    # the status moves the user's taste profile, which genre based recommendations come from
+    fragment_cache.invalidate(fragment_cache.TRENDING, fragment_cache.recommendations_key(user_id))
+
+
+@receiver(review_submitted, sender=History)
+def bump_review_stamps(sender, show_id, user_id, **kwargs):
+    # the show's page for everyone (reviews, stats) and the user's own pages
+    conditional.bump(conditional.show_key(show_id), conditional.user_key(user_id))
+
+
+@receiver(status_changed, sender=WatchlistShow)
+def bump_status_stamps(sender, previous_statuses, user_id, **kwargs):
+    conditional.bump(*map(conditional.show_key, previous_statuses), conditional.user_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Watchlist)
+def invalidate_identity(sender, instance, **kwargs):
+    # sessions cache the user's names and Watchlist_ID, see identity.py
+    identity.invalidate(instance.pk if sender is User else instance.user_id)
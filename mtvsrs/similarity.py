@@ -0,0 +1,121 @@
+"""
+Vectorized genre similarity over the catalog snapshot.
+
+Every show is a row of a show x genre multi-hot matrix, so scoring the whole catalog against a show (or a weighted
+genre profile) is one matrix-vector product, and the best k are picked with np.argpartition instead of sorting
+everything.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from . import text_index
+from .catalog import per_snapshot, resolve_shows
+
+METRICS = ('overlap', 'jaccard', 'cosine')
+
+
+class GenreSimilarityEngine:
+    def __init__(self, shows):
+        shows = list(shows)
+        self.vocabulary = sorted({genre for show in shows for genre in show.genres})
+        self.genre_index = {genre: i for i, genre in enumerate(self.vocabulary)}
+
+        self.show_ids = np.array([show.show_id for show in shows], dtype=np.int64)
+        self.row_by_show_id = {show.show_id: row for row, show in enumerate(shows)}
+        # used to break ties between equally similar shows, newest first
+        self.release_ordinals = np.array([(show.release_date or date.min).toordinal() for show in shows],
+                                         dtype=np.int64)
+
+        self.matrix = np.zeros((len(shows), len(self.vocabulary)), dtype=np.float32)
+        for row, show in enumerate(shows):
+            self.matrix[row, [self.genre_index[genre] for genre in show.genres]] = 1.0
+        self.genre_counts = self.matrix.sum(axis=1)
+        self.norms = np.sqrt(self.genre_counts)
+
+    def __len__(self):
+        return len(self.show_ids)
+
+    def vector_for_genres(self, genres):
+        """Multi-hot query vector, genres outside the vocabulary can't match anything and are dropped."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        vector[[self.genre_index[genre] for genre in genres if genre in self.genre_index]] = 1.0
+        return vector
+
+    def vector_for_profile(self, weights):
+        """Weighted query vector from a {genre: weight} mapping, e.g. a user's genre affinities."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for genre, weight in weights.items():
+            if genre in self.genre_index:
+                vector[self.genre_index[genre]] = weight
+        return vector
+
+    def vector_for_show(self, show_id):
+        row = self.row_by_show_id.get(show_id)
+        if row is None:
+            return np.zeros(len(self.vocabulary), dtype=np.float32)
+        return self.matrix[row].copy()
+
+    def score(self, query, metric='jaccard'):
+        """Score every show against the query vector."""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
+        overlap = self.matrix @ query
+        # silence 0/0 for shows or queries without genres, those end up with a score of 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric == 'jaccard':
+                query_size = np.count_nonzero(query)
+                scores = overlap / (self.genre_counts + query_size - overlap)
+            elif metric == 'cosine':
+                scores = overlap / (self.norms * np.linalg.norm(query))
+            else:
+                scores = overlap
+        return np.nan_to_num(scores, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def exclusion_mask(self, show_ids):
+        mask = np.zeros(len(self.show_ids), dtype=bool)
+        rows = [self.row_by_show_id[show_id] for show_id in show_ids if show_id in self.row_by_show_id]
+        mask[rows] = True
+        return mask
+
+    def top_k(self, query, k=10, metric='jaccard', exclude=(), min_score=0.0):
+        """Return up to k (show_id, score) pairs, best first, skipping excluded shows and scores <= min_score."""
+        scores = self.score(query, metric)
+        scores[self.exclusion_mask(exclude)] = -np.inf
+
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[scores[candidates] > min_score]
+
+        # best score first, newest release first among ties
+        order = np.lexsort((-self.release_ordinals[candidates], -scores[candidates]))
+        candidates = candidates[order]
+        return [(int(self.show_ids[row]), float(scores[row])) for row in candidates]
+
+    def similar_to_show(self, show_id, k=10, metric='jaccard', exclude=()):
+        return self.top_k(self.vector_for_show(show_id), k, metric, exclude={show_id, *exclude})
+
+
+@per_snapshot
+def get_engine(catalog) -> GenreSimilarityEngine:
+    """Engine for the current catalog snapshot, rebuilt whenever the snapshot is reloaded."""
+    return GenreSimilarityEngine(catalog)
+
+
+def similar_shows(show_id, k=10, metric='jaccard', exclude=()):
+    """
+    Catalog shows most similar to show_id, best first: the precomputed description neighbours (see text_index.py),
+    topped up with genre matches for shows the last `manage.py build_text_index` didn't know or found too little to
+    match for.
+    """
+    exclude = {show_id, *exclude}
+    similar_ids = [similar_id for similar_id in text_index.neighbours(show_id) or () if similar_id not in exclude][:k]
+    if len(similar_ids) < k:
+        similar_ids += [similar_id for similar_id, _ in get_engine().similar_to_show(
+            show_id, k - len(similar_ids), metric, exclude={*exclude, *similar_ids}
+        )]
+    return resolve_shows(similar_ids)
@@ -0,0 +1,155 @@
+"""
+Per-show status and score distributions, kept in Show_Stats.
+
+change_status and submit_review send their signals inside the transaction that writes WatchlistShow/History, and the
+receivers here adjust the counters with relative UPDATEs in that same transaction, taking the previous status or
+rating into account (e.g. Watching -> Completed moves one count, a changed rating moves it between buckets).
+"""
+
+from collections import defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+
+from . import conditional
+from .models import History, ShowStats, WatchlistShow
+
+STATUS_FIELDS = {
+    'Planned': 'planned_count',
+    'Watching': 'watching_count',
+    'Completed': 'completed_count',
+    'Dropped': 'dropped_count',
+}
+RATING_FIELDS = {rating: f'rating_{rating}_count' for rating in range(1, 6)}
+COUNTER_FIELDS = [*STATUS_FIELDS.values(), *RATING_FIELDS.values(), 'review_count', 'rating_sum']
+
+
+def compute_stats(show_ids=None):
+    """Count everything from the source tables, returns {show_id: unsaved ShowStats}."""
+    watchlist_shows = WatchlistShow.objects.all()
+    histories = History.objects.all()
+    if show_ids is not None:
+        watchlist_shows = watchlist_shows.filter(show_id__in=show_ids)
+        histories = histories.filter(show_id__in=show_ids)
+
+    # shows asked for explicitly get a row even without any activity, so they aren't recounted on every view
+    stats = {show_id: ShowStats(show_id=show_id) for show_id in show_ids or ()}
+
+    def stats_for(show_id):
+        if show_id not in stats:
+            stats[show_id] = ShowStats(show_id=show_id)
+        return stats[show_id]
+
+    for show_id, status, count in watchlist_shows.values_list('show_id', 'status').annotate(
+            count=Count('show_id')).order_by():
+        if status in STATUS_FIELDS:
+            show_stats = stats_for(show_id)
+            setattr(show_stats, STATUS_FIELDS[status], count)
+
+    for show_id, rating, count in histories.values_list('show_id', 'rating').annotate(
+            count=Count('show_id')).order_by():
+        show_stats = stats_for(show_id)
+        show_stats.review_count += count
+        if rating in RATING_FIELDS:
+            setattr(show_stats, RATING_FIELDS[rating], getattr(show_stats, RATING_FIELDS[rating]) + count)
+            show_stats.rating_sum += rating * count
+
+    return stats
+
+
+def rebuild_show_stats(show_ids=None):
+    """Recount the given shows (all shows by default), returns {show_id: saved ShowStats}."""
+    with transaction.atomic():
+        # counted inside the transaction, so the router reads the source tables from the primary
+        stats = compute_stats(show_ids)
+        if show_ids is None:
+            ShowStats.objects.all().delete()
+        # an upsert, two first views of the same show may store it at the same time
+        db = router.db_for_write(ShowStats)
+        unique_fields = None
+        if connections[db].features.supports_update_conflicts_with_target:
+            unique_fields = ['show_id']
+        ShowStats.objects.using(db).bulk_create(stats.values(), batch_size=1000, update_conflicts=True,
+                                                update_fields=COUNTER_FIELDS, unique_fields=unique_fields)
+        if show_ids is None:
+            conditional.bump(conditional.GLOBAL)
+        else:
+            # only these shows' pages, a first view or an import batch must not reset every page's validators
+            conditional.bump(*map(conditional.show_key, stats))
+    return stats
+
+
+def verify_show_stats():
+    """Return [(show_id, field, stored, expected), ...] for every counter that drifted from the source tables."""
+    expected = compute_stats()
+    stored = ShowStats.objects.in_bulk()
+    mismatches = []
+    for show_id in expected.keys() | stored.keys():
+        expected_stats = expected.get(show_id, ShowStats(show_id=show_id))
+        stored_stats = stored.get(show_id, ShowStats(show_id=show_id))
+        for field in COUNTER_FIELDS:
+            if getattr(stored_stats, field) != getattr(expected_stats, field):
+                mismatches.append((show_id, field, getattr(stored_stats, field), getattr(expected_stats, field)))
+    return mismatches
+
+
+def get_show_stats(show_id):
+    """Show_Stats row for the show page, shows without one yet are counted once and stored."""
+    show_stats = ShowStats.objects.filter(show_id=show_id).first()
+    if show_stats is None:
+        # the stored row, not a re-read that could go to a replica that doesn't have it yet
+        show_stats = rebuild_show_stats([show_id])[show_id]
+    return show_stats
+
+
+def _adjust(show_id, changes):
+    if not changes:
+        return
+    if not ShowStats.objects.filter(show_id=show_id).update(**changes):
+        # no row yet, count the show from scratch, that count already includes the write being applied
+        rebuild_show_stats([show_id])
+
+
+def apply_status_changes(previous_statuses, status):
+    """
+    Move the shows ({show_id: previous status}) to status. Shows coming from the same status get the same relative
+    UPDATE, so a batch is one statement per distinct previous status.
+    """
+    groups = defaultdict(list)
+    for show_id, previous_status in previous_statuses.items():
+        if previous_status != status:
+            groups[previous_status].append(show_id)
+
+    missing = []
+    for previous_status, show_ids in groups.items():
+        changes = {}
+        if previous_status in STATUS_FIELDS:
+            field = STATUS_FIELDS[previous_status]
+            changes[field] = F(field) - 1
+        if status in STATUS_FIELDS:
+            field = STATUS_FIELDS[status]
+            changes[field] = F(field) + 1
+        if changes and ShowStats.objects.filter(show_id__in=show_ids).update(**changes) < len(show_ids):
+            existing = set(ShowStats.objects.filter(show_id__in=show_ids).values_list('show_id', flat=True))
+            missing += [show_id for show_id in show_ids if show_id not in existing]
+    if missing:
+        # count those from scratch, the counts already include the writes being applied
+        rebuild_show_stats(missing)
+
+
+def apply_review(show_id, previous_rating, rating, created):
+    changes = {}
+    if created:
+        changes['review_count'] = F('review_count') + 1
+    if previous_rating != rating:
+        if previous_rating in RATING_FIELDS:
+            field = RATING_FIELDS[previous_rating]
+            changes[field] = F(field) - 1
+        if rating in RATING_FIELDS:
+            field = RATING_FIELDS[rating]
+            changes[field] = F(field) + 1
+        delta = ((rating if rating in RATING_FIELDS else 0)
+                 - (previous_rating if previous_rating in RATING_FIELDS else 0))
+        if delta:
+            changes['rating_sum'] = F('rating_sum') + delta
+    _adjust(show_id, changes)
@@ -0,0 +1,133 @@
+"""
+Per-user genre affinities for genre based recommendations, kept in User_Taste_Profile.
+
+Every rating and watchlist status adds a weight to each genre of the show: good ratings and Watching/Completed pull a
+user towards its genres, bad ratings and Dropped push them away. Weights decay by half every TASTE_HALF_LIFE_DAYS:
+a row's weights are the decayed sums as of its Updated_At, and a change decays them to the current time before adding
+to them, so older events count for less than recent ones without a scale factor growing from a fixed epoch.
+Recommendations only use the direction of the weight vector.
+
+submit_review and change_status send their signals inside the transaction that writes History/WatchlistShow, and the
+receivers here apply those events (one review, or every show of a status batch) to the user's row in the same
+transaction, with one locking read and one UPDATE touching one key per genre of the shows.
+A changed rating or status swaps the old weight for the new one at the current time, which is close enough between
+`manage.py rebuild_taste_profiles` runs; the rebuild weights every event by its own date.
+"""
+
+from datetime import datetime, time, timezone
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone as django_timezone
+
+from .catalog import resolve_shows
+from .models import History, UserTasteProfile, WatchlistShow
+
+# undated events count as of this instant
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+RATING_WEIGHTS = {1: -1.0, 2: -0.5, 3: 0.25, 4: 0.75, 5: 1.0}
+STATUS_WEIGHTS = {'Planned': 0.25, 'Watching': 0.5, 'Completed': 0.5, 'Dropped': -0.5}
+
+
+def half_life_seconds():
+    return getattr(settings, 'TASTE_HALF_LIFE_DAYS', 180) * 86400
+
+
+def decay(since, at):
+    """Factor a weight as of `since` is left with at `at`."""
+    return 2 ** (-(at - since).total_seconds() / half_life_seconds())
+
+
+def _as_datetime(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc) if day else EPOCH
+
+
+def compute_profiles(user_ids=None, at=None):
+    """
+    Weigh every rating and status of the users (all users by default) as of `at` (now by default), returns
+    {user_id: {genre: weight}}.
+    """
+    at = at or django_timezone.now()
+    histories = History.objects.filter(rating__isnull=False)
+    watchlist_shows = WatchlistShow.objects.all()
+    if user_ids is not None:
+        histories = histories.filter(user_id__in=user_ids)
+        watchlist_shows = watchlist_shows.filter(watchlist_id__user__in=user_ids)
+
+    # (user_id, show_id, weight, day)
+    events = [(user_id, show_id, RATING_WEIGHTS.get(rating, 0.0), day) for user_id, show_id, rating, day in
+              histories.values_list('user_id', 'show_id', 'rating', 'review_date').iterator()]
+    events += [(user_id, show_id, STATUS_WEIGHTS.get(status, 0.0), day) for user_id, show_id, status, day in
+               watchlist_shows.values_list('watchlist_id__user', 'show_id', 'status', 'added_date').iterator()]
+    genres = {show.show_id: show.genres for show in resolve_shows({show_id for _, show_id, _, _ in events})}
+
+    # users asked for explicitly get a row even without any activity, so they aren't recomputed on every read
+    profiles = {user_id: {} for user_id in user_ids or ()}
+    for user_id, show_id, weight, day in events:
+        profile = profiles.setdefault(user_id, {})
+        scaled = weight * decay(_as_datetime(day), at)
+        for genre in genres.get(show_id, ()):
+            profile[genre] = profile.get(genre, 0.0) + scaled
+    return profiles
+
+
+def rebuild_taste_profiles(user_ids=None):
+    """Recompute the given users' profiles (all users by default), returns {user_id: {genre: weight}} as stored."""
+    with transaction.atomic():
+        # computed inside the transaction, so the router reads History and WatchlistShow from the primary. As of now,
+        # which is (to the millisecond) the Updated_At the rows get
+        profiles = compute_profiles(user_ids)
+        if user_ids is None:
+            UserTasteProfile.objects.all().delete()
+        # an upsert, two first reads of the same user may store it at the same time
+        db = router.db_for_write(UserTasteProfile)
+        unique_fields = None
+        if connections[db].features.supports_update_conflicts_with_target:
+            unique_fields = ['user_id']
+        UserTasteProfile.objects.using(db).bulk_create(
+            (UserTasteProfile(user_id=user_id, weights=weights) for user_id, weights in profiles.items()),
+            batch_size=1000, update_conflicts=True, update_fields=['weights', 'updated_at'],
+            unique_fields=unique_fields,
+        )
+    return profiles
+
+
+def get_profile(user_id):
+    """{genre: weight} of the user, users without a row yet are computed once and stored."""
+    weights = UserTasteProfile.objects.filter(user_id=user_id).values_list('weights', flat=True).first()
+    if weights is None:
+        # the stored weights, not a re-read that could go to a replica that doesn't have the row yet
+        weights = rebuild_taste_profiles([user_id])[user_id]
+    return weights
+
+
+def _adjust(user_id, show_weights):
+    """Add {show_id: weight} to the user's profile, one locking read and one UPDATE however many shows."""
+    show_weights = {show_id: weight for show_id, weight in show_weights.items() if weight}
+    shows = resolve_shows(show_weights)
+    if not shows:
+        return
+    profile = UserTasteProfile.objects.select_for_update().filter(user_id=user_id).first()
+    if profile is None:
+        # no row yet, compute the user from scratch, that already includes the write being applied
+        rebuild_taste_profiles([user_id])
+        return
+    # decayed from the last update to now, save() stamps Updated_At
+    scale = decay(profile.updated_at, django_timezone.now())
+    profile.weights = {genre: weight * scale for genre, weight in profile.weights.items()}
+    for show in shows:
+        for genre in show.genres:
+            profile.weights[genre] = profile.weights.get(genre, 0.0) + show_weights[show.show_id]
+    profile.save(update_fields=['weights', 'updated_at'])
+
+
+def apply_review(user_id, show_id, previous_rating, rating):
+    if previous_rating != rating:
+        _adjust(user_id, {show_id: RATING_WEIGHTS.get(rating, 0.0) - RATING_WEIGHTS.get(previous_rating, 0.0)})
+
+
+def apply_status_changes(user_id, previous_statuses, status):
+    """Move the shows ({show_id: previous status}) to status in the user's profile."""
+    _adjust(user_id, {show_id: STATUS_WEIGHTS.get(status, 0.0) - STATUS_WEIGHTS.get(previous_status, 0.0)
+                      for show_id, previous_status in previous_statuses.items()})
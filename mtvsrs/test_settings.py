@@ -0,0 +1,40 @@
+"""
+Settings for the test suite: `python3 manage.py test mtvsrs --settings=mtvsrs.test_settings`.
+
+Two local SQLite databases stand in for RDS and a read replica, so the primary/replica routing (mtvsrs/routers.py)
+runs exactly as in production. Nothing replicates between them by itself: tests copy the primary over the replica
+when they want it caught up, anything written after that is what a lagging replica hasn't seen yet.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "test-only-secret-key")
+
+from .settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        # the test runner creates both in memory, these files are never written
+        "NAME": os.path.join(tempfile.gettempdir(), "mtvsrs-primary.sqlite3"),
+    },
+    "replica_1": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(tempfile.gettempdir(), "mtvsrs-replica.sqlite3"),
+    },
+}
+DATABASE_REPLICAS = ["replica_1"]
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SECTION_CACHE_LOCK_DIR = os.path.join(tempfile.gettempdir(), "mtvsrs-test-locks")
+
+# no collectstatic manifest, catalog file or text index in a test run
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+CATALOG_FILE = None
+SIMILAR_SHOWS_INDEX = os.path.join(tempfile.gettempdir(), "mtvsrs-test-missing-index.npy")
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
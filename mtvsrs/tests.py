@@ -0,0 +1,215 @@
+"""
+Primary/replica routing and the query plans of every page against two SQLite databases, see test_settings.py:
+
+    python3 manage.py test mtvsrs --settings=mtvsrs.test_settings
+
+Every test starts with the synthetic dataset of benchmark.py on the primary, copied to the replica. Whatever is only
+written afterwards is what a lagging replica is still missing.
+"""
+
+import os
+import tempfile
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import catalog, query_plans, routers, taste, trending
+from .importer import HistoryImporter
+from .benchmark import create_legacy_schema, generate_dataset
+from .middleware import STICKY_SESSION_KEY
+from .models import History, Movie, Recommendation, ShowActivity, ShowCatalog, ShowStats, ShowTable, TrendingShow, TvSeries, User, \
+    UserTasteProfile, Watchlist, WatchlistShow
+
+PRIMARY, REPLICA = 'default', 'replica_1'
+LEGACY_MODELS = [History, WatchlistShow, Recommendation, Watchlist, User, ShowTable, Movie, TvSeries]
+
+
+class PrimaryReplicaTests(TransactionTestCase):
+    databases = {PRIMARY, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+        create_legacy_schema()
+        # the flush between tests only empties the managed tables
+        self.addCleanup(self.empty_legacy_tables)
+        generate_dataset(shows=30, users=3, history=30, watchlist_entries=15, log=lambda message: None)
+        catalog.rebuild_show_catalog()
+        self.replicate()
+        self.reset_process_caches()
+        self.client.force_login(AuthUser.objects.using(PRIMARY).get(pk=1))
+
+    def empty_legacy_tables(self):
+        with connections[PRIMARY].cursor() as cursor:
+            for model in LEGACY_MODELS:
+                cursor.execute(f'DELETE FROM {connections[PRIMARY].ops.quote_name(model._meta.db_table)}')
+        self.reset_process_caches()
+
+    def replicate(self):
+        """Bring the replica up to date with the primary."""
+        for alias in (PRIMARY, REPLICA):
+            connections[alias].ensure_connection()
+        connections[PRIMARY].connection.backup(connections[REPLICA].connection)
+
+    def reset_process_caches(self):
+        # the catalog snapshot and everything built from it
+        catalog.invalidate_catalog()
+
+    def test_reads_go_to_the_replica_outside_transactions(self):
+        self.assertEqual(router.db_for_read(Movie), REPLICA)
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Movie), PRIMARY)
+        token = routers.use_primary.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Movie), PRIMARY)
+        finally:
+            routers.use_primary.reset(token)
+        self.assertEqual(router.db_for_write(Movie), PRIMARY)
+
+    def test_show_page_counts_a_new_show_on_the_primary(self):
+        # no Show_Stats anywhere yet, the first view stores the row on the primary, the replica doesn't have it
+        response = self.client.get(reverse('show', args=[5]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ShowStats.objects.using(PRIMARY).filter(show_id=5).exists())
+        self.assertFalse(ShowStats.objects.using(REPLICA).filter(show_id=5).exists())
+
+    def test_home_page_computes_a_new_taste_profile_on_the_primary(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserTasteProfile.objects.using(PRIMARY).filter(user_id=1).exists())
+        self.assertFalse(UserTasteProfile.objects.using(REPLICA).filter(user_id=1).exists())
+
+    def test_other_sessions_read_the_replica(self):
+        History.objects.using(PRIMARY).filter(show_id=7, user_id=2).delete()
+        History.objects.using(PRIMARY).create(show_id_id=7, user_id_id=2, rating=5, review='Not replicated yet',
+                                              review_date=date.today())
+        response = self.client.get(reverse('show_reviews', args=[7]))
+        self.assertNotContains(response, 'Not replicated yet')
+
+        self.replicate()
+        response = self.client.get(reverse('show_reviews', args=[7]))
+        self.assertContains(response, 'Not replicated yet')
+
+    def test_writes_pin_the_session_to_the_primary(self):
+        show_id = next(show_id for show_id in range(1, 31) if not WatchlistShow.objects.using(PRIMARY).filter(
+            watchlist_id=1, show_id=show_id).exists())
+        response = self.client.post(reverse('change_status'), {'showId': show_id, 'newStatus': 'Watching'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(STICKY_SESSION_KEY, self.client.session)
+        self.assertFalse(WatchlistShow.objects.using(REPLICA).filter(watchlist_id=1, show_id=show_id).exists())
+
+        # the replica lags, but this session reads its own write from the primary
+        response = self.client.get(reverse('show', args=[show_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['current_status'], 'Watching')
+        self.assertEqual(response.context['status_distribution']['Watching'],
+                         WatchlistShow.objects.using(PRIMARY).filter(show_id=show_id, status='Watching').count())
+
+        # a session that didn't write reads the replica
+        other = self.client_class()
+        other.force_login(AuthUser.objects.using(PRIMARY).get(pk=2))
+        response = other.get(reverse('my_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(STICKY_SESSION_KEY, other.session)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_every_query_uses_an_index(self):
+        # what check_query_plans checks, here against both databases: page reads are explained on the replica
+        query_plans.analyze(connections[PRIMARY], [model._meta.db_table for model in LEGACY_MODELS])
+        self.replicate()
+        plans = query_plans.collect_plans()
+        self.assertIn(REPLICA, {alias for _endpoint, alias, _plan in plans})
+        self.assertEqual([f'{endpoint}: {plan.full_scans} in {plan.sql}'
+                          for endpoint, _alias, plan in plans if plan.full_scans], [])
+
+    @override_settings(TRENDING_HALF_LIFE_HOURS=12)
+    def test_trending_scores_decay_across_eras(self):
+        # thousands of half lives after trending.EPOCH, 2 ** (time since EPOCH / half life) alone overflows a float
+        response = self.client.post(reverse('change_status'), {'showId': 3, 'newStatus': 'Watching'})
+        self.assertEqual(response.status_code, 200)
+
+        half_life = timedelta(hours=12)
+        boundary = trending.EPOCH + 40 * trending.ERA_HALF_LIVES * half_life
+        trending.record_activity(9, 1.0, at=boundary - half_life)
+        trending.record_activity(9, 1.0, at=boundary + half_life)  # scales the row down to the new era
+        trending.record_activity(8, 1.0, at=boundary - 2 * half_life)
+        at = boundary + 3 * half_life
+        trending.advance_era(at)  # moves show 8, nobody touched it since
+        rows = {row.show_id: row for row in ShowActivity.objects.using(PRIMARY).filter(show_id__in=[8, 9])}
+        self.assertEqual({row.era for row in rows.values()}, {trending.era_of(at)})
+        self.assertAlmostEqual(trending.decayed(rows[9].score, rows[9].era, at), 2 ** -4 + 2 ** -2)
+        self.assertAlmostEqual(trending.decayed(rows[8].score, rows[8].era, at), 2 ** -5)
+
+        trending.refresh_trending()
+        self.assertTrue(TrendingShow.objects.using(PRIMARY).exists())
+
+    @override_settings(TASTE_HALF_LIFE_DAYS=0.5)
+    def test_taste_profiles_decay_from_their_last_update(self):
+        response = self.client.post(reverse('change_status'), {'showId': 3, 'newStatus': 'Watching'})
+        self.assertEqual(response.status_code, 200)
+        profiles = UserTasteProfile.objects.using(PRIMARY).filter(user_id=1)
+        profile = profiles.get()
+        profiles.update(updated_at=profile.updated_at - timedelta(hours=12))
+
+        show = catalog.resolve_shows([4])[0]
+        with transaction.atomic():
+            taste.apply_status_changes(1, {4: None}, 'Completed')
+        expected = {genre: weight / 2 for genre, weight in profile.weights.items()}
+        for genre in show.genres:
+            expected[genre] = expected.get(genre, 0.0) + taste.STATUS_WEIGHTS['Completed']
+        weights = profiles.get().weights
+        self.assertEqual(weights.keys(), expected.keys())
+        for genre, weight in expected.items():
+            self.assertAlmostEqual(weights[genre], weight, places=5)
+
+    def test_backfill_reads_the_primary(self):
+        History.objects.using(PRIMARY).filter(show_id=7, user_id=2).delete()
+        History.objects.using(PRIMARY).create(show_id_id=7, user_id_id=2, rating=5, review='Not replicated yet',
+                                              review_date=date.today())
+        trending.backfill()
+        self.assertEqual(ShowActivity.objects.using(PRIMARY).get(show_id=7).review_count,
+                         History.objects.using(PRIMARY).filter(show_id=7, review__isnull=False).exclude(review='')
+                         .count())
+
+    def test_catalog_syncs_from_the_primary(self):
+        # a new show, then its movie renamed: neither is on the replica yet
+        movie = Movie.objects.using(PRIMARY).create(movie_id=1000, name='Not replicated yet')
+        ShowTable.objects.using(PRIMARY).create(show_id=1000, movie=movie)
+        self.assertEqual(ShowCatalog.objects.using(PRIMARY).get(show_id=1000).name, 'Not replicated yet')
+        movie.name = 'Renamed'
+        movie.save(using=PRIMARY)
+        self.assertEqual(ShowCatalog.objects.using(PRIMARY).get(show_id=1000).name, 'Renamed')
+
+    def test_show_page_revisit_is_not_modified(self):
+        # the first visit renders the CSRF token that sets the cookie, the second one is already a 304
+        response = self.client.get(reverse('show', args=[5]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('show', args=[5]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_history_import_counts_and_recounts_inserted_rows(self):
+        History.objects.using(PRIMARY).filter(show_id=7, user_id__in=[2, 3]).delete()
+        History.objects.using(PRIMARY).create(show_id_id=7, user_id_id=2, rating=1, review_date=date.today())
+        ShowStats.objects.using(PRIMARY).all().delete()
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            f.write('user_id,show_id,rating\n2,7,5\n3,7,5\n3,7,4\n')
+        taste.get_profile(3)  # stored before the import
+        self.assertTrue(catalog.resolve_shows([7])[0].genres)
+
+        self.assertEqual(HistoryImporter(path, log=lambda message: None).run(), 1)
+        self.assertEqual(History.objects.using(PRIMARY).get(show_id=7, user_id=2).rating, 1)
+        self.assertEqual(History.objects.using(PRIMARY).get(show_id=7, user_id=3).rating, 5)
+        self.assertEqual(ShowStats.objects.using(PRIMARY).get(show_id=7).rating_5_count,
+                         History.objects.using(PRIMARY).filter(show_id=7, rating=5).count())
+        with transaction.atomic():
+            expected = taste.compute_profiles([3])[3]
+        weights = UserTasteProfile.objects.using(PRIMARY).get(user_id=3).weights
+        self.assertEqual(weights.keys(), expected.keys())
+        for genre, weight in expected.items():
+            self.assertAlmostEqual(weights[genre], weight, places=5)
@@ -0,0 +1,151 @@
+"""
+Description-aware similar shows, precomputed by `manage.py build_text_index`.
+
+Every show is a TF-IDF vector over the words of its name and description plus its genres, hashed into a fixed number
+of features so there is no vocabulary to store, and its nearest neighbours by cosine similarity are computed offline.
+Only the neighbours are written: one int32 .npy table with a row per show sorted by Show_ID, the Show_ID in column 0
+followed by its neighbours best first (0 where a show has fewer). Web workers memory-map it, a lookup is a binary search
+over column 0 and a slice of one row, and every worker on the host shares the same pages of the OS page cache.
+
+Shows added after the last build aren't in the table, similarity.similar_shows tops them up with genre matches.
+"""
+
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+DEFAULT_FEATURES = 2 ** 18
+
+TOKEN = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have he her his in into is it its not of on or she so than that the '
+    'their them they this to was were when where which while who will with you your'.split()
+)
+
+
+def index_path():
+    return getattr(settings, 'SIMILAR_SHOWS_INDEX', os.path.join(settings.BASE_DIR, 'similar_shows.npy'))
+
+
+### Building ###
+
+def tokens(show):
+    words = TOKEN.findall(f'{show.name or ""} {show.description or ""}'.lower())
+    return [word for word in words if len(word) > 1 and word not in STOP_WORDS] + [
+        f'genre:{genre.lower()}' for genre in show.genre_list
+    ]
+
+
+def feature(token, n_features):
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(token.encode()) % n_features
+
+
+def tfidf_matrix(shows, n_features=DEFAULT_FEATURES):
+    """Row-normalized (shows x n_features) sparse TF-IDF matrix, with sublinear term frequencies."""
+    rows, cols = [], []
+    for row, show in enumerate(shows):
+        features = [feature(token, n_features) for token in tokens(show)]
+        rows += [row] * len(features)
+        cols += features
+    # duplicate (row, feature) pairs are summed into term counts
+    counts = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                               shape=(len(shows), n_features))
+    counts.data = 1 + np.log(counts.data)
+
+    document_frequency = np.bincount(counts.indices, minlength=n_features)
+    idf = (np.log((1 + len(shows)) / (1 + document_frequency)) + 1).astype(np.float32)
+    matrix = counts @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags(1.0 / norms) @ matrix).tocsr()
+
+
+def nearest_neighbours(matrix, k=20, chunk_size=256, progress=None):
+    """
+    Row indexes of every row's k most cosine-similar rows, best first, -1 where fewer rows share any feature.
+
+    The full shows x shows product would be dense, so it is computed chunk_size rows at a time, memory stays around
+    chunk_size x number of shows floats.
+    """
+    n_rows = matrix.shape[0]
+    k = min(k, n_rows - 1)
+    neighbours = np.full((n_rows, max(k, 0)), -1, dtype=np.int64)
+    if k <= 0:
+        return neighbours
+
+    transposed = matrix.T.tocsc()
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        block = (matrix[start:stop] @ transposed).toarray()
+        # a show is not its own neighbour
+        block[np.arange(stop - start), np.arange(start, stop)] = 0.0
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        top, scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(scores, order, axis=1)
+        top[scores <= 0] = -1
+        neighbours[start:stop] = top
+        if progress:
+            progress(stop, n_rows)
+    return neighbours
+
+
+def write_index(show_ids, neighbours, path=None):
+    """Write the (Show_ID, neighbour Show_IDs...) table, replacing the previous one atomically. Returns its path."""
+    path = path or index_path()
+    show_ids = np.asarray(show_ids, dtype=np.int32)
+    table = np.zeros((len(show_ids), neighbours.shape[1] + 1), dtype=np.int32)
+    table[:, 0] = show_ids
+    table[:, 1:] = np.where(neighbours >= 0, show_ids[neighbours], 0)
+    table = table[np.argsort(show_ids, kind='stable')]
+
+    # workers that already mapped the old file keep reading it until they notice the new one
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, table)
+    os.replace(tmp_path, path)
+    return path
+
+
+### Serving ###
+
+_lock = threading.Lock()
+# ((inode, mtime, size) of the mapped file, table)
+_loaded = (None, None)
+
+
+def get_table():
+    """The memory-mapped table, remapped when a new build replaced the file, None if it was never built."""
+    global _loaded
+    try:
+        stat = os.stat(index_path())
+    except FileNotFoundError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    loaded_key, table = _loaded
+    if loaded_key == key:
+        return table
+    with _lock:
+        if _loaded[0] != key:
+            _loaded = (key, np.load(index_path(), mmap_mode='r'))
+        return _loaded[1]
+
+
+def neighbours(show_id):
+    """Precomputed neighbours of the show, best first, or None if the table doesn't have the show."""
+    table = get_table()
+    if table is None or not len(table):
+        return None
+    show_ids = table[:, 0]
+    row = int(np.searchsorted(show_ids, show_id))
+    if row == len(show_ids) or show_ids[row] != show_id:
+        return None
+    return [int(neighbour_id) for neighbour_id in table[row, 1:] if neighbour_id]
@@ -0,0 +1,195 @@
+"""
+Time-decayed trending shows.
+
+Every rating, review and watchlist status change adds a weight to the show's Show_Activity score, and scores halve
+every settings.TRENDING_HALF_LIFE_HOURS. Instead of decaying every row over time, each event's weight is scaled up by
+2 ** (hours since the start of its era / half life) when it is recorded: all scores of an era then decay by the same
+factor, so ordering by the stored score already ranks shows by their current decayed score, and recording an event is
+a single UPDATE.
+
+Eras are ERA_HALF_LIVES half lives long, which keeps the scale factor far from overflowing a float whatever the half
+life. A row stores the era its score is scaled to; an event of a later era first scales the row down to it in the same
+UPDATE, and refresh_trending moves the rows nobody touched forward before ranking them.
+
+The top K are copied to Trending_Show by `manage.py refresh_trending` (run it from cron), which is what the home page
+reads.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Power
+from django.utils import timezone as django_timezone
+
+from . import fragment_cache
+from .models import History, ShowActivity, TrendingShow, WatchlistShow
+
+# start of era 0, scores are stored relative to the start of their era
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# scores grow by at most 2 ** 64 within an era, float64 goes up to 2 ** 1024
+ERA_HALF_LIVES = 64
+
+RATING_WEIGHTS = {1: 0.0, 2: 0.25, 3: 0.5, 4: 1.0, 5: 1.5}
+REVIEW_WEIGHT = 0.5
+STATUS_WEIGHTS = {'Planned': 0.5, 'Watching': 1.0, 'Completed': 1.0, 'Dropped': 0.0}
+
+
+def half_life_seconds():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 72) * 3600
+
+
+def era_of(at):
+    return int((at - EPOCH).total_seconds() // (ERA_HALF_LIVES * half_life_seconds()))
+
+
+def growth(at, era):
+    """Factor an event weight is scaled by when recorded at `at` into a score of `era`."""
+    return 2 ** ((at - EPOCH).total_seconds() / half_life_seconds() - era * ERA_HALF_LIVES)
+
+
+def decayed(score, era, at=None):
+    """Current value of a stored score, i.e. the decayed sum of event weights."""
+    return score / growth(at or django_timezone.now(), era)
+
+
+def _rescaled(era):
+    # a score of an earlier era scaled to `era`
+    return F('score') * Power(2, (F('era') - era) * ERA_HALF_LIVES)
+
+
+def _changes(weight, at, ratings, reviews, status_changes):
+    current = era_of(at)
+    added = weight * growth(at, current)
+    return {
+        # a row already in a later era (an event recorded with an older `at`) takes the weight scaled to its era
+        'score': Case(When(era__lt=current, then=_rescaled(current) + added),
+                      default=F('score') + added * Power(2, (current - F('era')) * ERA_HALF_LIVES)),
+        'era': Case(When(era__lt=current, then=Value(current)), default=F('era')),
+        'rating_count': F('rating_count') + ratings,
+        'review_count': F('review_count') + reviews,
+        'status_change_count': F('status_change_count') + status_changes,
+        'last_activity': at,
+    }
+
+
+def record_activity(show_id, weight, at=None, ratings=0, reviews=0, status_changes=0):
+    at = at or django_timezone.now()
+    changes = _changes(weight, at, ratings, reviews, status_changes)
+    if ShowActivity.objects.filter(show_id=show_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            ShowActivity.objects.create(show_id=show_id, score=weight * growth(at, era_of(at)), era=era_of(at),
+                                        rating_count=ratings, review_count=reviews, status_change_count=status_changes,
+                                        last_activity=at)
+    except IntegrityError:
+        # another request created the row first
+        ShowActivity.objects.filter(show_id=show_id).update(**changes)
+
+
+def review_weight(rating, review):
+    return RATING_WEIGHTS.get(rating, 0.0) + (REVIEW_WEIGHT if review else 0.0)
+
+
+def record_review(show_id, rating, review, at=None):
+    record_activity(show_id, review_weight(rating, review), at, ratings=int(rating is not None),
+                    reviews=int(bool(review)))
+
+
+def record_status_changes(show_ids, status, at=None):
+    """The same status change on many shows: one UPDATE for the shows with a row, one INSERT for the others."""
+    at = at or django_timezone.now()
+    weight = STATUS_WEIGHTS.get(status, 0.0)
+    show_ids = list(dict.fromkeys(show_ids))
+    # rows that exist are never deleted outside backfill(), the ones missing here may be created by someone else before
+    # our INSERT, which then fails and falls back to recording show by show
+    existing = set(ShowActivity.objects.filter(show_id__in=show_ids).values_list('show_id', flat=True))
+    if existing:
+        ShowActivity.objects.filter(show_id__in=existing).update(**_changes(weight, at, 0, 0, 1))
+    missing = [show_id for show_id in show_ids if show_id not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            ShowActivity.objects.bulk_create(
+                ShowActivity(show_id=show_id, score=weight * growth(at, era_of(at)), era=era_of(at), rating_count=0,
+                             review_count=0, status_change_count=1, last_activity=at)
+                for show_id in missing
+            )
+    except IntegrityError:
+        for show_id in missing:
+            record_activity(show_id, weight, at, status_changes=1)
+
+
+def advance_era(at=None):
+    """Scale the scores of earlier eras to the era of `at` (now by default), returns the number of rows moved."""
+    current = era_of(at or django_timezone.now())
+    # one UPDATE, atomic per row like the ones recording events
+    return ShowActivity.objects.filter(era__lt=current).update(score=_rescaled(current), era=current)
+
+
+def refresh_trending(size=None):
+    """Copy the current top `size` shows into Trending_Show, returns the number of rows written."""
+    size = size or getattr(settings, 'TRENDING_SIZE', 10)
+    now = django_timezone.now()
+    # scores of different eras don't compare
+    advance_era(now)
+    with transaction.atomic():
+        # ranked inside the transaction, i.e. on the primary, a replica may not have the moved rows yet
+        top = ShowActivity.objects.filter(score__gt=0).order_by('-score').values_list('show_id', 'score', 'era')[:size]
+        rows = [TrendingShow(rank=rank, show_id=show_id, score=decayed(score, score_era, now), computed_at=now)
+                for rank, (show_id, score, score_era) in enumerate(top, start=1)]
+        TrendingShow.objects.all().delete()
+        TrendingShow.objects.bulk_create(rows)
+        fragment_cache.invalidate(fragment_cache.TRENDING)
+    return len(rows)
+
+
+def trending_show_ids(limit=10):
+    """Show ids of the precomputed top-K, falling back to ranking Show_Activity if it was never refreshed."""
+    show_ids = list(TrendingShow.objects.order_by('rank').values_list('show_id', flat=True)[:limit])
+    if not show_ids:
+        show_ids = list(ShowActivity.objects.filter(score__gt=0).order_by('-score')
+                        .values_list('show_id', flat=True)[:limit])
+    return show_ids
+
+
+def _as_datetime(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc) if day else EPOCH
+
+
+def backfill():
+    """Rebuild every Show_Activity row from existing History and WatchlistShow rows, returns the number of shows."""
+    # everything scaled to the current era, older events only get smaller
+    current = era_of(django_timezone.now())
+    activity = defaultdict(lambda: {'score': 0.0, 'era': current, 'rating_count': 0, 'review_count': 0,
+                                    'status_change_count': 0, 'last_activity': None})
+
+    def add(show_id, weight, day, **counts):
+        at = _as_datetime(day)
+        row = activity[show_id]
+        row['score'] += weight * growth(at, current)
+        for name, count in counts.items():
+            row[name] += count
+        if row['last_activity'] is None or at > row['last_activity']:
+            row['last_activity'] = at
+
+    with transaction.atomic():
+        # read inside the transaction, so the router reads History and WatchlistShow from the primary
+        for show_id, rating, review, review_date in History.objects.values_list(
+                'show_id', 'rating', 'review', 'review_date').iterator(chunk_size=5000):
+            add(show_id, review_weight(rating, review), review_date,
+                rating_count=int(rating is not None), review_count=int(bool(review)))
+
+        for show_id, status, added_date in WatchlistShow.objects.values_list(
+                'show_id', 'status', 'added_date').iterator(chunk_size=5000):
+            add(show_id, STATUS_WEIGHTS.get(status, 0.0), added_date, status_change_count=1)
+
+        ShowActivity.objects.all().delete()
+        ShowActivity.objects.bulk_create(
+            (ShowActivity(show_id=show_id, **row) for show_id, row in activity.items()), batch_size=1000
+        )
+    return len(activity)
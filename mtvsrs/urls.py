@@ -15,23 +15,32 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import async_views, views
 from django.contrib.auth import views as auth_views
 
+# asgi.py turns on ASYNC_VIEWS, the home and show pages then load their sections concurrently
+page_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("", views.home_page, name="home"),
-    path("show/<int:show_id>/", views.show_page, name='show'),
+    path("", page_views.home_page, name="home"),
+    path("show/<int:show_id>/", page_views.show_page, name='show'),
+    path("show/<int:show_id>/reviews", views.show_reviews, name='show_reviews'),
     path("register", views.register_user, name="register"),
     path("", include("django.contrib.auth.urls")),
     path('login/', auth_views.LoginView.as_view(), name='login'),
     path('logout/', auth_views.LoginView.as_view(), name='logout'),
     path('search/', views.search_feature, name='search_view'),
+    path('search/suggest', views.search_suggest, name='search_suggest'),
     path("my_list/", views.my_list_page, name='my_list'),
+    path("my_list/more", views.my_list_more, name='my_list_more'),
     path("change_status/", views.change_status, name='change_status'),
+    path("change_status/batch", views.change_status_batch, name="change_status_batch"),
     path("submit_review/", views.submit_review, name='submit_review'),
+    path("metrics", views.metrics, name='metrics'),
+    path("healthz", views.health, name='health'),
 
 ]
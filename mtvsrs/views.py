@@ -1,17 +1,24 @@
-from ast import literal_eval
-from collections import defaultdict
 from datetime import date
 
-import numpy as np
-import plotly.express as px
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.db import connection
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
-from django.shortcuts import render, get_object_or_404
+from django.db import connection, transaction
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.shortcuts import render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
+from . import charts, conditional, fragment_cache, instrumentation, signals, similarity, taste, trending
+from .catalog import get_catalog, resolve_rows, resolve_show, resolve_shows
 from .forms import CustomUserCreationForm, ReviewForm
-from .models import ShowTable, Movie, TvSeries, History, Watchlist, WatchlistShow, User
+from .models import History, Recommendation, WatchlistShow
+from .pagination import InvalidCursor, Page, keyset_page
+from .search import get_search_index
+from .stats import get_show_stats
+from .watchlist import STATUS_TYPES, set_statuses
+
+MY_LIST_PAGE_SIZE = 20  # per status tab, the rest loads as you scroll
+REVIEWS_PAGE_SIZE = 10
+BATCH_STATUS_LIMIT = 1000
 
 
 def register_user(request: HttpRequest) -> HttpResponse:
@@ -32,348 +39,299 @@ def register_user(request: HttpRequest) -> HttpResponse:
 def home_page(request):
     user_id = request.user.id
 
-    # Using raw queries as syntax for Django ORM is new to me
-    new_release_columns = ['Show_ID', 'Show_Name', 'Show_Description', 'Show_Type']
-    new_release_query = """
-        SELECT 
-            st.Show_ID as Show_ID,
-            unioned.Show_Name as Show_Name,
-            unioned.Show_Description as Show_Description,
-            unioned.Show_Type as Show_Type,
-            unioned.Show_Release_Date as Show_Release_Date
-        FROM
-            (
-                (SELECT
-                    Movie_ID AS Show_ID,
-                    Name AS Show_Name,
-                    Description as Show_Description,
-                    'Movie' AS Show_Type,
-                    Release_Date AS Show_Release_Date
-                FROM
-                    Movie)
-
-                UNION ALL
-
-                (SELECT
-                    TV_Series_ID AS Show_ID,
-                    Name AS Show_Name,
-                    Description as Show_Description,
-                    'TV' AS Show_Type,
-                    Release_Date AS Show_Release_Date
-                FROM
-                    TV_Series)
-            ) AS unioned
-        JOIN
-            Show_Table st ON 
-            (st.Movie_ID = unioned.Show_ID)
-            OR 
-            (st.TV_Series_ID = unioned.Show_ID)
-        ORDER BY 
-            Show_Release_Date DESC 
-        LIMIT 10;
-    """
+    new_release_shows = get_new_release_shows()
+    trending_shows = get_trending_shows(request)
+    recommend_shows = get_recommended_shows(user_id)
 
-    with connection.cursor() as cursor:
-        cursor.execute(new_release_query)
-        new_release_shows = cursor.fetchall()
-        new_release_shows = [
-            # exclude release date
-            {new_release_columns[i]: value for i, value in enumerate(show[:-1])} for show in new_release_shows
-        ]
+    context = home_page_context(user_id, new_release_shows, trending_shows, recommend_shows)
+    return render(request, "home.html", context)
 
-    trending_shows = get_trending_shows(request)
-    recommend_shows = recommend_similar_shows(user_id)
 
-    context = {
+# shared with async_views.home_page, which loads the same sections concurrently
+def home_page_context(user_id, new_release_shows, trending_shows, recommend_shows):
+    return {
         'card_count': range(10),
         'user_id': user_id,
         'new_release_shows': new_release_shows,
         'trending_shows': trending_shows,
         'recommend_shows': recommend_shows
     }
-    return render(request, "home.html", context)
 
 
-# Create a pop up alert for no search result
+def get_new_release_shows():
+    # sections are cached, see fragment_cache.py for how they are invalidated
+    return resolve_shows(fragment_cache.get_or_compute(
+        fragment_cache.NEW_RELEASES, lambda: [show.show_id for show in get_catalog().new_releases(10)]
+    ))
+
+
+SEARCH_PAGE_SIZE = 20
+
+
 @login_required(login_url="/login/")
 def search_feature(request):
-    if request.method == 'POST':
-        search_query = request.POST.get('search_query', '')
-
-        try:
-            movie = Movie.objects.get(name__icontains=search_query)
-            show_table = ShowTable.objects.get(movie_id=movie.movie_id)
-            show_id = show_table.show_id
-            return show_page(request, show_id)
-        except Movie.DoesNotExist:
-            pass
-
-        try:
-            tv_series = TvSeries.objects.get(name__icontains=search_query)
-            show_table = ShowTable.objects.get(tv_series_id=tv_series.tv_series_id)
-            show_id = show_table.show_id
-            return show_page(request, show_id)
-        except TvSeries.DoesNotExist:
-            context = {'error_message': 'No search result, please check again'}
-    return render(request, 'post_search.html', context)
+    params = request.POST if request.method == 'POST' else request.GET
+    search_query = params.get('search_query', '').strip()
+    try:
+        page = max(int(params.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    results, total = get_search_index().search(search_query, offset=(page - 1) * SEARCH_PAGE_SIZE,
+                                               limit=SEARCH_PAGE_SIZE)
+
+    # Create a pop up alert for no search result
+    if not total:
+        context = {'error_message': 'No search result, please check again'}
+        return render(request, 'post_search.html', context)
+
+    # a single match goes straight to its page, like before
+    if total == 1:
+        return HttpResponseRedirect(reverse('show', args=[results[0].show_id]))
+
+    page_count = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    context = {
+        'search_query': search_query,
+        'results': results,
+        'total': total,
+        'page': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if page < page_count else None,
+        'page_count': page_count,
+    }
+    return render(request, 'search_results.html', context)
 
 
 @login_required(login_url="/login/")
+def search_suggest(request):
+    # htmx endpoint behind the search box, prefix completions only, no database access
+    suggestions = get_search_index().suggest(request.GET.get('search_query', ''), limit=8)
+    return render(request, 'search_suggestions.html', {'suggestions': suggestions})
+
+
+@login_required(login_url="/login/")
+@conditional.conditional_page(conditional.show_page_stamps)
 def show_page(request, show_id):
     user_id = request.user.id
-    watchlist_id = Watchlist.objects.get(user_id=user_id).watchlist_id
-    try:
-        current_status = WatchlistShow.objects.get(watchlist_id=watchlist_id, show_id=show_id).status
-    except WatchlistShow.DoesNotExist:
-        current_status = None
 
     ### Show data ###
-    show = get_object_or_404(ShowTable, pk=show_id)
-    if show.movie_id:
-        show = get_object_or_404(Movie, pk=show.movie_id)
-        show_type = "Movie"
-    else:
-        show = get_object_or_404(TvSeries, pk=show.tv_series_id)
-        show_type = "TV"
-    # parse genre string into list, then concat them with just a comma
-    literal_eval_genre = literal_eval(show.genre)
-    show.genre = ', '.join(literal_eval_genre)
+    show = resolve_show(show_id)
+    if show is None:
+        raise Http404("No show matches the given query.")
+
+    watchlist_id, current_status = get_watchlist_status(request.identity, show_id)
 
     ### Similar shows ##
-    show_genres_set = set(literal_eval_genre)
-    movies = Movie.objects.all()
-    tv_shows = TvSeries.objects.all()
-    movies_common = [movie for movie in movies if len(set(literal_eval(movie.genre)) & show_genres_set) >= 2][:5]
-    tv_shows_common = [tv_show for tv_show in tv_shows if
-                       len(set(literal_eval(tv_show.genre)) & show_genres_set) >= 2][:5]
-    similar_shows = movies_common + tv_shows_common
-    similar_shows = sorted(similar_shows, key=lambda x: x.release_date)
-    # use movie.movie_id or tv_series.tv_series_id to get the show_id
-    for similar_show in similar_shows:
-        movie_id = getattr(similar_show, 'movie_id', None)
-        tv_series_id = getattr(similar_show, 'tv_series_id', None)
-        if movie_id:
-            similar_show.show_id = ShowTable.objects.get(movie_id=movie_id).show_id
-            similar_show.show_type = "Movie"
-        else:
-            similar_show.show_id = ShowTable.objects.get(tv_series_id=tv_series_id).show_id
-            similar_show.show_type = "TV"
+    # shows with similar descriptions across movies and tv, precomputed by `manage.py build_text_index`
+    similar_shows = similarity.similar_shows(show.show_id, k=10)
 
     ### Reviews ###
-    review_count = History.objects.filter(show_id=show_id).count()
-    reviews = History.objects.filter(show_id=show_id).select_related('user_id').order_by('-review_date')[:5]
-
-    ### Status distribution ###
-    status_types = ['Planned', 'Watching', 'Completed', 'Dropped']
-    # pass in show_id as parameter when executing query rather than string interpolation to prevent sql injection
-    status_distribution_query = """
-        SELECT
-            Status, COUNT(*) as Count
-        FROM
-            WatchlistShow
-        WHERE
-            Show_ID = %s
-        GROUP BY Status;
-    """
-    # if status is not in the query results, count should be 0, so init an empty dict first
-    status_distribution = {status_type: 0 for status_type in status_types}
-
-    ### Score distribution ###
-    score_distribution_query = """
-        SELECT rating FROM History WHERE Show_ID = %s;
-    """
-    # initialize for histogram, technically not necessary and we can use px.histogram
-    # but because our data is sparse sometimes there are no counts for a rating
-    score_distribution = {score: 0 for score in np.arange(1, 6)}
-
-    ### Execute queries ###
-    with (connection.cursor() as cursor):
-        ### Status distribution ###
-        cursor.execute(status_distribution_query, [show_id])
-        for row in cursor.fetchall():
-            status_distribution[row[0]] = row[1]
-
-        ### Score distribution ###
-        cursor.execute(score_distribution_query, [show_id])
-        for row in cursor.fetchall():
-            score_distribution[row[0]] += 1
+    reviews = get_reviews(show_id)
 
-    ### Score distribution ###
-    ratings = list(score_distribution.keys())
-    counts = list(score_distribution.values())
-    score_distribution_plot = px.bar(
-        x=ratings,
-        y=counts,
-        color=counts,
-        color_continuous_scale=[(0, "red"), (0.5, "yellow"), (1, "green")],
-        template="plotly_dark",
-    )
-    # remove all labels and make responsive
-    score_distribution_plot.update_layout(
-        xaxis_title="",
-        yaxis_title="",
-        title="",
-        xaxis_showticklabels=True,
-        yaxis_showticklabels=False,
-        xaxis_visible=True,
-        yaxis_visible=False,
-        autosize=True,
-        margin=dict(l=10, r=10, t=10, b=10),
-        plot_bgcolor="rgba(0,0,0,0)",  # transparent background
-        coloraxis_showscale=False,  # hide the color scale bar
-        hovermode=False,
-        bargap=0.4
-    )
-    # adjust marker properties
-    score_distribution_plot.update_traces(
-        marker_line_width=0,  # borders around bars
-        marker_opacity=0.6,
-    )
-    score_distribution_plot = score_distribution_plot.to_html(full_html=False, config={'displayModeBar': False})
+    ### Status and score distribution ###
+    # maintained by change_status and submit_review, one primary key lookup
+    show_stats = get_show_stats(show_id)
 
     ### My Review ###
-    user_review = None
+    user_review = get_user_review(show_id, user_id)
+
+    context = show_page_context(request, show, watchlist_id, current_status, similar_shows, reviews, show_stats,
+                                user_review)
+    return render(request, "show.html", context)
+
+
+def get_watchlist_status(identity, show_id):
+    # the Watchlist_ID comes from the session, see identity.py
+    watchlist_id = identity.watchlist_id
+    current_status = WatchlistShow.objects.filter(
+        watchlist_id=watchlist_id, show_id=show_id
+    ).values_list('status', flat=True).first()
+    return watchlist_id, current_status
+
+
+def get_reviews(show_id, cursor=None):
+    # newest first, evaluated here so the template never queries, async_views renders outside the ORM threads
+    # rows without a date can't be paged by date, every write path sets one
+    reviews = History.objects.filter(show_id=show_id, review_date__isnull=False).select_related('user_id')
+    return keyset_page(reviews, ('review_date', 'user_id'), (date.fromisoformat, int), cursor, REVIEWS_PAGE_SIZE)
+
+
+@login_required(login_url="/login/")
+def show_reviews(request, show_id):
+    # htmx endpoint, the next batch of reviews once the last one scrolls into view
     try:
-        user_review = History.objects.get(show_id=show_id, user_id=user_id)
+        page = get_reviews(show_id, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, 'review_list.html', {'show_id': show_id, 'reviews': page.items,
+                                                'next_cursor': page.next_cursor})
+
+
+def get_user_review(show_id, user_id):
+    try:
+        return History.objects.get(show_id=show_id, user_id=user_id)
     except History.DoesNotExist:
-        pass
+        return None
+
+
+# shared with async_views.show_page
+def show_page_context(request, show, watchlist_id, current_status, similar_shows, reviews, show_stats, user_review):
+    show_id = show.show_id
+    show_type = show.show_type
+    review_count = show_stats.review_count
+    status_distribution = show_stats.status_distribution
+    score_distribution = show_stats.score_distribution
+
+    ### Score distribution ###
+    # lightweight cached SVG by default, ?chart=rich renders the interactive Plotly version
+    score_distribution_plot = charts.score_histogram(score_distribution, rich=request.GET.get('chart') == 'rich')
+
     review_form = ReviewForm()  # pass in empty form for review submission
 
     ### Build context and return ###
-    context = {
-        'show': show,  # this will not have show_id, but movie_id or tv_series_id
+    return {
+        'show': show,
         'show_id': show_id,
         'show_type': show_type,
         'watchlist_id': watchlist_id,
         'current_status': current_status,
-        'status_types': status_types,
+        'status_types': STATUS_TYPES,
         'status_distribution': status_distribution,
         'score_distribution_plot': score_distribution_plot,
+        'average_rating': show_stats.average_rating,
         'review_count': review_count,
-        'reviews': reviews,
+        'reviews': reviews.items,
+        'reviews_cursor': reviews.next_cursor,
         'card_count': range(10),
-        'user_id': user_id,
+        'user_id': request.user.id,
         'similar_shows': similar_shows,
         'review_form': review_form,
         'user_review': user_review
     }
 
-    return render(request, "show.html", context)
-
 
 @login_required(login_url="/login/")
+@conditional.conditional_page(conditional.my_list_stamps)
 def my_list_page(request):
     user_id = request.user.id
-    watchlist_id = Watchlist.objects.get(user_id=user_id).watchlist_id
-    watchlist_shows = WatchlistShow.objects.filter(watchlist_id=watchlist_id).select_related('show_id')
-
-    shows_by_status = defaultdict(list)
-    for ws in watchlist_shows:
-        if ws.show_id.movie_id:
-            s = get_object_or_404(Movie, pk=ws.show_id.movie_id)
-            s.show_type = "Movie"
-        else:
-            s = get_object_or_404(TvSeries, pk=ws.show_id.tv_series_id)
-            s.show_type = "TV"
-        s.genre = ', '.join(literal_eval(s.genre))
-        s.show_id = ws.show_id_id
-        s.status = ws.status
-        shows_by_status[s.status].append(s)
+    watchlist_id = request.identity.watchlist_id
+
+    # first page of every status tab, one bounded query each however long the list is
+    sections = []
+    for status in STATUS_TYPES:
+        page = get_watchlist_page(watchlist_id, status)
+        if page.items:
+            sections.append({'status': status, 'shows': page.items, 'next_cursor': page.next_cursor})
 
     context = {
-        'shows_by_status': dict(shows_by_status),  # django wont render defaultdict
+        'sections': sections,
         'user_id': user_id
     }
 
     return render(request, "my_list.html", context)
 
 
-def get_trending_shows(request):
-    top_histories = History.objects.filter(rating=5).order_by('-review_date')[:10]
-
-    trending_shows = []
-    for history in top_histories:
-        try:
-            show = history.show_id
+@login_required(login_url="/login/")
+def my_list_more(request):
+    # htmx endpoint, the next page of one status tab
+    status = request.GET.get('status')
+    if status not in STATUS_TYPES:
+        raise Http404("Unknown status.")
+    try:
+        page = get_watchlist_page(request.identity.watchlist_id, status, request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, 'my_list_rows.html', {'status': status, 'shows': page.items,
+                                                 'next_cursor': page.next_cursor})
 
-            if show.movie_id is not None:
-                movie = Movie.objects.get(movie_id=show.movie_id)
-                trending_shows.append({'name': movie.name, 'description': movie.description, 'show_id': show.show_id,
-                                       'show_type': 'Movie'})
 
-            elif show.tv_series_id is not None:
-                series = TvSeries.objects.get(tv_series_id=show.tv_series_id)
-                trending_shows.append({'name': series.name, 'description': series.description, 'show_id': show.show_id,
-                                       'show_type': 'TV'})
+def get_watchlist_page(watchlist_id, status, cursor=None):
+    # most recently added first
+    watchlist_shows = (WatchlistShow.objects.filter(watchlist_id=watchlist_id, status=status)
+                       .only('show_id', 'added_date'))
+    page = keyset_page(watchlist_shows, ('added_date', 'show_id'), (date.fromisoformat, int), cursor, MY_LIST_PAGE_SIZE)
+    return Page([show for ws, show in resolve_rows(page.items)], page.next_cursor)
 
-        except ShowTable.DoesNotExist:
-            pass
 
-    return trending_shows
+def get_trending_shows(request):
+    # time-decayed top shows, precomputed by `manage.py refresh_trending`
+    return resolve_shows(fragment_cache.get_or_compute(fragment_cache.TRENDING,
+                                                       lambda: trending.trending_show_ids(10)))
 
 
 @require_POST
 def change_status(request):
-    watchlist_id = int(request.POST.get('watchlistId'))
+    # always the user's own watchlist, from the session rather than the form
+    watchlist_id = request.identity.watchlist_id
     show_id = int(request.POST.get('showId'))
     new_status = request.POST.get('newStatus')
+    if watchlist_id is None:
+        return HttpResponseBadRequest("No watchlist")
+    if new_status not in STATUS_TYPES or resolve_show(show_id) is None:
+        return HttpResponseBadRequest("Unknown status or show")
 
-    _, created = WatchlistShow.objects.filter(watchlist_id=watchlist_id, show_id=show_id).get_or_create(
-        defaults={'watchlist_id': Watchlist.objects.get(pk=watchlist_id), 'show_id': ShowTable.objects.get(pk=show_id),
-                  'status': new_status, 'added_date': date.today()}
-    )
-
-    # update the status if the object was found rather than created
-    if not created:
-        WatchlistShow.objects.filter(watchlist_id=watchlist_id, show_id=show_id).update(status=new_status)
+    # locking read of the previous status plus one upsert, see watchlist.set_statuses
+    set_statuses(watchlist_id, [show_id], new_status, request.identity.user_id)
 
     return HttpResponse(f'<span id="statusLabel">{new_status}</span>')
 
 
-def get_high_rated_show_genre(user_id):
-    highest_rated = History.objects.filter(user_id=user_id).order_by('-rating').first()
-
-    if highest_rated:
-        if highest_rated.show_id.movie:
-            return highest_rated.show_id.movie.genre
-        elif highest_rated.show_id.tv_series:
-            return highest_rated.show_id.tv_series.genre
+@login_required(login_url="/login/")
+@require_POST
+def change_status_batch(request):
+    # bulk "mark all completed" and scripted imports: showIds=1,2,3 (or repeated showId) and newStatus, one upsert
+    new_status = request.POST.get('newStatus')
+    watchlist_id = request.identity.watchlist_id
+    if watchlist_id is None:
+        return HttpResponseBadRequest("No watchlist")
+    if new_status not in STATUS_TYPES:
+        return HttpResponseBadRequest("Unknown status")
+    try:
+        show_ids = [int(show_id) for show_id in request.POST.getlist('showId')]
+        show_ids += [int(show_id) for show_id in request.POST.get('showIds', '').split(',') if show_id.strip()]
+    except ValueError:
+        return HttpResponseBadRequest("Show ids must be integers")
+    if len(show_ids) > BATCH_STATUS_LIMIT:
+        return HttpResponseBadRequest(f"At most {BATCH_STATUS_LIMIT} shows per request")
 
+    # unknown shows are ignored rather than failing the whole batch on a foreign key error
+    known = {show.show_id for show in resolve_shows(show_ids)}
+    changed = set_statuses(watchlist_id, [show_id for show_id in show_ids if show_id in known], new_status,
+                           request.identity.user_id)
 
-def recommend_similar_shows(user_id):
-    genre_string = get_high_rated_show_genre(user_id)
+    return JsonResponse({'status': new_status, 'changed': changed,
+                         'ignored': [show_id for show_id in show_ids if show_id not in known]})
 
-    if not genre_string:
-        return []
 
-    eval_genre = literal_eval(genre_string)
-    show_genres_set = set(eval_genre)
+def get_recommended_shows(user_id):
+    return resolve_shows(fragment_cache.get_or_compute(fragment_cache.recommendations_key(user_id),
+                                                       lambda: get_recommended_show_ids(user_id)))
 
-    reviewed_show_ids = History.objects.filter(user_id=user_id).values_list('show_id', flat=True)
 
-    # Fetch all movies and TV shows, excluding those already reviewed
-    movies = Movie.objects.exclude(movie_id__in=reviewed_show_ids)
+def get_recommended_show_ids(user_id):
+    # precomputed by `manage.py build_recommendations`, written in rank order
+    recommended_show_ids = list(Recommendation.objects.filter(
+        user_id=user_id, user_feedback__isnull=True
+    ).order_by('recommendation_id').values_list('show_id', flat=True)[:10])
 
-    tv_shows = TvSeries.objects.exclude(tv_series_id__in=reviewed_show_ids)
+    # users the last build hasn't seen yet still get genre based recommendations
+    return recommended_show_ids or [show.show_id for show in recommend_similar_shows(user_id)]
 
-    # Find movies and TV shows with at least 2 genres in common, excluding previously watched
-    movies_common = [movie for movie in movies if len(set(literal_eval(movie.genre)) & show_genres_set) >= 1][:5]
-    tv_shows_common = [tv_show for tv_show in tv_shows if len(set(literal_eval(tv_show.genre)) & show_genres_set) >= 1][
-                      :5]
 
-    for movie in movies_common:
-        movie.show_type = "Movie"
-        movie.show_id = ShowTable.objects.get(movie_id=movie.movie_id).show_id
+def recommend_similar_shows(user_id):
+    # genre affinities from all of the user's ratings and statuses, kept up to date as they change (see taste.py)
+    weights = taste.get_profile(user_id)
 
-    for tv_show in tv_shows_common:
-        tv_show.show_type = "TV"
-        tv_show.show_id = ShowTable.objects.get(tv_series_id=tv_show.tv_series_id).show_id
+    if not any(weight > 0 for weight in weights.values()):
+        return []
 
-    # Combine the lists and sort by release date
-    similar_shows = movies_common + tv_shows_common
-    similar_shows = sorted(similar_shows, key=lambda x: x.release_date, reverse=True)[:10]
+    reviewed_show_ids = History.objects.filter(user_id=user_id).values_list('show_id', flat=True)
 
-    return similar_shows
+    # Rank every show by how well its genres match the profile, previously watched shows are masked out
+    engine = similarity.get_engine()
+    ranked = engine.top_k(engine.vector_for_profile(weights), k=10, metric='cosine',
+                          exclude=set(reviewed_show_ids))
+    return resolve_shows(show_id for show_id, _ in ranked)
 
 
 @require_POST
@@ -382,14 +340,30 @@ def submit_review(request):
     if review_form.is_valid():
         review = review_form.cleaned_data['review']
         rating = review_form.cleaned_data['rating']
-        show_id = request.POST.get('show_id')
-        History.objects.update_or_create(
-            show_id=ShowTable.objects.get(pk=show_id),
-            user_id=User.objects.get(pk=request.user.id),
-            defaults={'rating': rating,
-                      'review': review,
-                      'review_date': date.today()}
-        )
+        show_id = int(request.POST.get('show_id'))
+        user_id = request.identity.user_id
+        if resolve_show(show_id) is None:
+            return HttpResponseBadRequest("Unknown show")
+        with transaction.atomic():
+            previous = list(History.objects.select_for_update().filter(
+                show_id=show_id, user_id=user_id
+            ).values_list('rating', flat=True))
+            created = not previous
+            previous_rating = None if created else previous[0]
+
+            # filter().update() rather than save(), the model's primary key is only User_ID so saving an instance
+            # would overwrite every review of the user. Foreign keys are set by id, no lookups before the write.
+            if created:
+                History.objects.create(show_id_id=show_id, user_id_id=user_id,
+                                       rating=rating, review=review, review_date=date.today())
+            else:
+                History.objects.filter(show_id=show_id, user_id=user_id).update(
+                    rating=rating, review=review, review_date=date.today()
+                )
+
+            signals.review_submitted.send(sender=History, show_id=show_id, user_id=user_id,
+                                          previous_rating=previous_rating, rating=int(rating), review=review,
+                                          created=created)
 
         context = {
             'user_review': {'review': review, 'rating': rating},  # Mimic the expected context structure
@@ -398,3 +372,18 @@ def submit_review(request):
         }
 
         return render(request, 'review_form.html', context)
+
+
+@staff_member_required
+def metrics(request):
+    # per-view request, SQL and render time histograms of this worker process
+    return HttpResponse(instrumentation.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def health(request):
+    # `manage.py serve` only lets a new worker accept connections once this returns 200: the database answers and the
+    # catalog is loaded
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    get_catalog()
+    return HttpResponse('ok', content_type='text/plain')
@@ -0,0 +1,49 @@
+"""
+Watchlist writes: every status change is one INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT DO UPDATE on SQLite and
+PostgreSQL) however many shows it covers, after one locking read of the shows' current statuses.
+"""
+
+from datetime import date
+
+from django.db import connections, router, transaction
+
+from . import signals
+from .models import WatchlistShow
+
+STATUS_TYPES = ['Planned', 'Watching', 'Completed', 'Dropped']
+
+
+def upsert_statuses(watchlist_id, show_ids, status):
+    """Add the shows to the watchlist with status, or change their status. Shows already on it keep their Added_Date."""
+    rows = [WatchlistShow(watchlist_id_id=watchlist_id, show_id_id=show_id, status=status, added_date=date.today())
+            for show_id in show_ids]
+    if not rows:
+        return
+    db = router.db_for_write(WatchlistShow)
+    # MySQL can't name the conflicting key, ON DUPLICATE KEY UPDATE applies to any of them
+    unique_fields = None
+    if connections[db].features.supports_update_conflicts_with_target:
+        unique_fields = ['watchlist_id', 'show_id']
+    WatchlistShow.objects.using(db).bulk_create(rows, update_conflicts=True, update_fields=['status'],
+                                                unique_fields=unique_fields)
+
+
+def set_statuses(watchlist_id, show_ids, status, user_id):
+    """
+    Upsert the statuses and send status_changed once for all the shows whose status changed, in one transaction.
+    Returns the ids of the changed shows.
+    """
+    show_ids = list(dict.fromkeys(show_ids))
+    with transaction.atomic():
+        previous = dict(WatchlistShow.objects.select_for_update().filter(
+            watchlist_id=watchlist_id, show_id__in=show_ids
+        ).values_list('show_id', 'status'))
+        changed = [show_id for show_id in show_ids if previous.get(show_id) != status]
+        upsert_statuses(watchlist_id, changed, status)
+
+        if changed:
+            # one signal for the batch, the receivers adjust every aggregate with a statement or two for all the shows
+            signals.status_changed.send(sender=WatchlistShow, watchlist_id=watchlist_id, user_id=user_id,
+                                        previous_statuses={show_id: previous.get(show_id) for show_id in changed},
+                                        status=status)
+    return changed